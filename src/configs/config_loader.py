@@ -1,15 +1,58 @@
 import os
+import json
+import hashlib
+from types import MappingProxyType
+
 import yaml
 
 
-def load_config(config_filename: str = "base_config.yaml") -> dict:
-    """
-    Load a YAML configuration file from the configs folder and return it as a dictionary.
+# parsed configs of this process: {config_path: (size, mtime_ns, config, fingerprint)}
+CONFIG_CACHE = {}
 
-    :param config_filename: Name of the YAML file (e.g., "gas_config.yaml")
-    :return: A dictionary with the configuration parameters
+
+def get_config_entry(config_filename: str) -> tuple:
+    """
+    Returns the cached (config, fingerprint) of a config file, the file is parsed again only if its size or mtime changed.
     """
     config_path = os.path.join(os.path.dirname(__file__), config_filename)
+    stat = os.stat(config_path)
+
+    cached = CONFIG_CACHE.get(config_path)
+    if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2], cached[3]
+
     with open(config_path, 'r') as f:
-        config_data = yaml.safe_load(f)
-    return config_data
\ No newline at end of file
+        config_data = yaml.safe_load(f) or {}
+    # fingerprint of the parsed values: comments and formatting do not change it
+    fingerprint = hashlib.sha1(json.dumps(config_data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    config = MappingProxyType(config_data)
+    CONFIG_CACHE[config_path] = (stat.st_size, stat.st_mtime_ns, config, fingerprint)
+
+    return config, fingerprint
+
+
+def load_config(config_filename: str = "base_config.yaml") -> MappingProxyType:
+    """
+    Load a YAML configuration file from the configs folder and return it as a read-only dictionary.
+    The file is parsed once per process and reloaded when it changes (mtime).
+
+    :param config_filename: Name of the YAML file (e.g., "gas_config.yaml")
+    :return: A read-only dictionary with the configuration parameters
+    """
+    return get_config_entry(config_filename)[0]
+
+
+def get_config_fingerprint(config_filename: str = "base_config.yaml", keys: list = None) -> str:
+    """
+    Returns a hash of the configuration values, e.g. for cache keys.
+
+    :param config_filename: Name of the YAML file (e.g., "gas_config.yaml")
+    :param keys: Only hash the values of these keys (missing keys hash as None), all values if None
+    :return: 16 character hex digest
+    """
+    config, fingerprint = get_config_entry(config_filename)
+    if keys is None:
+        return fingerprint
+
+    values = {key: config.get(key) for key in keys}
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()[:16]
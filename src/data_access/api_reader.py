@@ -1,8 +1,91 @@
 import pandas as pd
-from src.data_access.openffe_client import get_openffe_data, OpenFFEApiError
+from src.data_access.openffe_client import get_openffe_data, prefetch_openffe_data, OpenFFEApiError, REQUESTED_QUERIES
+from src.configs.config_loader import load_config
+from src.configs.mappings import hist_weather_year
 from src.utils.utils import *
 from src import logger
 
+
+def get_spatial_query(spatial_id: int, year: int) -> str:
+    """
+    Returns the OpenFFE query of a demandregio_spatial table for a year.
+    """
+    return f"demandregio/demandregio_spatial?id_spatial={spatial_id}&year={year}"
+
+def get_temporal_query(temporal_id: int, year: int) -> str:
+    """
+    Returns the OpenFFE query of a demandregio_temporal table (hourly resolution) for a (weather) year.
+    """
+    return f"demandregio/demandregio_temporal?id_temporal={temporal_id}&internal_id_1=1&year={year}&year_weather={year}&year_base={year}"
+
+def get_api_queries(years: list) -> list:
+    """
+    Returns the OpenFFE queries a pipeline run for the given years makes, with the same year mapping as the pipeline:
+        - consumption data (JEVI, employees) of years after ugr_genisis_year_end uses ugr_genisis_year_end,
+          see pipe_consumption.get_consumption_data_historical_and_future()
+        - JEVI (id_spatial=15): 2003-2017, see consumption.get_regional_energy_consumption()
+        - employees: historical (id_spatial=18) until 2018 with 2000-2008 -> 2008, future (id_spatial=27) with
+          >= 2030 -> 2030, see employees.get_employees_per_industry_sector_and_regional_ids()
+        - outside temperature (id_temporal=12): historical weather year of the historical weather year,
+          see temperature.allocation_temperature_by_day() and get_temp_outside_hourly_for_regions()
+
+    Args:
+        years: list of years (2000-2050)
+
+    Returns:
+        list of the queries without duplicates
+    """
+    ugr_genisis_year_end = load_config("base_config.yaml")["ugr_genisis_year_end"]
+
+    queries = []
+    for year in years:
+        # 1. consumption data
+        data_year = min(year, ugr_genisis_year_end)
+        queries.append(get_spatial_query(15, min(max(data_year, 2003), 2017)))
+        if data_year <= 2018:
+            queries.append(get_spatial_query(18, max(data_year, 2008)))
+        else:
+            queries.append(get_spatial_query(27, min(data_year, 2030)))
+
+        # 2. temperature
+        hist_year = hist_weather_year().get(year)
+        if hist_year is not None and hist_weather_year().get(hist_year) is not None:
+            queries.append(get_temporal_query(12, hist_weather_year()[hist_year]))
+
+    return list(dict.fromkeys(queries))
+
+def prefetch_api_data(years: list, max_workers: int = None) -> dict:
+    """
+    Downloads the API data the pipeline needs for the given years concurrently into the cache, see get_api_queries().
+
+    Args:
+        years: list of years (2000-2050)
+        max_workers: number of parallel requests, default base_config.yaml 'openffe_max_workers'
+
+    Returns:
+        dict: {query: exception} of the failed queries
+    """
+    return prefetch_openffe_data(get_api_queries(years), max_workers=max_workers)
+
+def get_unprefetched_queries(years: list) -> list:
+    """
+    Returns the queries requested in this process that prefetch_api_data(years) does not download.
+    Run it after the pipeline to check the prefetch, every missing query is logged as warning.
+
+    Args:
+        years: list of years of the run
+
+    Returns:
+        list of the missing queries
+    """
+    prefetched = set(get_api_queries(years))
+    missing = sorted(query for query in REQUESTED_QUERIES if query not in prefetched)
+    for query in missing:
+        logger.warning(f"Query {query} was requested but is not prefetched by prefetch_api_data({years})")
+
+    return missing
+
+
 def get_manufacturing_energy_consumption(year: int, spatial_id: int = 15, use_cache: bool = True) -> pd.DataFrame:
 
     """
@@ -26,7 +109,7 @@ def get_manufacturing_energy_consumption(year: int, spatial_id: int = 15, use_ca
         OpenFFEApiError: If no data is available for the specified year
         requests.RequestException: If the HTTP request fails
     """
-    query = f"demandregio/demandregio_spatial?id_spatial={spatial_id}&year={year}"
+    query = get_spatial_query(spatial_id, year)
     logger.info(f"Fetching manufacturing energy consumption for year {year}")
     
     # API has data for years 2003-2017
@@ -64,7 +147,7 @@ def get_historical_employees(year: int, spatial_id: int = 18, use_cache: bool =
         year = 2008
 
     # building the query
-    query = f"demandregio/demandregio_spatial?id_spatial={spatial_id}&year={year}"
+    query = get_spatial_query(spatial_id, year)
     logger.info(f"Fetching historical employee data for year {year}")
     
     try:
@@ -108,7 +191,7 @@ def get_future_employees(year: int, spatial_id: int = 27, use_cache: bool = True
         year = 2035 # 2035 is the last year for which data is available
 
     # building the query
-    query = f"demandregio/demandregio_spatial?id_spatial={spatial_id}&year={year}"
+    query = get_spatial_query(spatial_id, year)
     logger.info(f"Fetching historical employee data for year {year}")
     
     try:
@@ -141,7 +224,7 @@ def get_temperature_outside_hourly(year: int, temporal_id: int = 12, use_cache:
         id_region       = regional code ( not normalized) 
         year            = year
         internal_id[0]  = branch code
-        value           = Series with temeratures in hourly resolution
+        values          = list/array with the temperatures in hourly resolution (see utils.list_column_to_array())
     
     """
 
@@ -151,11 +234,11 @@ def get_temperature_outside_hourly(year: int, temporal_id: int = 12, use_cache:
 
 
     # building the query
-    query = f"demandregio/demandregio_temporal?id_temporal={temporal_id}&internal_id_1=1&year={year}&year_weather={year}&year_base={year}"
+    query = get_temporal_query(temporal_id, year)
     logger.info(f"Fetching temperature outside data for year {year}")
     
     try:
-        df = get_openffe_data(query, use_cache=use_cache).apply(literal_converter)
+        df = get_openffe_data(query, use_cache=use_cache)
     except OpenFFEApiError as e:
         logger.error(f"No data available for year {year}: {str(e)}")
         raise
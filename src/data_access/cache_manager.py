@@ -0,0 +1,370 @@
+import os
+import json
+import hashlib
+
+from src import logger
+from src.configs.config_loader import get_config_fingerprint
+
+
+# root of the repository (code files are relative to it, raw data paths are relative to the working directory like everywhere else)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# version of the cache key format, increase to invalidate all caches
+CACHE_KEY_VERSION = 2
+
+# mapping files every stage depends on
+COMMON_CODE_FILES = ["src/configs/mappings.py", "src/configs/data.py"]
+
+# base_config.yaml keys every stage depends on (float32 caches are not exact)
+COMMON_CONFIG_KEYS = ["cache_float32"]
+
+# pipeline stages with cache:
+#   params:   parameters of the stage that identify a cache entry
+#   inputs:   raw input files/directories, {param} placeholders are formatted with the parameters of the call
+#   code:     code files (in addition to COMMON_CODE_FILES)
+#   config:   base_config.yaml keys that change the result (in addition to COMMON_CONFIG_KEYS), cache paths are not listed
+#   upstream: stages whose cached results are used by the stage
+# The intermediate stages (employees ... ev_fuel_projection) are cached inside the pipeline functions and are rebuilt
+# with their force_preprocessing argument, they are listed as upstream so a change invalidates the pipeline stages using them.
+CACHE_STAGES = {
+    "employees": {
+        "params": ["year", "scenario"],
+        "inputs": ["data/raw/regional", "data/raw/temporal/Activity_drivers.xlsx"],
+        "code": ["src/data_processing/employees.py", "src/data_processing/normalization.py", "src/data_access/api_reader.py"],
+        "config": ["regional_id_changes_files", "year_for_regional_normalization", "openffe_base_url"],
+        "upstream": [],
+    },
+    "gas_self_consumption": {
+        "params": [],
+        "inputs": ["data/raw/dimensionless/energiebilanz"],
+        "code": ["src/data_processing/consumption.py"],
+        "config": [],
+        "upstream": [],
+    },
+    "temperature": {
+        "params": ["year", "resolution"],
+        "inputs": ["data/raw/regional"],
+        "code": ["src/data_processing/temperature.py", "src/data_access/api_reader.py"],
+        "config": ["openffe_base_url"],
+        "upstream": [],
+    },
+    "day_types": {
+        "params": ["state", "year"],
+        "inputs": [],
+        "code": ["src/utils/calendar_days.py"],
+        "config": [],
+        "upstream": [],
+    },
+    "shift_load_profiles": {
+        "params": ["year", "low"],
+        "inputs": [],
+        "code": ["src/data_processing/temporal.py"],
+        "config": [],
+        "upstream": ["day_types"],
+    },
+    "gas_slp_cts_daily": {
+        "params": ["state", "year"],
+        "inputs": ["data/raw/temporal/gas_load_profiles"],
+        "code": ["src/data_processing/temporal.py"],
+        "config": [],
+        "upstream": ["applications", "temperature", "day_types"],
+    },
+    "ev_fuel_projection": {
+        "params": ["end_year"],
+        "inputs": ["data/raw/electric_vehicles"],
+        "code": ["src/data_processing/electric_vehicles.py"],
+        "config": ["first_year_existing_fuel_consumption_ugr", "last_year_existing_fuel_consumption_ugr"],
+        "upstream": [],
+    },
+    "ugr": {
+        "params": [],
+        "inputs": ["data/raw/dimensionless/ugr_2000to2020.csv"],
+        "code": ["src/data_processing/consumption.py", "src/configs/genisis_wz_dict.csv"],
+        "config": ["ugr_genisis_data_file", "ugr_genisis_year_start", "ugr_genisis_year_end"],
+        "upstream": [],
+    },
+    "consumption": {
+        "params": ["year", "energy_carrier"],
+        "inputs": ["data/raw/dimensionless", "data/raw/regional", "data/raw/temporal/Activity_drivers.xlsx"],
+        "code": ["src/pipeline/pipe_consumption.py", "src/data_processing/consumption.py", "src/data_processing/employees.py",
+                 "src/data_processing/normalization.py", "src/data_processing/effects.py"],
+        "config": ["ugr_genisis_year_start", "ugr_genisis_year_end", "regional_id_changes_files", "year_for_regional_normalization"],
+        "upstream": ["ugr", "employees", "gas_self_consumption"],
+    },
+    "applications": {
+        "params": ["sector", "energy_carrier", "year"],
+        "inputs": ["data/raw/dimensionless", "data/raw/heat", "data/raw/temporal/Efficiency_Enhancement_Rates_Applications.xlsx"],
+        "code": ["src/pipeline/pipe_applications.py", "src/data_processing/application.py", "src/data_processing/effects.py"],
+        "config": [],
+        "upstream": ["consumption"],
+    },
+    "temporal": {
+        "params": ["sector", "energy_carrier", "year"],
+        "inputs": ["data/raw/temporal/gas_load_profiles", "data/raw/temporal/power_load_profiles"],
+        "code": ["src/pipeline/pipe_temporal.py", "src/data_processing/temporal.py", "src/data_processing/temperature.py",
+                 "src/utils/calendar_days.py", "src/utils/factorized_timeseries.py"],
+        "config": [],
+        "upstream": ["applications", "temperature", "day_types", "shift_load_profiles"],
+    },
+    "heat": {
+        "params": ["sector", "energy_carrier", "year", "state", "switch_to"],
+        "inputs": ["data/raw/heat", "data/raw/temporal/gas_load_profiles", "data/raw/temporal/ERA_temperature/ERA_temperature_{year}.nc"],
+        "code": ["src/pipeline/pipe_heat.py", "src/data_processing/heat.py", "src/data_processing/cop.py",
+                 "src/data_processing/temporal.py", "src/data_processing/temperature.py"],
+        "config": ["era_temperature_data_cache_dir", "era_temperature_data_cache_file"],
+        "upstream": ["applications", "temperature", "day_types"],
+    },
+    "ev_regional": {
+        "params": ["year", "szenario", "s2_szenario"],
+        "inputs": ["data/raw/electric_vehicles", "data/raw/regional"],
+        "code": ["src/pipeline/pipe_ev_regional_consumption.py", "src/data_processing/electric_vehicles.py"],
+        "config": ["first_year_existing_registration_data_kba", "last_year_existing_registration_data_kba",
+                   "first_year_existing_fuel_consumption_ugr", "last_year_existing_fuel_consumption_ugr"],
+        "upstream": ["ev_fuel_projection"],
+    },
+    "ev_temporal": {
+        "params": ["year", "szenario", "s2_szenario"],
+        "inputs": ["data/raw/electric_vehicles"],
+        "code": ["src/pipeline/pipe_ev_temporal.py", "src/data_processing/electric_vehicles.py", "src/utils/calendar_days.py"],
+        "config": ["first_year_existing_registration_data_kba", "last_year_existing_registration_data_kba",
+                   "first_year_existing_fuel_consumption_ugr", "last_year_existing_fuel_consumption_ugr"],
+        "upstream": ["ev_regional", "day_types"],
+    },
+}
+
+# in-process memo of file digests: {path: (size, mtime_ns, digest)}
+FILE_DIGEST_CACHE = {}
+
+
+def get_file_digest(path: str) -> str:
+    """
+    Returns the sha1 digest of the content of a file, memoized by (size, mtime).
+    Directories are hashed recursively, missing files hash to 'missing'.
+    """
+    if os.path.isdir(path):
+        digest = hashlib.sha1()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file in sorted(files):
+                file_path = os.path.join(root, file)
+                digest.update(os.path.relpath(file_path, path).encode())
+                digest.update(get_file_digest(file_path).encode())
+        return digest.hexdigest()
+
+    if not os.path.exists(path):
+        return "missing"
+
+    stat = os.stat(path)
+    cached = FILE_DIGEST_CACHE.get(path)
+    if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    FILE_DIGEST_CACHE[path] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+
+    return digest.hexdigest()
+
+
+def get_input_path(path: str, params: dict) -> str:
+    """
+    Returns the input path with its {param} placeholders formatted with the parameters of the call,
+    e.g. the raw file of the requested year.
+    """
+    try:
+        return path.format(**params)
+    except KeyError as e:
+        raise ValueError(f"Input {path} needs the parameter {e}, got {list(params.keys())}") from e
+
+
+def get_cache_key_components(stage: str, params: dict) -> dict:
+    """
+    Returns everything a cache entry of the stage depends on: the parameters, the fingerprint of the config keys of the stage,
+    the digests of the raw input files and code files and the keys of the upstream stages.
+
+    Args:
+        stage: str
+            must be one of CACHE_STAGES
+        params: dict
+            parameters of the call, parameters not listed in CACHE_STAGES[stage]['params'] are ignored
+    """
+    if stage not in CACHE_STAGES:
+        raise ValueError(f"Invalid stage: {stage}, must be one of {list(CACHE_STAGES.keys())}")
+    definition = CACHE_STAGES[stage]
+
+    return {
+        "version": CACHE_KEY_VERSION,
+        "stage": stage,
+        "params": {name: str(params[name]) for name in definition["params"] if name in params},
+        "config": get_config_fingerprint("base_config.yaml", keys=COMMON_CONFIG_KEYS + definition["config"]),
+        "inputs": {path: get_file_digest(get_input_path(path, params)) for path in definition["inputs"]},
+        "code": {path: get_file_digest(os.path.join(REPO_ROOT, path)) for path in COMMON_CODE_FILES + definition["code"]},
+        "upstream": {upstream: get_cache_key(upstream, params) for upstream in definition["upstream"]},
+    }
+
+
+def get_cache_key(stage: str, params: dict) -> str:
+    """
+    Returns the content address of a cache entry: a hash of get_cache_key_components().
+    """
+    components = get_cache_key_components(stage, params)
+
+    return hashlib.sha1(json.dumps(components, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def get_cache_key_file(path: str) -> str:
+    """
+    Returns the path of the key file stored next to a cache file/directory.
+    """
+    return path.rstrip("/\\") + ".key.json"
+
+
+def write_cache_key(path: str, stage: str, params: dict):
+    """
+    Stores the key of a cache entry next to the cache file/directory.
+    """
+    components = get_cache_key_components(stage, params)
+    with open(get_cache_key_file(path), "w") as f:
+        json.dump({"key": get_cache_key(stage, params), "components": components}, f, indent=2, sort_keys=True)
+
+
+def is_cache_key_valid(path: str, stage: str, params: dict) -> bool:
+    """
+    Returns True if the cache entry was created with the current parameters, raw inputs, code and upstream results.
+    Entries without key file (created before the keys were introduced) are treated as stale.
+    """
+    key_file = get_cache_key_file(path)
+    if not os.path.exists(key_file):
+        logger.info(f"Cache {path} has no key, recomputing it.")
+        return False
+
+    with open(key_file) as f:
+        stored = json.load(f)
+
+    if stored.get("key") == get_cache_key(stage, params):
+        return True
+
+    # log what changed
+    current = get_cache_key_components(stage, params)
+    changed = [part for part in current if stored.get("components", {}).get(part) != current[part]]
+    logger.info(f"Cache {path} is stale (changed: {changed}), recomputing it.")
+
+    return False
+
+
+def get_downstream_stages(stage: str) -> set:
+    """
+    Returns all stages that use the results of the given stage (directly or indirectly).
+    """
+    downstream = set()
+    for name, definition in CACHE_STAGES.items():
+        if stage in definition["upstream"]:
+            downstream |= {name} | get_downstream_stages(name)
+
+    return downstream
+
+
+
+class RefreshPolicy:
+    """
+    Decides which pipeline stages are recomputed instead of loaded from the cache.
+    The same policy is passed down the pipeline, every stage that is not refreshed uses its cache.
+
+    Every (stage, params) entry is refreshed at most once per policy, so a stage that is used by
+    several downstream calls of one run is not recomputed again and again.
+
+    Example:
+        disaggregate_temporal(..., refresh={'temporal'})             # only the temporal step
+        disaggregate_temporal(..., refresh_from='applications')     # applications and temporal, consumption from cache
+        disaggregate_temporal(..., refresh='all')                    # everything
+    """
+
+    def __init__(self, refresh=None, refresh_from: str = None):
+        """
+        Args:
+            refresh: str or iterable of str, optional
+                stages of CACHE_STAGES to recompute, 'all' for all stages
+            refresh_from: str, optional
+                recompute this stage and all stages downstream of it
+        """
+        if refresh is None:
+            stages = set()
+        elif isinstance(refresh, str):
+            stages = set(CACHE_STAGES.keys()) if refresh == "all" else {refresh}
+        else:
+            stages = set(refresh)
+        if refresh_from is not None:
+            stages |= {refresh_from} | get_downstream_stages(refresh_from)
+
+        invalid = stages - set(CACHE_STAGES.keys())
+        if invalid:
+            raise ValueError(f"Invalid stages: {sorted(invalid)}, must be in {list(CACHE_STAGES.keys())}")
+
+        self.stages = stages
+        self._refreshed = set()
+
+
+    def with_stage(self, stage: str) -> "RefreshPolicy":
+        """
+        Returns a policy that additionally refreshes the given stage and shares the already refreshed entries.
+        """
+        policy = RefreshPolicy(refresh=self.stages | {stage})
+        policy._refreshed = self._refreshed
+
+        return policy
+
+
+    def should_refresh(self, stage: str, params: dict) -> bool:
+        """
+        Returns True if the cache entry of the stage must be recomputed.
+        """
+        return stage in self.stages and (stage, self._entry(params)) not in self._refreshed
+
+
+    def mark_refreshed(self, stage: str, params: dict):
+        """
+        Marks the cache entry of the stage as recomputed in this run.
+        """
+        self._refreshed.add((stage, self._entry(params)))
+
+
+    @staticmethod
+    def _entry(params: dict) -> tuple:
+        return tuple(sorted((name, str(value)) for name, value in params.items()))
+
+
+    def __repr__(self) -> str:
+        return f"RefreshPolicy(refresh={sorted(self.stages)})"
+
+
+
+def get_refresh_policy(refresh=None, refresh_from: str = None, force_preprocessing: bool = False, stage: str = None) -> RefreshPolicy:
+    """
+    Returns the refresh policy of a pipeline entry point.
+
+    Args:
+        refresh: RefreshPolicy, str or iterable of str, optional
+            a RefreshPolicy is passed on unchanged, see RefreshPolicy for the other values
+        refresh_from: str, optional
+            see RefreshPolicy
+        force_preprocessing: bool
+            if True the stage of the entry point is refreshed (only this stage, the upstream stages use their caches)
+        stage: str
+            stage of the entry point
+
+    Returns:
+        RefreshPolicy
+    """
+    if isinstance(refresh, RefreshPolicy):
+        policy = refresh
+        for name in RefreshPolicy(refresh_from=refresh_from).stages - policy.stages:
+            policy = policy.with_stage(name)
+    else:
+        policy = RefreshPolicy(refresh=refresh, refresh_from=refresh_from)
+
+    if force_preprocessing and stage not in policy.stages:
+        policy = policy.with_stage(stage)
+
+    return policy
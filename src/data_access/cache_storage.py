@@ -0,0 +1,400 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+from src import logger
+from src.configs.config_loader import load_config
+from src.data_access.cache_manager import write_cache_key, is_cache_key_valid
+
+
+# schema metadata key holding the (MultiIndex) columns of a parquet cache
+PARQUET_COLUMNS_METADATA_KEY = b"disaggregator_columns"
+
+
+class CsvCacheBackend:
+    """
+    Stores caches as csv files (the original cache format).
+    """
+
+    extension = ".csv"
+
+    def write(self, df: pd.DataFrame, path: str, float_precision: int = None, index: bool = True):
+        float_format = f"%.{float_precision}f" if float_precision is not None else None
+        df.to_csv(path, float_format=float_format, index=index)
+
+    def read(self, path: str, header=0, index_col=0, parse_dates: bool = False) -> pd.DataFrame:
+        return pd.read_csv(path, header=header, index_col=index_col, parse_dates=parse_dates)
+
+
+class ParquetCacheBackend:
+    """
+    Stores caches as columnar parquet files.
+
+    The columns (incl. MultiIndex columns with their level names and dtypes) and the index
+    are restored exactly. Float columns can be downcasted to float32 on disk, they are
+    read back as float64.
+    """
+
+    extension = ".parquet"
+
+    def __init__(self, compression: str = "zstd", float32: bool = False):
+        self.compression = compression
+        self.float32 = float32
+
+    def write(self, df: pd.DataFrame, path: str, float_precision: int = None, index: bool = True, row_group_freq: str = None, positions=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # 1. store the columns by position, the labels go into the schema metadata
+        flat_df = df.set_axis([str(i) for i in range(df.shape[1])], axis=1)
+        if self.float32:
+            flat_df = flat_df.astype({c: np.float32 for c, dtype in flat_df.dtypes.items() if dtype == np.float64})
+        if not index:
+            flat_df = flat_df.reset_index(drop=True)
+
+        table = pa.Table.from_pandas(flat_df, preserve_index=index)
+        metadata = dict(table.schema.metadata or {})
+        encoded_columns = encode_columns(df.columns)
+        if positions is not None:
+            encoded_columns["positions"] = [int(p) for p in positions]
+        metadata[PARQUET_COLUMNS_METADATA_KEY] = json.dumps(encoded_columns, default=str).encode()
+        table = table.replace_schema_metadata(metadata)
+
+        # 2. write the table, optionally with one row group per period of the DatetimeIndex (e.g. 'M' = month)
+        if row_group_freq is None or len(df) == 0:
+            pq.write_table(table, path, compression=self.compression)
+            return
+
+        periods = pd.DatetimeIndex(df.index).to_period(row_group_freq)
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        lengths = np.diff(np.r_[starts, len(df)])
+        with pq.ParquetWriter(path, table.schema, compression=self.compression) as writer:
+            for start, length in zip(starts, lengths):
+                writer.write_table(table.slice(start, length), row_group_size=int(length))
+
+    def read(self, path: str, header=0, index_col=0, parse_dates: bool = False, column_filter: dict = None, time_range: tuple = None) -> pd.DataFrame:
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        encoded_columns = json.loads(parquet_file.schema_arrow.metadata[PARQUET_COLUMNS_METADATA_KEY])
+        columns = decode_columns(encoded_columns)
+
+        # 1. column projection
+        selected = np.arange(len(columns))
+        if column_filter:
+            selected = np.flatnonzero(filter_columns(columns, column_filter))
+
+        # 2. row groups overlapping the time range
+        row_groups = list(range(parquet_file.num_row_groups))
+        if time_range is not None:
+            row_groups = [i for i in row_groups if row_group_overlaps(parquet_file, i, time_range)]
+
+        df = parquet_file.read_row_groups(row_groups, columns=[str(i) for i in selected], use_pandas_metadata=True).to_pandas()
+        df.columns = columns[selected]
+        if time_range is not None:
+            df = df.loc[time_range[0]:time_range[1]]
+
+        # float32 on disk -> float64 in memory
+        float32_columns = [i for i, dtype in enumerate(df.dtypes) if dtype == np.float32]
+        if float32_columns:
+            df = df.astype({df.columns[i]: np.float64 for i in float32_columns}) if df.columns.is_unique else df.astype(np.float64)
+
+        # original column positions of a chunk (see save_chunked_cache())
+        if "positions" in encoded_columns:
+            df.attrs["positions"] = np.asarray(encoded_columns["positions"])[selected]
+
+        return df
+
+
+def filter_columns(columns: pd.Index, column_filter: dict) -> np.ndarray:
+    """
+    Returns a boolean mask of the columns matching all filters.
+
+    Args:
+        columns: pd.Index
+        column_filter: dict
+            {level (name or position): list of allowed values}, values are compared as strings
+    """
+    mask = np.ones(len(columns), dtype=bool)
+    for level, values in column_filter.items():
+        mask &= columns.get_level_values(level).astype(str).isin([str(v) for v in values])
+
+    return mask
+
+
+def row_group_overlaps(parquet_file, row_group: int, time_range: tuple) -> bool:
+    """
+    Returns True if the index statistics of the row group overlap the time range (start, end).
+    Row groups without statistics are always read.
+    """
+    index_columns = [c for c in json.loads(parquet_file.schema_arrow.metadata[b"pandas"])["index_columns"] if isinstance(c, str)]
+    if not index_columns:
+        return True
+
+    row_group_meta = parquet_file.metadata.row_group(row_group)
+    for i in range(row_group_meta.num_columns):
+        column_meta = row_group_meta.column(i)
+        if column_meta.path_in_schema == index_columns[0]:
+            statistics = column_meta.statistics
+            if statistics is None or not statistics.has_min_max:
+                return True
+            start = pd.Timestamp(time_range[0]) if time_range[0] is not None else None
+            end = pd.Timestamp(time_range[1]) if time_range[1] is not None else None
+            return not ((end is not None and pd.Timestamp(statistics.min) > end) or (start is not None and pd.Timestamp(statistics.max) < start))
+
+    return True
+
+
+def encode_columns(columns: pd.Index) -> dict:
+    """
+    Encodes the (MultiIndex) columns of a DataFrame to a json serializable dict.
+    """
+    return {
+        "names": list(columns.names),
+        "levels": [columns.get_level_values(i).tolist() for i in range(columns.nlevels)],
+        "dtypes": [str(columns.get_level_values(i).dtype) for i in range(columns.nlevels)],
+    }
+
+
+def decode_columns(encoded: dict) -> pd.Index:
+    """
+    Restores the columns encoded with encode_columns().
+    """
+    levels = []
+    for values, dtype, name in zip(encoded["levels"], encoded["dtypes"], encoded["names"]):
+        level = pd.Index(values, dtype=object, name=name)
+        levels.append(level if dtype == "object" else level.astype(dtype))
+
+    if len(levels) == 1:
+        return levels[0]
+
+    return pd.MultiIndex.from_arrays(levels, names=encoded["names"])
+
+
+
+# registry of the available backends, new backends can be added with register_cache_backend()
+CACHE_BACKENDS = {
+    "csv": lambda config: CsvCacheBackend(),
+    "parquet": lambda config: ParquetCacheBackend(compression=config.get("cache_compression", "zstd"),
+                                                  float32=config.get("cache_float32", False)),
+}
+
+
+def register_cache_backend(name: str, factory):
+    """
+    Registers a cache backend.
+
+    Args:
+        name: str
+            name used in base_config.yaml 'cache_backend'
+        factory: callable
+            called with the base config, returns an object with 'extension', 'write()' and 'read()'
+    """
+    CACHE_BACKENDS[name] = factory
+
+
+def get_cache_backend():
+    """
+    Returns the cache backend configured in base_config.yaml ('cache_backend').
+    """
+    config = load_config("base_config.yaml")
+    backend = config.get("cache_backend", "csv")
+
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"Invalid cache_backend: {backend}, must be one of {list(CACHE_BACKENDS.keys())}")
+
+    return CACHE_BACKENDS[backend](config)
+
+
+def get_cache_file(cache_file: str) -> str:
+    """
+    Returns the path of the cache file with the extension of the configured backend.
+
+    Args:
+        cache_file: str
+            path of the cache file as configured in base_config.yaml (e.g. "con_2020_power.csv")
+    """
+    return os.path.splitext(cache_file)[0] + get_cache_backend().extension
+
+
+def cache_exists(cache_file: str, stage: str = None, params: dict = None) -> bool:
+    """
+    Returns True if the cache file exists for the configured backend.
+    If a stage is given the cache must also have been created with the current cache key, see cache_manager.py.
+    """
+    path = get_cache_file(cache_file)
+    if not os.path.exists(path):
+        return False
+
+    return stage is None or is_cache_key_valid(path, stage, params or {})
+
+
+def save_cache(df: pd.DataFrame, cache_file: str, float_precision: int = None, index: bool = True, stage: str = None, params: dict = None) -> str:
+    """
+    Saves a DataFrame to the cache with the configured backend.
+
+    Args:
+        df: pd.DataFrame
+        cache_file: str
+            path of the cache file as configured in base_config.yaml
+        float_precision: int, optional
+            number of decimals, only used by the csv backend to reduce the file size
+        index: bool
+            whether to store the index
+        stage: str, optional
+            pipeline stage in cache_manager.CACHE_STAGES, if given the cache key is stored next to the file
+        params: dict, optional
+            parameters of the stage used for the cache key
+
+    Returns:
+        str: path of the written file
+    """
+    backend = get_cache_backend()
+    path = os.path.splitext(cache_file)[0] + backend.extension
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    backend.write(df, path, float_precision=float_precision, index=index)
+    if stage is not None:
+        write_cache_key(path, stage, params or {})
+    logger.debug(f"Saved cache: {path}")
+
+    return path
+
+
+def load_cache(cache_file: str, header=0, index_col=0, parse_dates: bool = False, stage: str = None, params: dict = None) -> pd.DataFrame:
+    """
+    Loads a DataFrame from the cache with the configured backend.
+
+    Args:
+        cache_file: str
+            path of the cache file as configured in base_config.yaml
+        header, index_col, parse_dates:
+            passed to pd.read_csv by the csv backend, the parquet backend restores the index and columns exactly
+        stage: str, optional
+            pipeline stage in cache_manager.CACHE_STAGES, if given a cache with another cache key is treated as missing
+        params: dict, optional
+            parameters of the stage used for the cache key
+
+    Returns:
+        pd.DataFrame or None if the cache does not exist or is stale
+    """
+    backend = get_cache_backend()
+    path = os.path.splitext(cache_file)[0] + backend.extension
+
+    if not os.path.exists(path):
+        return None
+    if stage is not None and not is_cache_key_valid(path, stage, params or {}):
+        return None
+
+    return backend.read(path, header=header, index_col=index_col, parse_dates=parse_dates)
+
+
+def save_chunked_cache(df: pd.DataFrame, cache_file: str, column_groups, row_group_freq: str = "M", float_precision: int = None, stage: str = None, params: dict = None) -> str:
+    """
+    Saves a temporal DataFrame in chunks: one file per column group (e.g. state) with one row group
+    per period (e.g. month). Reads with load_chunked_cache() only touch the requested chunks.
+    The csv backend does not support chunks and saves a single file.
+
+    Args:
+        df: pd.DataFrame
+            index: DatetimeIndex
+        cache_file: str
+            path of the cache file as configured in base_config.yaml, the chunks are saved in a directory with the same name
+        column_groups: array-like
+            group of every column (e.g. the state of the regional_id)
+        row_group_freq: str
+            pandas period frequency of the row groups, default 'M' (month)
+        stage, params: optional
+            cache key of the stage, see save_cache()
+
+    Returns:
+        str: path of the written file/directory
+    """
+    backend = get_cache_backend()
+    if not isinstance(backend, ParquetCacheBackend):
+        return save_cache(df, cache_file, float_precision=float_precision, stage=stage, params=params)
+
+    # 1. (re)create the chunk directory
+    path = os.path.splitext(cache_file)[0]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+    # 2. one file per column group, the original column positions are stored to restore the order
+    column_groups = np.asarray(column_groups).astype(str)
+    groups = list(pd.unique(column_groups))
+    for group in groups:
+        positions = np.flatnonzero(column_groups == group)
+        backend.write(df.iloc[:, positions], os.path.join(path, f"{group}{backend.extension}"), row_group_freq=row_group_freq, positions=positions)
+
+    with open(os.path.join(path, "_groups.json"), "w") as f:
+        json.dump(groups, f)
+    if stage is not None:
+        write_cache_key(path, stage, params or {})
+
+    return path
+
+
+def load_chunked_cache(cache_file: str, column_groups: list = None, column_filter: dict = None, time_range: tuple = None, group_of_columns=None, header=0, index_col=0, parse_dates: bool = False, stage: str = None, params: dict = None) -> pd.DataFrame:
+    """
+    Loads a cache saved with save_chunked_cache(). Only the files of the requested column groups,
+    the requested columns and the row groups overlapping the time range are read from disk.
+
+    Args:
+        cache_file: str
+            path of the cache file as configured in base_config.yaml
+        column_groups: list, optional
+            column groups (e.g. states) to load, default all
+        column_filter: dict, optional
+            {level (name or position): list of allowed values}
+        time_range: tuple, optional
+            (start, end) labels of the time window (both included), None for an open end
+        group_of_columns: callable, optional
+            returns the group of every column, needed to filter column_groups in a cache without chunks
+        header, index_col, parse_dates:
+            passed to pd.read_csv for caches without chunks
+        stage, params: optional
+            cache key of the stage, see load_cache()
+
+    Returns:
+        pd.DataFrame or None if the cache does not exist or is stale
+    """
+    backend = get_cache_backend()
+    path = os.path.splitext(cache_file)[0]
+
+    # 1. cache without chunks (csv backend or saved with save_cache()): read and filter in memory
+    if not (isinstance(backend, ParquetCacheBackend) and os.path.isdir(path)):
+        df = load_cache(cache_file, header=header, index_col=index_col, parse_dates=parse_dates, stage=stage, params=params)
+        if df is None:
+            return None
+
+        mask = np.ones(df.shape[1], dtype=bool)
+        if column_filter:
+            mask &= filter_columns(df.columns, column_filter)
+        if column_groups is not None:
+            mask &= pd.Index(np.asarray(group_of_columns(df.columns)).astype(str)).isin([str(g) for g in column_groups])
+        df = df.loc[:, mask]
+        if time_range is not None:
+            df = df.loc[time_range[0]:time_range[1]]
+
+        return df
+
+    # 2. read only the requested chunks
+    if stage is not None and not is_cache_key_valid(path, stage, params or {}):
+        return None
+    with open(os.path.join(path, "_groups.json")) as f:
+        groups = json.load(f)
+    if column_groups is not None:
+        groups = [g for g in groups if g in [str(c) for c in column_groups]]
+
+    frames = [backend.read(os.path.join(path, f"{group}{backend.extension}"), column_filter=column_filter, time_range=time_range)
+              for group in groups]
+    if not frames:
+        return None
+
+    # 3. restore the original column order
+    positions = np.concatenate([frame.attrs.pop("positions") for frame in frames])
+    df = pd.concat(frames, axis=1)
+
+    return df.iloc[:, np.argsort(positions, kind="stable")]
@@ -5,17 +5,85 @@ from netCDF4 import Dataset
 
 from src import logger
 from src.configs.config_loader import load_config
-from src.utils.utils import translate_application_columns, fix_region_id
+from src.utils.utils import translate_application_columns, fix_region_id, get_state_by_regional_id
+from src.utils.factorized_timeseries import FactorizedTimeseries
+from src.data_access.cache_storage import load_cache, save_cache, cache_exists, get_cache_file, load_chunked_cache, save_chunked_cache
+from src.data_access.cache_manager import RefreshPolicy, get_refresh_policy, get_file_digest
+
+
+# Excel snapshots
+# in-process memo of the read sheets: {(path, sheet_name, skiprows): (size, mtime_ns, DataFrame)}
+EXCEL_SNAPSHOTS = {}
+
+def read_excel_snapshot(path: str, sheet_name=0, skiprows: int = None) -> pd.DataFrame:
+    """
+    pd.read_excel() with a snapshot cache: every sheet is parsed once and stored as a pickle in
+    load_config("base_config.yaml")['excel_snapshot_dir']. Later reads are served from process memory
+    (same file size and mtime) or from the snapshot (same content hash), so openpyxl/xlrd only run
+    when a workbook changed.
+
+    Args:
+        path: str
+            path of the workbook
+        sheet_name: str or int
+            one sheet, see pd.read_excel()
+        skiprows: int, optional
+            see pd.read_excel()
+
+    Returns:
+        pd.DataFrame: a copy, callers may modify it
+    """
+    stat = os.stat(path)
+    memo_key = (path, sheet_name, skiprows)
+
+    # 1. process memory: workbook unchanged since the last read
+    cached = EXCEL_SNAPSHOTS.get(memo_key)
+    if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2].copy()
+
+    # 2. snapshot on disk: created from a workbook with the same content
+    digest = get_file_digest(path)
+    snapshot_dir = load_config("base_config.yaml")['excel_snapshot_dir']
+    snapshot_file = os.path.join(snapshot_dir, f"{os.path.basename(path)}_{sheet_name}_{skiprows}.pkl")
+    snapshot = pd.read_pickle(snapshot_file) if os.path.exists(snapshot_file) else None
+
+    if snapshot is not None and snapshot["digest"] == digest:
+        df = snapshot["df"]
+    # 3. parse the workbook and store the snapshot
+    else:
+        logger.debug(f"Creating excel snapshot of {path}, sheet {sheet_name}")
+        df = pd.read_excel(path, sheet_name=sheet_name, skiprows=skiprows)
+        os.makedirs(snapshot_dir, exist_ok=True)
+        pd.to_pickle({"digest": digest, "path": path, "df": df}, snapshot_file)
+
+    EXCEL_SNAPSHOTS[memo_key] = (stat.st_size, stat.st_mtime_ns, df)
+
+    return df.copy()
+
 
 
 # UGR data
-def load_preprocessed_ugr_file_if_exists(year: int, force_preprocessing: bool) -> pd.DataFrame | None:
-    preprocessed_dir = load_config("base_config.yaml")['preprocessed_dir']
-    preprocessed_file = os.path.join(preprocessed_dir, f"ugr_preprocessed_{year}.csv")
+def load_preprocessed_ugr_data_cache(year: int = None) -> pd.DataFrame | None:
+    """
+    Loads the preprocessed UGR data of all years (one store, see consumption.preprocess_ugr_data()).
+
+    Args:
+        year: int, optional
+            if given only the slice of this year is returned
 
-    if not force_preprocessing and os.path.exists(preprocessed_file):
-        return pd.read_csv(preprocessed_file, index_col="industry_sector")
-    return None
+    Returns:
+        pd.DataFrame or None if the cache does not exist, is stale or does not contain the year
+            - index: [year, industry_sector] or industry_sector if a year is given
+            - columns: power[MWh], gas[MWh], petrol[MWh]
+    """
+    cache_file = load_config("base_config.yaml")['ugr_preprocessed_cache_file']
+    df = load_cache(cache_file, index_col=["year", "industry_sector"], stage="ugr")
+    if df is None or year is None:
+        return df
+    if year not in df.index.get_level_values("year"):
+        return None
+
+    return df.xs(year, level="year")
 
 def load_raw_ugr_data() -> pd.DataFrame:
     raw_file = load_config("base_config.yaml")['ugr_genisis_data_file'] 
@@ -30,8 +98,8 @@ def load_genisis_wz_sector_mapping_file() -> pd.DataFrame:
 def load_activity_driver_employees() -> pd.DataFrame:
     raw_file = "data/raw/temporal/Activity_drivers.xlsx"
 
-    df_driver_industry = pd.read_excel(raw_file, sheet_name=("drivers_industry_emp"), skiprows=1).set_index('year')
-    df_driver_cts = pd.read_excel(raw_file, sheet_name=("drivers_cts_emp"), skiprows=1).set_index('year')
+    df_driver_industry = read_excel_snapshot(raw_file, sheet_name="drivers_industry_emp", skiprows=1).set_index('year')
+    df_driver_cts = read_excel_snapshot(raw_file, sheet_name="drivers_cts_emp", skiprows=1).set_index('year')
     emp_total = df_driver_industry.join(df_driver_cts)
     # normalize projection using last available year from database (2030)
     emp_total = emp_total.apply(lambda x: x/x.loc[2030])
@@ -45,8 +113,8 @@ def load_activity_driver_consumption() -> pd.DataFrame:
     """
     raw_file = "data/raw/temporal/Activity_drivers.xlsx"
 
-    drivers_industry_gva = pd.read_excel(raw_file, sheet_name=("drivers_industry_gva"), skiprows=1).set_index('year')
-    drivers_cts_area = pd.read_excel(raw_file, sheet_name=("drivers_cts_area"), skiprows=1).set_index('year')
+    drivers_industry_gva = read_excel_snapshot(raw_file, sheet_name="drivers_industry_gva", skiprows=1).set_index('year')
+    drivers_cts_area = read_excel_snapshot(raw_file, sheet_name="drivers_cts_area", skiprows=1).set_index('year')
     drivers_total = drivers_industry_gva.join(drivers_cts_area).fillna(0.0)
 
 
@@ -65,10 +133,8 @@ def load_decomposition_factors_power() -> pd.DataFrame:
     """
     # File path (using your helper function)
     file_path = "data/raw/dimensionless/decomposition_factors.xlsx"
-    sheets = pd.read_excel(file_path, sheet_name=None)
-    
     # Extract the needed sheets
-    df_decom_power = sheets['Endenergieverbrauch Strom']
+    df_decom_power = read_excel_snapshot(file_path, sheet_name='Endenergieverbrauch Strom')
     
     # Set 'WZ' as the index for both DataFrames
     df_decom_power.set_index('WZ', inplace=True)
@@ -100,10 +166,8 @@ def load_decomposition_factors_gas() -> pd.DataFrame:
 
     # File path (using your helper function)
     file_path = "data/raw/dimensionless/decomposition_factors.xlsx"
-    sheets = pd.read_excel(file_path, sheet_name=None)
-    
     # Extract the needed sheets
-    df_decom_gas = sheets['Endenergieverbrauch Gas']
+    df_decom_gas = read_excel_snapshot(file_path, sheet_name='Endenergieverbrauch Gas')
     
     # Set 'WZ' as the index for both DataFrames
     df_decom_gas.set_index('WZ', inplace=True)
@@ -131,10 +195,8 @@ def load_decomposition_factors_temperature_industry() -> pd.DataFrame:
     """
     # File path (using your helper function)
     file_path = "data/raw/dimensionless/decomposition_factors.xlsx"
-    sheets = pd.read_excel(file_path, sheet_name=None)
-    
     # Extract the needed sheets
-    df_decom_temp_industry = sheets['Prozesswärme_Temperaturniveaus']
+    df_decom_temp_industry = read_excel_snapshot(file_path, sheet_name='Prozesswärme_Temperaturniveaus')
     
     # Set 'WZ' as the index for both DataFrames
     df_decom_temp_industry.set_index('WZ', inplace=True)
@@ -197,32 +259,45 @@ def load_gas_industry_self_consuption(year: int) -> pd.DataFrame:
 
 
     raw_file = "data/raw/dimensionless/energiebilanz/bilanz" + str(year)[-2:] + "d.xlsx"
-    return pd.read_excel(raw_file, sheet_name="nat", skiprows=3)
+    return read_excel_snapshot(raw_file, sheet_name="nat", skiprows=3)
 
 def load_gas_industry_self_consuption_cache() -> pd.DataFrame:
+    """
+    Loads the gas industry self consumption cache (one row per year, see consumption.get_total_gas_industry_self_consuption()).
+    Returns an empty DataFrame if the cache does not exist or is stale.
+    """
     cache_file = load_config("base_config.yaml")['gas_industry_self_consumption_cache_file']
-    file = pd.read_csv(cache_file)
+    file = load_cache(cache_file, index_col=None, stage="gas_self_consumption")
+    if file is None:
+        return pd.DataFrame({"year": pd.Series(dtype="int64"), "gas_industry_self_consumption": pd.Series(dtype="float64")})
 
     return file
 
 def load_factor_gas_no_selfgen_cache(year: int) -> pd.DataFrame:
     """
     Loads the factor_gas_no_selfgen_cache file for the given year. 
-    Calculated and cached in consumption.calculate_self_generation()
+    Calculated in consumption.calculate_self_generation() and cached by get_consumption_data_historical_and_future()
 
     Returns:
         pd.DataFrame:
             - index: industry_sectors
             - columns: factor_gas_no_selfgen
     """
-    cache_file = load_config("base_config.yaml")['factor_gas_no_selfgen_cache_file']
-    if not os.path.exists(cache_file.format(year=year)):
-        raise FileNotFoundError(f"Factor gas no selfgen cache file {cache_file.format(year=year)} not found. Run consumption.calculate_self_generation() via get_consumption_data_historical_and_future() first.")
-    file = pd.read_csv(cache_file.format(year=year))
-    file.set_index('industry_sector', inplace=True)
+    cache_file = load_config("base_config.yaml")['factor_gas_no_selfgen_cache_file'].format(year=year)
+    file = load_cache(cache_file, index_col='industry_sector', stage="consumption", params={"year": year})
+    if file is None:
+        raise FileNotFoundError(f"Factor gas no selfgen cache file {get_cache_file(cache_file)} not found or outdated. Run get_consumption_data() first.")
 
     return file
 
+def factor_gas_no_selfgen_cache_exists(year: int) -> bool:
+    """
+    Returns True if the (up to date) factor_gas_no_selfgen cache exists for the given year.
+    """
+    cache_file = load_config("base_config.yaml")['factor_gas_no_selfgen_cache_file'].format(year=year)
+
+    return cache_exists(cache_file, stage="consumption", params={"year": year})
+
 
 # Efficiency rate
 def load_efficiency_rate(sector: str, energy_carrier: str) -> pd.DataFrame: 
@@ -241,7 +316,7 @@ def load_efficiency_rate(sector: str, energy_carrier: str) -> pd.DataFrame:
     }
     sheet_name = sheet_map.get((sector, energy_carrier), "eff_enhance_industry") # arg2 is default value
 
-    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    df = read_excel_snapshot(file_path, sheet_name=sheet_name)
 
     if sector == "cts":
         df = df.set_index("until year")
@@ -303,7 +378,7 @@ def load_power_load_profile(profile: str) -> pd.DataFrame:
     """
 
     raw_file = f"data/raw/temporal/power_load_profiles/39_VDEW_Strom_Repräsentative_Profile_{profile}.xlsx"
-    load_profiles = pd.read_excel(raw_file)
+    load_profiles = read_excel_snapshot(raw_file)
 
     return load_profiles
 
@@ -313,62 +388,10 @@ def load_gas_load_profile(profile: str) -> pd.DataFrame:
     """
 
     raw_file = f"data/raw/temporal/gas_load_profiles/Lastprofil_{profile}.xls"
-    load_profiles = pd.read_excel(raw_file)
+    load_profiles = read_excel_snapshot(raw_file)
 
     return load_profiles
 
-def load_shift_load_profiles_by_year_cache(year: int) -> pd.DataFrame:
-    """
-    Loads the shift load profiles for the given year. 
-    Returns a Multicolumn dataframe: [state, shift_load_profile]
-    """
-    cache_dir = load_config("base_config.yaml")['shift_load_profiles_cache_dir']
-    cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['shift_load_profiles_cache_file'].format(year=year))
-
-    if not os.path.exists(cache_file):
-        return None
-    file = pd.read_csv(cache_file, header=[0, 1], index_col=0)
-    return file
-
-
-
-
-# Temperature
-def load_temperature_allocation_cache(year: int) -> pd.DataFrame:
-    """
-    Loads the temperature allocation cache for the given year.
-    Returns:
-        pd.DataFrame:
-            - index: regional_id
-            - columns: temperature per day for a given year
-        if not exists, returns None
-    """
-    cache_dir = load_config("base_config.yaml")['temperature_allocation_cache_dir']
-    cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['temperature_allocation_cache_file'].format(year=year))
-
-    if not os.path.exists(cache_file):
-        return None
-    file = pd.read_csv(cache_file, index_col=0)
-    return file
-
-def load_disagg_daily_gas_slp_cts_cache(state: str, year: int) -> pd.DataFrame:
-    """
-    Loads the disaggregated daily gas shift load profiles for the given state and year.
-
-    Returns:
-        pd.DataFrame:
-            MultiIndex columns: [regional_id, industry_sector]
-            index: days of the year
-    """
-    cache_dir = load_config("base_config.yaml")['disagg_daily_gas_slp_cts_cache_dir']
-    cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['disagg_daily_gas_slp_cts_cache_file'].format(state=state, year=year))
-
-    if not os.path.exists(cache_file):
-        return None
-    file = pd.read_csv(cache_file, header=[0, 1], index_col=0)
-    return file
-
-    
 # Heat
 def load_fuel_switch_share(sector: str, switch_to: str) -> pd.DataFrame:
     """
@@ -412,24 +435,22 @@ def load_fuel_switch_share(sector: str, switch_to: str) -> pd.DataFrame:
             f"`switch_to` must be one of {list(SHEET[sector])} for '{sector}'"
         )
 
-    df = pd.read_excel(PATH, sheet_name=sheet_name, skiprows=1)
+    df = read_excel_snapshot(PATH, sheet_name=sheet_name, skiprows=1)
     
     df = translate_application_columns(df)
 
     return df
 
-def load_shift_load_profiles_by_year_cache(year: int) -> pd.DataFrame:
+def load_shift_load_profiles_by_year_cache(year: int, low: float = 0.5) -> pd.DataFrame:
     """
     Loads the shift load profiles for the given year. 
     Returns a Multicolumn dataframe: [state, shift_load_profile]
+    if not exists or stale, returns None
     """
     cache_dir = load_config("base_config.yaml")['shift_load_profiles_cache_dir']
     cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['shift_load_profiles_cache_file'].format(year=year))
 
-    if not os.path.exists(cache_file):
-        return None
-    file = pd.read_csv(cache_file, header=[0, 1], index_col=0)
-    return file
+    return load_cache(cache_file, header=[0, 1], index_col=0, stage="shift_load_profiles", params={"year": year, "low": low})
 
 def load_ERA_temperature_data(year: int) -> pd.DataFrame:
     """
@@ -469,15 +490,12 @@ def load_temperature_allocation_cache(year: int, resolution: str) -> pd.DataFram
         pd.DataFrame:
             - index: regional_id
             - columns: temperature per day for a given year
-        if not exists, returns None
+        if not exists or stale, returns None
     """
     cache_dir = load_config("base_config.yaml")['temperature_allocation_cache_dir']
     cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['temperature_allocation_cache_file'].format(year=year, resolution=resolution))
 
-    if not os.path.exists(cache_file):
-        return None
-    file = pd.read_csv(cache_file, index_col=0)
-    return file
+    return load_cache(cache_file, index_col=0, stage="temperature", params={"year": year, "resolution": resolution})
 
 def load_disagg_daily_gas_slp_cts_cache(state: str, year: int) -> pd.DataFrame:
     """
@@ -491,10 +509,8 @@ def load_disagg_daily_gas_slp_cts_cache(state: str, year: int) -> pd.DataFrame:
     cache_dir = load_config("base_config.yaml")['disagg_daily_gas_slp_cts_cache_dir']
     cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['disagg_daily_gas_slp_cts_cache_file'].format(state=state, year=year))
 
-    if not os.path.exists(cache_file):
-        return None
-    file = pd.read_csv(cache_file, header=[0, 1], index_col=0)
-    return file
+    return load_cache(cache_file, header=[0, 1], index_col=0, stage="gas_slp_cts_daily",
+                      params={"state": state, "year": year, "sector": "cts", "energy_carrier": "gas"})
 
     
 
@@ -506,11 +522,8 @@ def load_consumption_data_cache(year: int, energy_carrier: str) -> pd.DataFrame:
     cache_dir = load_config("base_config.yaml")['consumption_data_cache_dir']
     cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['consumption_data_cache_file'].format(energy_carrier=energy_carrier, year=year))
 
-    if not os.path.exists(cache_file):
-        return None
-    file = pd.read_csv(cache_file, index_col="industry_sector")
-
-    return file
+    return load_cache(cache_file, index_col="industry_sector",
+                      stage="consumption", params={"year": year, "energy_carrier": energy_carrier})
 
 def load_consumption_data_with_efficiency_factor_cache(sector: str, energy_carrier: str, year: int) -> pd.DataFrame:
     """
@@ -519,27 +532,76 @@ def load_consumption_data_with_efficiency_factor_cache(sector: str, energy_carri
     cache_dir = load_config("base_config.yaml")['consumption_data_with_efficiency_factor_cache_dir']
     cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['consumption_data_with_efficiency_factor_cache_file'].format(sector=sector, energy_carrier=energy_carrier, year=year))
 
-    if not os.path.exists(cache_file):
-        return None
-    file = pd.read_csv(cache_file, header=[0, 1], index_col=0)
-
-    return file
+    return load_cache(cache_file, header=[0, 1], index_col=0,
+                      stage="applications", params={"sector": sector, "energy_carrier": energy_carrier, "year": year})
 
-def load_consumption_disaggregate_temporal_cache(sector: str, energy_carrier: str, year: int) -> pd.DataFrame:
+def load_consumption_disaggregate_temporal_cache(sector: str, energy_carrier: str, year: int, regional_ids: list = None, industry_sectors: list = None, states: list = None, time_range: tuple = None) -> pd.DataFrame:
     """
-    Loads the consumption data cache with efficiency factor for the given sector and energy carrier.
+    Loads the temporal consumption cache for the given sector and energy carrier.
+    The cache is stored in chunks (one file per state, one row group per month), only the chunks
+    matching the filters are read from disk.
+
+    Args:
+        regional_ids: list, optional
+            only load these regional_ids
+        industry_sectors: list, optional
+            only load these industry_sectors
+        states: list, optional
+            only load the regional_ids of these states, e.g. ['BW', 'BY']
+        time_range: tuple, optional
+            (start, end) e.g. ('2020-01-01', '2020-01-31 23:45'), both included
 
     Returns:
         pd.DataFrame:
             MultiIndex columns: [regional_id, industry_sector]
-            index: days of the year
+            index: hours/15min of the given year
     """
     cache_dir = load_config("base_config.yaml")['consumption_disaggregate_temporal_cache_dir']
     cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['consumption_disaggregate_temporal_cache_file'].format(sector=sector, energy_carrier=energy_carrier, year=year))
 
-    if not os.path.exists(cache_file):
+    # 1. filters on the column levels: 0 = regional_id, 1 = industry_sector
+    column_filter = {}
+    if regional_ids is not None:
+        column_filter[0] = regional_ids
+    if industry_sectors is not None:
+        column_filter[1] = industry_sectors
+
+    # 2. the chunks are states: only read the states of the requested regional_ids
+    column_groups = None if states is None else set(states)
+    if regional_ids is not None:
+        regional_id_states = {get_state_by_regional_id(regional_id) for regional_id in regional_ids}
+        column_groups = regional_id_states if column_groups is None else column_groups & regional_id_states
+
+    return load_chunked_cache(cache_file,
+                              column_groups=None if column_groups is None else sorted(column_groups),
+                              column_filter=column_filter,
+                              time_range=time_range,
+                              group_of_columns=lambda columns: [get_state_by_regional_id(r) for r in columns.get_level_values(0)],
+                              header=[0, 1], index_col=0, parse_dates=True,
+                              stage="temporal", params={"sector": sector, "energy_carrier": energy_carrier, "year": year})
+
+
+def load_consumption_disaggregate_temporal_factorized_cache(sector: str, energy_carrier: str, year: int) -> FactorizedTimeseries:
+    """
+    Loads the factorized temporal consumption (unique profiles x annual consumption) for the given sector and energy carrier.
+
+    Returns:
+        FactorizedTimeseries:
+            columns: MultiIndex [regional_id, industry_sector]
+            index: hours/15min of the given year
+    """
+    cache_dir = load_config("base_config.yaml")['consumption_disaggregate_temporal_cache_dir']
+    cache_file = load_config("base_config.yaml")['consumption_disaggregate_temporal_factorized_cache_file']
+    profiles_file = os.path.join(cache_dir, cache_file.format(part="profiles", sector=sector, energy_carrier=energy_carrier, year=year))
+    mapping_file = os.path.join(cache_dir, cache_file.format(part="mapping", sector=sector, energy_carrier=energy_carrier, year=year))
+
+    params = {"sector": sector, "energy_carrier": energy_carrier, "year": year}
+    profiles = load_cache(profiles_file, index_col=0, parse_dates=True, stage="temporal", params=params)
+    mapping = load_cache(mapping_file, index_col=None, stage="temporal", params=params)
+    if profiles is None or mapping is None:
         return None
-    file = pd.read_csv(cache_file, header=[0, 1], index_col=0)
+
+    return FactorizedTimeseries.from_frames(profiles=profiles, mapping=mapping)
 
 
 
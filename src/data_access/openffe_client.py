@@ -1,13 +1,32 @@
 import os
 import json
+import hashlib
+import threading
 import requests
 import pandas as pd
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, Optional, Iterable
 from src import logger
+from src.configs.config_loader import load_config
 
 # Constants
 BASE_URL = "https://api.opendata.ffe.de/"
 CACHE_DIR = "data/api_cache/open_ffe"
+# cache entries are parsed DataFrames stored as parquet, the index maps the full query strings to the entries
+CACHE_EXTENSION = ".parquet"
+CACHE_INDEX_FILE = "index.json"
+# legacy json cache files are named after the query, truncated to this length
+LEGACY_FILENAME_MAX_LENGTH = 200
+CACHE_INDEX_LOCK = threading.Lock()
+# in-process memo of the cache indexes: {cache_dir: (stat of the index file, index)}, guarded by CACHE_INDEX_LOCK
+CACHE_INDEXES = {}
+# queries requested by get_data() in this process, see api_reader.get_unprefetched_queries()
+REQUESTED_QUERIES = set()
+# status codes that are retried (rate limit and server errors)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
 # Ensure cache directory exists
 os.makedirs(CACHE_DIR, exist_ok=True)
@@ -18,7 +37,7 @@ class OpenFFEApiError(Exception):
 
 def generate_cache_filename(query: str) -> str:
     """
-    Generate a readable cache filename based on the query.
+    Generate a readable cache filename based on the query (legacy json cache, only read).
     
     Args:
         query: The API query string
@@ -30,63 +49,176 @@ def generate_cache_filename(query: str) -> str:
     safe_query = query.replace("/", "_").replace("?", "_").replace("&", "_").replace("=", "_")
     
     # Truncate if too long (filesystem limits)
-    if len(safe_query) > 200:
-        safe_query = safe_query[:200]
+    if len(safe_query) > LEGACY_FILENAME_MAX_LENGTH:
+        safe_query = safe_query[:LEGACY_FILENAME_MAX_LENGTH]
         
     return f"{safe_query}.json"
 
-def get_cache_path(query: str) -> str:
+def get_legacy_cache_path(query: str, cache_dir: str = CACHE_DIR) -> Optional[str]:
     """
-    Get the full cache path for a query.
+    Returns the path of the legacy json cache file of a query.
+    Returns None if the filename was truncated: the file may belong to another query with the same prefix.
+    """
+    if len(query) > LEGACY_FILENAME_MAX_LENGTH:
+        return None
+
+    return os.path.join(cache_dir, generate_cache_filename(query))
+
+def get_cache_path(query: str, cache_dir: str = CACHE_DIR) -> str:
+    """
+    Get the full cache path for a query: the sha1 of the full query, so different queries never share a file.
     
     Args:
         query: The API query string
+        cache_dir: Directory of the cache files
         
     Returns:
         Full path to the cache file
     """
-    filename = generate_cache_filename(query)
-    return os.path.join(CACHE_DIR, filename)
+    filename = hashlib.sha1(query.encode()).hexdigest() + CACHE_EXTENSION
+    return os.path.join(cache_dir, filename)
+
+def get_index_file_stat(index_path: str) -> Optional[tuple]:
+    """
+    Returns (size, mtime_ns) of the index file, None if it does not exist.
+    """
+    if not os.path.exists(index_path):
+        return None
+
+    stat = os.stat(index_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def read_cache_index_file(index_path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Reads the index file from disk.
+    """
+    if not os.path.exists(index_path):
+        return {}
+
+    try:
+        with open(index_path, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        logger.warning(f"Error reading cache index: {str(e)}")
+        return {}
+
+def get_memoized_cache_index(cache_dir: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the in-process index of the cache directory, must be called with CACHE_INDEX_LOCK held.
+    The file is read once per process and again only if another process changed it, the entries of
+    this process that are not saved yet are kept.
+    """
+    index_path = os.path.join(cache_dir, CACHE_INDEX_FILE)
+    stat = get_index_file_stat(index_path)
+    cached = CACHE_INDEXES.get(cache_dir)
+    if cached is not None and cached[0] == stat:
+        return cached[1]
+
+    index = read_cache_index_file(index_path)
+    if cached is not None:
+        index.update(cached[1])
+    CACHE_INDEXES[cache_dir] = (stat, index)
+
+    return index
+
+def load_cache_index(cache_dir: str = CACHE_DIR) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the cache index: {query: {"file", "rows", "size", "fetched_at"}}.
+    """
+    with CACHE_INDEX_LOCK:
+        return get_memoized_cache_index(cache_dir)
+
+def save_cache_index(cache_dir: str = CACHE_DIR) -> None:
+    """
+    Writes the in-process index of the cache directory to disk.
+    """
+    with CACHE_INDEX_LOCK:
+        index = get_memoized_cache_index(cache_dir)
+        index_path = os.path.join(cache_dir, CACHE_INDEX_FILE)
+        with open(index_path + ".tmp", 'w') as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(index_path + ".tmp", index_path)
+        CACHE_INDEXES[cache_dir] = (get_index_file_stat(index_path), index)
 
-def read_from_cache(query: str) -> Optional[Dict[str, Any]]:
+def is_cached(query: str, cache_dir: str = CACHE_DIR) -> bool:
     """
-    Try to read response from cache.
+    Returns True if the query is in the cache (indexed or legacy json).
+    """
+    entry = load_cache_index(cache_dir).get(query)
+    if entry is not None and os.path.exists(os.path.join(cache_dir, entry["file"])):
+        return True
+
+    legacy_path = get_legacy_cache_path(query, cache_dir)
+    return legacy_path is not None and os.path.exists(legacy_path)
+
+def read_from_cache(query: str, cache_dir: str = CACHE_DIR) -> Optional[pd.DataFrame]:
+    """
+    Try to read the parsed response from cache.
+    Legacy json cache files are parsed once and migrated to the indexed format.
     
     Args:
         query: The API query string
+        cache_dir: Directory of the cache files
         
     Returns:
-        Cached response data if available, None otherwise
+        Cached DataFrame if available, None otherwise
     """
-    cache_path = get_cache_path(query)
-    
-    if os.path.exists(cache_path):
+    # 1. indexed parquet entry
+    entry = load_cache_index(cache_dir).get(query)
+    if entry is not None:
+        cache_path = os.path.join(cache_dir, entry["file"])
+        try:
+            logger.info(f"Reading from cache: {cache_path}")
+            return pd.read_parquet(cache_path)
+        except (IOError, ValueError) as e:
+            logger.warning(f"Error reading cache file: {str(e)}")
+
+    # 2. legacy json file without index entry, only if its filename is not truncated (otherwise it is fetched again)
+    legacy_path = get_legacy_cache_path(query, cache_dir)
+    if legacy_path is not None and os.path.exists(legacy_path):
         try:
-            with open(cache_path, 'r') as f:
-                logger.info(f"Reading from cache: {cache_path}")
-                return json.load(f)
+            with open(legacy_path, 'r') as f:
+                logger.info(f"Reading from legacy cache: {legacy_path}")
+                df = parse_response(json.load(f))
         except (json.JSONDecodeError, IOError) as e:
             logger.warning(f"Error reading cache file: {str(e)}")
             return None
+        write_to_cache(query, df, cache_dir)
+        return df
     
     return None
 
-def write_to_cache(query: str, data: Dict[str, Any]) -> None:
+def write_to_cache(query: str, df: pd.DataFrame, cache_dir: str = CACHE_DIR, save_index: bool = True) -> None:
     """
-    Write response data to cache.
+    Write the parsed response to the cache (zstd compressed parquet) and add it to the index.
     
     Args:
         query: The API query string
-        data: Response data to cache
+        df: Parsed response data to cache
+        cache_dir: Directory of the cache files
+        save_index: Whether to write the index to disk, False for batches that call save_cache_index() once at the end
     """
-    cache_path = get_cache_path(query)
+    cache_path = get_cache_path(query, cache_dir)
     
     try:
-        with open(cache_path, 'w') as f:
-            json.dump(data, f, indent=2)
-            logger.info(f"Wrote to cache: {cache_path}")
-    except IOError as e:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_parquet(cache_path, compression="zstd", index=False)
+        logger.info(f"Wrote to cache: {cache_path}")
+    except (IOError, ValueError, TypeError) as e:
         logger.error(f"Error writing to cache: {str(e)}")
+        return
+
+    # update the index (prefetch() writes from several threads)
+    with CACHE_INDEX_LOCK:
+        get_memoized_cache_index(cache_dir)[query] = {
+            "file": os.path.basename(cache_path),
+            "rows": len(df),
+            "size": os.path.getsize(cache_path),
+            "fetched_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    if save_index:
+        save_cache_index(cache_dir)
 
 def parse_response(response_data: Dict[str, Any]) -> pd.DataFrame:
     """
@@ -120,26 +252,167 @@ def parse_response(response_data: Dict[str, Any]) -> pd.DataFrame:
     
     # Handle internal_id special case - expand the array into multiple columns
     if 'internal_id' in df.columns:
-        # Find the maximum length of internal_id arrays
-        max_id_length = 0
-        for idx in df['internal_id']:
-            if isinstance(idx, list) and len(idx) > max_id_length:
-                max_id_length = len(idx)
-        
-        # Create new columns for each position in the internal_id array
-        for i in range(max_id_length):
-            column_name = f"internal_id[{i}]"
-            
-            # Extract the i-th element from each internal_id array, or None if not present
-            df[column_name] = df['internal_id'].apply(
-                lambda x: x[i] if isinstance(x, list) and i < len(x) else None
-            )
+        # Create one column per position of the internal_id arrays with one DataFrame constructor,
+        # shorter arrays (or no array) are filled with None
+        internal_ids = pd.DataFrame([x if isinstance(x, list) else [] for x in df['internal_id']], index=df.index)
+        internal_ids.columns = [f"internal_id[{i}]" for i in internal_ids.columns]
+        df = pd.concat([df, internal_ids], axis=1)
         
         # Drop the original internal_id column
         df = df.drop('internal_id', axis=1)
     
     return df
 
+class OpenFFEClient:
+    """
+    Client of the OpenFFE API with a pooled session, timeouts, retries with exponential backoff and
+    concurrent prefetching of queries into the cache.
+    The defaults are configured in base_config.yaml (openffe_*).
+
+    Example:
+        client = OpenFFEClient()
+        client.prefetch([f"demandregio/demandregio_spatial?id_spatial=18&year={year}" for year in range(2008, 2019)])
+        df = client.get_data("demandregio/demandregio_spatial?id_spatial=18&year=2015")  # read from the cache
+    """
+
+    def __init__(self, base_url: str = None, cache_dir: str = CACHE_DIR, timeout: float = None, retries: int = None,
+                 backoff_factor: float = None, max_workers: int = None):
+        """
+        Args:
+            base_url: URL of the API (e.g. a local stand-in server for tests)
+            cache_dir: Directory of the cache files
+            timeout: Timeout of a request in seconds
+            retries: Number of retries of a failed request (connection errors and RETRY_STATUS_CODES)
+            backoff_factor: Wait backoff_factor * 2^(retry - 1) seconds between the retries
+            max_workers: Number of parallel requests of prefetch() and size of the connection pool
+        """
+        config = load_config("base_config.yaml")
+        self.base_url = base_url if base_url is not None else config.get("openffe_base_url", BASE_URL)
+        self.cache_dir = cache_dir
+        self.timeout = timeout if timeout is not None else config.get("openffe_timeout", 60)
+        self.max_workers = max_workers if max_workers is not None else config.get("openffe_max_workers", 8)
+
+        retry = Retry(
+            total=retries if retries is not None else config.get("openffe_retries", 3),
+            backoff_factor=backoff_factor if backoff_factor is not None else config.get("openffe_backoff_factor", 0.5),
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+
+    def fetch(self, query: str) -> Dict[str, Any]:
+        """
+        Make a GET request to the API (without cache).
+
+        Returns:
+            JSON response data
+
+        Raises:
+            requests.RequestException: If the HTTP request fails after all retries
+        """
+        url = self.base_url + query
+        logger.info(f"Making API request to: {url}")
+
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()  # Raise exception for non-200 status codes
+            return response.json()
+        except requests.RequestException as e:
+            logger.error(f"API request failed: {str(e)}")
+            raise
+
+
+    def get_data(self, query: str, use_cache: bool = True) -> pd.DataFrame:
+        """
+        Get the data of a query from the cache or the API.
+
+        Args:
+            query: The API endpoint query string
+            use_cache: Whether to use cached responses
+
+        Returns:
+            DataFrame containing the API response data
+
+        Raises:
+            OpenFFEApiError: If the API returns an error message
+            requests.RequestException: If the HTTP request fails
+        """
+        REQUESTED_QUERIES.add(query)
+
+        # Check cache first if enabled
+        if use_cache:
+            cached_df = read_from_cache(query, self.cache_dir)
+            if cached_df is not None:
+                return cached_df
+
+        data = self.fetch(query)
+
+        # Try to parse the response first to check for API errors
+        # If it contains an error message, parse_response will raise OpenFFEApiError
+        df = parse_response(data)
+
+        # Only cache if no error occurred
+        if use_cache:
+            write_to_cache(query, df, self.cache_dir)
+
+        return df
+
+
+    def prefetch(self, queries: Iterable[str], max_workers: int = None) -> Dict[str, Exception]:
+        """
+        Downloads the queries that are not cached yet concurrently into the cache.
+        Failed queries are logged and returned, they do not stop the other downloads.
+
+        Args:
+            queries: The API query strings
+            max_workers: Number of parallel requests, default self.max_workers
+
+        Returns:
+            {query: exception} of the failed queries
+        """
+        queries = list(dict.fromkeys(queries))
+        missing = [query for query in queries if not is_cached(query, self.cache_dir)]
+        logger.info(f"Prefetching {len(queries)} OpenFFE queries ({len(missing)} not cached)")
+
+        def download(query: str):
+            write_to_cache(query, parse_response(self.fetch(query)), self.cache_dir, save_index=False)
+
+        failed = {}
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+                futures = {query: executor.submit(download, query) for query in missing}
+                for query, future in futures.items():
+                    try:
+                        future.result()
+                    except (requests.RequestException, OpenFFEApiError, ValueError) as e:
+                        logger.warning(f"Prefetching {query} failed: {str(e)}")
+                        failed[query] = e
+        # the index is written once for the batch (also if the prefetch is interrupted)
+        finally:
+            if missing:
+                save_cache_index(self.cache_dir)
+
+        return failed
+
+
+# default client of get_openffe_data(), created on first use
+DEFAULT_CLIENT = None
+
+def get_client() -> OpenFFEClient:
+    """
+    Returns the default OpenFFEClient (one pooled session per process).
+    """
+    global DEFAULT_CLIENT
+    if DEFAULT_CLIENT is None:
+        DEFAULT_CLIENT = OpenFFEClient()
+
+    return DEFAULT_CLIENT
+
 def get_openffe_data(query: str, use_cache: bool = True) -> pd.DataFrame:
     """
     Make a GET request to the OpenFFE API.
@@ -155,32 +428,10 @@ def get_openffe_data(query: str, use_cache: bool = True) -> pd.DataFrame:
         OpenFFEApiError: If the API returns an error message
         requests.RequestException: If the HTTP request fails
     """
-    # Check cache first if enabled
-    if use_cache:
-        cached_data = read_from_cache(query)
-        if cached_data:
-            return parse_response(cached_data)
-    
-    # Make API request
-    url = BASE_URL + query
-    logger.info(f"Making API request to: {url}")
-    
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise exception for non-200 status codes
-        
-        data = response.json()
-        
-        # Try to parse the response first to check for API errors
-        # If it contains an error message, parse_response will raise OpenFFEApiError
-        df = parse_response(data)
-        
-        # Only cache if no error occurred
-        if use_cache:
-            write_to_cache(query, data)
-        
-        return df
-        
-    except requests.RequestException as e:
-        logger.error(f"API request failed: {str(e)}")
-        raise
+    return get_client().get_data(query, use_cache=use_cache)
+
+def prefetch_openffe_data(queries: Iterable[str], max_workers: int = None) -> Dict[str, Exception]:
+    """
+    Downloads the queries concurrently into the cache, see OpenFFEClient.prefetch().
+    """
+    return get_client().prefetch(queries, max_workers=max_workers)
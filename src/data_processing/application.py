@@ -126,46 +126,20 @@ def disagg_applications_gas_industry(consumption_data, decomp_gas_temp, year):
     consumption_data_no_selfgen = consumption_data.mul(factor_gas_no_selfgen, axis=0) # gas consumption without self gen
 
 
-    # 3. Transpose to get (regions x industry_sectors)
-    consumption_data_no_selfgen = consumption_data_no_selfgen.T  # shape: (400 regions, 29 industry_sectors)
-
-
-    # 4. Calculate disaggregated consumption for each application
-    industry_sectors = consumption_data_no_selfgen.columns
-    applications = decomp_gas_temp.columns
-    regions = consumption_data_no_selfgen.index
-
-    # 5. MultiIndex: (industry_sector, application)
-    # https://pandas.pydata.org/docs/reference/api/pandas.MultiIndex.from_product.html
-    column_index = pd.MultiIndex.from_product([industry_sectors, applications], names=["industry_sector", "application"])
-    """ column_index
-    MultiIndex:
-    88 industry sectors * 8 applications = 704 columns
-    """
-
-    # 6. Initialize result dataframe
-    new_df = pd.DataFrame(index=regions, columns=column_index)
+    # 3. Calculate disaggregated consumption for each (industry_sector, application) in one broadcast
+    new_df = disagg_applications_by_factors(consumption_data_no_selfgen, decomp_gas_temp)
     """ new_df
-    empty dataframe:
-    400 rows x 704 columns: 400 regions x 704 (industry sectors x applications)
+    400 rows x (industry sectors x applications) columns
     """
 
-    # 5. Efficient fill: loop only over industry sectors
-    for industry in industry_sectors:
-        sector_consumption = consumption_data_no_selfgen[industry]  # Series: index = regions
-        app_shares = decomp_gas_temp.loc[industry]               # Series: index = applications
-
-        for application in applications:
-            new_df[(industry, application)] = sector_consumption * app_shares[application]
-
-    # 6. join now with industrial_power_plant consumption (consumption_data_selfgen)
+    # 4. join now with industrial_power_plant consumption (consumption_data_selfgen)
     df_ipplant = consumption_data_selfgen.T  # shape: (regions, industry_sectors)
     # Convert columns to MultiIndex: (industry_sector, "industrial_power_plant")
     df_ipplant.columns = pd.MultiIndex.from_product(
         [df_ipplant.columns, ["industrial_power_plant"]],
         names=["industry_sector", "application"]
     )
-    # 3. Join to new_df along columns
+    # Join to new_df along columns
     new_df = new_df.join(df_ipplant)
 
     return new_df
@@ -186,36 +160,11 @@ def disagg_applications_default(consumption_data, decomp):
         MultiIndex index: (regional_id)
     """
 
-    consumption_data = consumption_data.T  # shape: (400 regions, 29 industry_sectors)
-
-    # 4. Calculate disaggregated consumption for each application
-    industry_sectors = consumption_data.columns
-    applications = decomp.columns
-    regions = consumption_data.index
-
-    # 5. MultiIndex: (industry_sector, application)
-    # https://pandas.pydata.org/docs/reference/api/pandas.MultiIndex.from_product.html
-    column_index = pd.MultiIndex.from_product([industry_sectors, applications], names=["industry_sector", "application"])
-    """ column_index
-    MultiIndex:
-    88 industry sectors * 8 applications = 704 columns
-    """
-
-    # 6. Initialize result dataframe
-    new_df = pd.DataFrame(index=regions, columns=column_index)
+    new_df = disagg_applications_by_factors(consumption_data, decomp)
     """ new_df
-    empty dataframe:
-    400 rows x 704 columns: 400 regions x 704 (industry sectors x applications)
+    400 rows x 704 columns: 400 regions x 704 (88 industry sectors x 8 applications)
     """
 
-    # 5. Efficient fill: loop only over industry sectors    for industry in industry_sectors:
-    for industry in industry_sectors:
-        sector_consumption = consumption_data[industry]  # Series: index = regions
-        app_shares = decomp.loc[industry]               # Series: index = applications
-
-        for application in applications:
-            new_df[(industry, application)] = sector_consumption * app_shares[application]
-
     return new_df
 
 
@@ -231,21 +180,10 @@ def disagg_applications_petrol(consumption_data: pd.DataFrame, decomp: pd.DataFr
         pd.DataFrame: Disaggregated consumption data with MultiIndex columns (industry_sector, application).
     """
     
-    # 1. For each application, multiply sectoral consumption by its factor
-    app_frames = []
-    for app in decomp.columns:
-        # Multiply consumption_data (sectors × regions) by the factor for this app
-        df_app = consumption_data.mul(decomp[app], axis=0)
-        # Transpose so that regions become the rows
-        df_app_t = df_app.T
-        # Label columns with a MultiIndex: (industry_sector, application)
-        df_app_t.columns = pd.MultiIndex.from_product([df_app_t.columns, [app]])
-        app_frames.append(df_app_t)
-
-    # 2. Concatenate all applications side by side
-    result = pd.concat(app_frames, axis=1)
-
-    # 3. Sort the MultiIndex columns by sector then application
+    # 1. Multiply the sectoral consumption by the factors of all applications
+    result = disagg_applications_by_factors(consumption_data, decomp)
+
+    # 2. Sort the MultiIndex columns by sector then application
     result = result.sort_index(axis=1, level=[0, 1])
 
 
@@ -260,6 +198,33 @@ def disagg_applications_petrol(consumption_data: pd.DataFrame, decomp: pd.DataFr
 
 
 
+def disagg_applications_by_factors(consumption_data: pd.DataFrame, decomp: pd.DataFrame) -> pd.DataFrame:
+    """
+    Disaggregates the consumption of every industry_sector to applications as one outer product:
+        result[regional_id, (industry_sector, application)] = consumption_data[industry_sector, regional_id] * decomp[industry_sector, application]
+
+    Args:
+        consumption_data (pd.DataFrame): Consumption data: index: industry_sectors, columns: regional_ids
+        decomp (pd.DataFrame): Decomposition factors: index: industry_sectors, columns: applications
+
+    Returns:
+        pd.DataFrame: float64, index: regional_ids, MultiIndex columns: (industry_sector, application)
+    """
+    industry_sectors = consumption_data.index
+    missing = industry_sectors.difference(decomp.index)
+    if len(missing) > 0:
+        raise ValueError(f"No decomposition factors for the industry_sectors {missing.tolist()}")
+
+    # (regions x industry_sectors x 1) * (1 x industry_sectors x applications)
+    consumption = consumption_data.to_numpy(dtype=float).T
+    factors = decomp.loc[industry_sectors].to_numpy(dtype=float)
+    values = (consumption[:, :, None] * factors[None, :, :]).reshape(consumption.shape[0], -1)
+
+    column_index = pd.MultiIndex.from_product([industry_sectors, decomp.columns], names=["industry_sector", "application"])
+
+    return pd.DataFrame(values, index=consumption_data.columns, columns=column_index)
+
+
 def get_application_dissaggregation_factors(sector: str, energy_carrier: str):
     """
     Get the application dissaggregation factors for a given industry and energy carrier.
@@ -16,9 +16,18 @@ from src.data_processing.normalization import *
 
 
 
+# mapping of the GENESIS energy carrier codes to our energy carrier names
+UGR_ENERGY_TYPE_BY_GENISIS_CODE = {
+    "EKT-02": "power[TJ]",
+    "GAS-01": "gas[TJ]",
+    **{code: "petrol[TJ]" for code in ["OEL-ERD-01", "KFST-DSL-01", "KFST-OTTO-01", "KFST-FLT-01", "OEL-H-L-01", "PGH221760", "OEL-SONST"]},
+}
+
+
 def get_ugr_data_ranges(year, force_preprocessing=False):
     """
     Get UGR (Underlying Energy Requirements) data for a specific year. 
+    The raw data of all years is preprocessed once (preprocess_ugr_data()), a year is a slice of that store.
     
     Args:
         year (int): The year to get the UGR data for. Availible data is defined in the config file:
@@ -39,190 +48,184 @@ def get_ugr_data_ranges(year, force_preprocessing=False):
         raise ValueError(f"Year {year} is outside the valid range ({ugr_first_year}-{ugr_last_year}). No Genisis UGR data for this year.")
 
 
-    # 3. Check for Existing Preprocessed File and force_preprocessing
+    # 2. Check for Existing Preprocessed File and force_preprocessing
     # if force_preprocessing is True, the file will be preprocessed again
-    df = load_preprocessed_ugr_file_if_exists(year, force_preprocessing)
-    if df is not None:
-        return df
+    if not force_preprocessing:
+        df = load_preprocessed_ugr_data_cache(year)
+        if df is not None:
+            return df
 
-    # Preprocessing the raw data
-    logger.info(f"Preprocessing the UGR raw data for year {year}") 
-    raw_data = load_raw_ugr_data()
-    raw_data = raw_data.drop(columns=[
-        "statistics_code", "statistics_label", 
-        "time_code", "1_variable_code", 
-        "1_variable_label", "1_variable_attribute_code", 
-        "1_variable_attribute_label", "2_variable_code", 
-        "2_variable_label", "3_variable_code", 
-        "3_variable_label", "value_variable_code", 
-        "value_variable_label", "2_variable_label", 
-        "3_variable_code", "3_variable_label", 
-        "value_variable_code", "value_variable_label"
-    ])
-    
-
-    # 5. Filter Data for the Given Year
-    year_data = raw_data[raw_data["time"] == year]
-    
-    # Check if we have data for the given year
-    if year_data.empty:
+
+    # 3. Preprocess all years at once and slice the requested year
+    ugr_data = preprocess_ugr_data()
+    if year not in ugr_data.index.get_level_values("year"):
         raise ValueError(f"No UGR data available for year {year}")
+
+    """
+    result_df:
+    48 rows x 3 columns
+    industry_sector (=index), power, gas, petrol
+    """
+    return ugr_data.xs(year, level="year")
+
+
+def preprocess_ugr_data() -> pd.DataFrame:
+    """
+    Preprocesses the raw UGR data (GENESIS) of all years in one pass and saves it as one store
+    (load_config("base_config.yaml")['ugr_preprocessed_cache_file']).
+
+    Returns:
+        pandas.DataFrame:
+            - index: [year, industry_sector]
+            - columns: power[MWh], gas[MWh], petrol[MWh]
+    """
+    logger.info("Preprocessing the UGR raw data for all years")
+
+
+    # 1. Load the raw data
+    raw_data = load_raw_ugr_data()
     
 
-    # 6. Remove Rows with Missing industry_sector Codes and energy carrier codes
+    # 2. Remove Rows with Missing industry_sector Codes and energy carrier codes
     # = removing the "Insgesamt" rows with the sums of energy usage per industry_sector/energy carrier
-    year_data = year_data.dropna(subset=["2_variable_attribute_code", "3_variable_attribute_code"])
+    raw_data = raw_data.dropna(subset=["2_variable_attribute_code", "3_variable_attribute_code"])
     
 
-    # 7. Map industry_sector (=WZ) Codes Using the Mapping File
+    # 3. Map industry_sector (=WZ) Codes Using the Mapping File
     mapping_df = load_genisis_wz_sector_mapping_file()
     # Create mapping dictionary from Genisis_WZ to WZ
     code_mapping = dict(zip(mapping_df["genisis_industry_code"], mapping_df["industry_code_ranges"]))
-    # Apply the mapping in the new column "industry_sector"
-    year_data["industry_sector"] = year_data["2_variable_attribute_code"].map(code_mapping)
-    """ year_data:
-    576 rows x 9 columns
-    """
     
 
-    # 8. Process Energy Carrier Data
-    # Create energy_type column - mapping of the GENEISI energy carrier codes to our energy carrier names
-    def determine_energy_type(code):
-        if code == "EKT-02":
-            return "power[TJ]"
-        elif code == "GAS-01":
-            return "gas[TJ]"
-        elif code in ["OEL-ERD-01", "KFST-DSL-01", "KFST-OTTO-01", "KFST-FLT-01", 
-                     "OEL-H-L-01", "PGH221760", "OEL-SONST"]:
-            return "petrol[TJ]"
-        else:
-            return None
-    
-    year_data["energy_type"] = year_data["3_variable_attribute_code"].apply(determine_energy_type)
-    # Filter out rows with unrecognized energy types
-    year_data = year_data[year_data["energy_type"].notna()]
-    # Replace "-" values (= no value existing) in the "value" column with 0 and convert to int
-    year_data["value"] = (
-        pd.to_numeric(year_data["value"].replace("-", 0), errors="coerce")
-        .fillna(0.0)
-    )
-    """ year_data:
-    432 rows x 10 columns
-    """
+    # 4. Process Energy Carrier Data: map the GENESIS energy carrier codes, filter out unrecognized energy types
+    # Replace "-" values (= no value existing) in the "value" column with 0
+    ugr_data = pd.DataFrame({
+        "year": raw_data["time"],
+        "industry_sector": raw_data["2_variable_attribute_code"].map(code_mapping),
+        "energy_type": raw_data["3_variable_attribute_code"].map(UGR_ENERGY_TYPE_BY_GENISIS_CODE),
+        "value": pd.to_numeric(raw_data["value"].replace("-", 0), errors="coerce").fillna(0.0),
+    })
+    ugr_data = ugr_data[ugr_data["energy_type"].notna()]
 
     
-    # 9. Aggregate the Data
-    # Group by industry_sector and energy_type, then sum the values = summing up the energy usage per industry_sector and energy carrier
-    grouped_data = year_data.groupby(["industry_sector", "energy_type"])["value"].sum().unstack()
+    # 5. Aggregate the Data
+    # Group by year, industry_sector and energy_type, then sum the values = summing up the energy usage per industry_sector and energy carrier
+    grouped_data = ugr_data.groupby(["year", "industry_sector", "energy_type"])["value"].sum().unstack()
     """ grouped_data:
-    48 rows x 3 columns
-    industry_sector (=index), power, gas, petrol
+    21 years * 48 rows x 3 columns
+    [year, industry_sector] (=index), power, gas, petrol
     """
     
     
-    # 10. Convert Energy Units from TJ to MWh
-    # Rename columns
-    column_mapping = {
-        "power[TJ]": "power[MWh]",
-        "gas[TJ]": "gas[MWh]",
-        "petrol[TJ]": "petrol[MWh]"
-    }
-
-    for col in grouped_data.columns:
-        grouped_data[col] = (grouped_data[col] * 1000) / 3.6
-    grouped_data = grouped_data.rename(columns=column_mapping)
+    # 6. Convert Energy Units from TJ to MWh, ensure all energy types exist and reorder the columns
+    grouped_data = (grouped_data * 1000) / 3.6
+    grouped_data = grouped_data.rename(columns=lambda col: col.replace("[TJ]", "[MWh]"))
+    result_df = grouped_data.reindex(columns=["power[MWh]", "gas[MWh]", "petrol[MWh]"], fill_value=0)
+    result_df.columns.name = None
     
 
-    # 11. Rename and Reorder Columns
-    # Ensure all energy types exist in the DataFrame
-    for energy_type in ["power", "gas", "petrol"]:
-        if energy_type not in grouped_data.columns:
-            grouped_data[energy_type] = 0
-    
-    # Reorder columns
-    ordered_columns = ["power[MWh]", "gas[MWh]", "petrol[MWh]"]
-    result_df = grouped_data[ordered_columns]
+    # 7. Save the Preprocessed Data
+    cache_file = load_config("base_config.yaml")['ugr_preprocessed_cache_file']
+    save_cache(result_df, cache_file, stage="ugr")
     
 
-    # 12. Save the Preprocessed Data
-    # Create directory if it doesn't exist
-    processed_dir = load_config("base_config.yaml")['preprocessed_dir']
-    processed_file = os.path.join(processed_dir, f"ugr_preprocessed_{year}.csv")
-    os.makedirs(processed_dir, exist_ok=True)
-    # Save the DataFrame
-    result_df.to_csv(processed_file)
-    
-    
-    # 13. Return the DataFrame
+    return result_df
+
+
+def get_ugr_range_resolution_matrix(industry_sectors: Iterable, employees_by_WZ: pd.Series) -> pd.DataFrame:
     """
-    result_df:
-    48 rows x 3 columns
-    industry_sector (=index), power, gas, petrol
+    Returns the matrix that resolves the UGR industry_sector ranges (e.g. '10-12') to single WZ codes.
+    Every column holds the shares of a range that are assigned to the WZ codes:
+        - range with employees: employee_wz / sum_employees_range (only WZ codes with employees data)
+        - range without employees: 1 / len(range) for every WZ code of the range
+        - single WZ code: 1
+    consumption_by_wz = matrix @ ugr_data_ranges
+
+    Args:
+        industry_sectors : Iterable
+            index of the UGR data: WZ ranges and single WZ codes
+        employees_by_WZ : pd.Series
+            national employees per WZ code
+
+    Returns:
+        pd.DataFrame
+            index: WZ codes (in the order of the ranges)
+            columns: industry_sectors of the UGR data
     """
-    return result_df
+    industry_sectors = list(industry_sectors)
+
+    # 1. membership of the WZ codes in the ranges = aggregation operator WZ -> ranges, a WZ code that appears in several ranges keeps the last one
+    wz_codes = list(dict.fromkeys(wz for industry_sector in industry_sectors for wz in get_industry_sector_group_members(industry_sector)))
+    membership = get_industry_sector_aggregation_matrix(wz_codes, industry_sectors).to_numpy()
+
+    # 2. employee shares of the ranges
+    employees = employees_by_WZ.reindex(wz_codes)
+    has_employees = employees.notna().to_numpy()
+    weighted = membership * employees.fillna(0).to_numpy(dtype=float)[:, None]
+    total_employees_in_range = weighted.sum(axis=0)
+    is_range = np.array([isinstance(industry_sector, str) and '-' in industry_sector for industry_sector in industry_sectors])
+    with_employees = is_range & (total_employees_in_range > 0)
+
+    #  - range with employees: employee share, range without employees: equal shares, single WZ code: 1
+    matrix = np.where(with_employees, weighted / np.where(with_employees, total_employees_in_range, 1.0), membership / np.maximum(membership.sum(axis=0), 1.0))
+
+    # 3. only WZ codes with employees data resolve ranges with employees
+    keep = has_employees | ~(membership[:, with_employees].any(axis=1))
+    matrix = matrix[keep]
+    wz_codes = [wz for wz, kept in zip(wz_codes, keep) if kept]
 
+    # 4. WZ codes as integers
+    index = pd.Index(wz_codes)
+    if all(isinstance(idx, (int, np.integer)) or (isinstance(idx, str) and idx.isdigit()) for idx in wz_codes):
+        index = index.astype(int)
 
-def resolve_ugr_industry_sector_ranges_by_employees(ugr_data_ranges: pd.DataFrame, employees_by_industry_sector_and_regional_ids: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame(matrix, index=index, columns=industry_sectors)
+
+
+def resolve_ugr_industry_sector_ranges_by_employees(ugr_data_ranges: pd.DataFrame, employees_by_industry_sector_and_regional_ids) -> pd.DataFrame:
     """
     Resolve WZ ranges in consumption data to individual WZ codes based on employee distribution.
     consumption_wz = total_consumption_range * (employee_wz / sum_employees_range)
+    The ranges of all energy carriers (and years) are resolved with one matrix product, see get_ugr_range_resolution_matrix().
     
     Args:
         ugr_data_ranges : pd.DataFrame
             DataFrame with WZ ranges as index and consumption values for gas and power
-        employees_by_industry_sector_and_regional_ids : pd.DataFrame
+            or a stack of years: MultiIndex [year, industry_sector]
+        employees_by_industry_sector_and_regional_ids : pd.DataFrame or dict
             DataFrame with employees per industry_sector and regional code
-        year : int
-            Year for data
+            for a stack of years: {year: DataFrame} (a single DataFrame is used for all years)
         
     Returns:
         pd.DataFrame
             DataFrame with individual WZ codes and their consumption values
+            for a stack of years: MultiIndex [year, industry_sector]
 
     """
-        # Create an empty DataFrame to store the result
-    consumption_by_wz = pd.DataFrame(columns=ugr_data_ranges.columns)
-    
-    # Convert employees dataframe to national totals
-    employees_by_WZ = employees_by_industry_sector_and_regional_ids.sum(axis=1)
-    
-    # Process each entry in the consumption data
-    for wz_code, row in ugr_data_ranges.iterrows():
-        # Check if the index is a range (contains a hyphen)
-        if isinstance(wz_code, str) and '-' in wz_code:
-            # Extract the range bounds
-            start_wz, end_wz = map(int, wz_code.split('-'))
-            wz_range = range(start_wz, end_wz + 1)
-            
-            # Get total employees in this range
-            total_employees_in_range = sum(employees_by_WZ.get(wz, 0) for wz in wz_range)
-            
-            if total_employees_in_range > 0:
-                # Distribute consumption based on employee ratio
-                for wz in wz_range:
-                    if wz in employees_by_WZ:
-                        employee_ratio = employees_by_WZ[wz] / total_employees_in_range
-                        
-                        # Allocate consumption according to employee ratio
-                        consumption_values = {
-                            col: row[col] * employee_ratio for col in row.index
-                        }
-                        consumption_by_wz.loc[wz] = consumption_values
-            else:
-                # If no employees in range, distribute equally
-                for wz in wz_range:
-                    consumption_values = {
-                        col: row[col] / len(wz_range) for col in row.index
-                    }
-                    consumption_by_wz.loc[wz] = consumption_values
-        else:
-            # If not a range, keep as is
-            consumption_by_wz.loc[wz_code] = row
-    
-    # Ensure WZ codes are integers
-    if all(isinstance(idx, (int, np.integer)) or (isinstance(idx, str) and idx.isdigit()) 
-           for idx in consumption_by_wz.index):
-        consumption_by_wz.index = consumption_by_wz.index.astype(int)
+    # 1. stack of years: resolve every year with its own employees matrix in one einsum
+    if isinstance(ugr_data_ranges.index, pd.MultiIndex):
+        years = ugr_data_ranges.index.get_level_values(0).unique()
+        industry_sectors = ugr_data_ranges.index.get_level_values(1).unique()
+        ugr_stack = np.stack([ugr_data_ranges.loc[year].reindex(industry_sectors).fillna(0).to_numpy(dtype=float) for year in years])
+
+        matrices = []
+        for year in years:
+            employees = employees_by_industry_sector_and_regional_ids[year] if isinstance(employees_by_industry_sector_and_regional_ids, dict) else employees_by_industry_sector_and_regional_ids
+            matrices.append(get_ugr_range_resolution_matrix(industry_sectors, employees.sum(axis=1)))
+        wz_index = matrices[0].index.append([matrix.index for matrix in matrices[1:]]).unique()
+        matrix_stack = np.stack([matrix.reindex(wz_index).fillna(0).to_numpy() for matrix in matrices])
+
+        consumption_stack = np.einsum('ywr,yrc->ywc', matrix_stack, ugr_stack)
+        consumption_by_wz = pd.DataFrame(consumption_stack.reshape(-1, len(ugr_data_ranges.columns)),
+                                         index=pd.MultiIndex.from_product([years, wz_index], names=[ugr_data_ranges.index.names[0], ugr_data_ranges.index.names[1]]),
+                                         columns=ugr_data_ranges.columns)
+
+    # 2. single year
+    else:
+        # Convert employees dataframe to national totals
+        employees_by_WZ = employees_by_industry_sector_and_regional_ids.sum(axis=1)
+        matrix = get_ugr_range_resolution_matrix(ugr_data_ranges.index, employees_by_WZ)
+        consumption_by_wz = pd.DataFrame(matrix.to_numpy() @ ugr_data_ranges.to_numpy(dtype=float), index=matrix.index, columns=ugr_data_ranges.columns)
 
 
     #validate result: consumption sum of the rows must be close to equal before and after (due to rounding)
@@ -309,15 +312,15 @@ def get_total_gas_industry_self_consuption(year, force_preprocessing=False):
     # Using an apply ensures that each value is cast to int.
     updated_cache["year"] = updated_cache["year"].apply(lambda x: int(x) if pd.notnull(x) else x)
     
-    # Save the updated cache back to CSV.
+    # Save the updated cache.
     file_path_cache = load_config("base_config.yaml")['gas_industry_self_consumption_cache_file']
-    updated_cache.to_csv(file_path_cache, index=False)
+    save_cache(updated_cache, file_path_cache, index=False, stage="gas_self_consumption")
     
     return GV_slf_gen_global
 
 
 
-def calculate_self_generation(consumption_df: pd.DataFrame, total_gas_self_consuption: float, decomposition_factors: pd.DataFrame, year: int) -> Tuple[pd.DataFrame, pd.Series, pd.Series]:
+def calculate_self_generation(consumption_df: pd.DataFrame, total_gas_self_consuption: float, decomposition_factors: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series, pd.Series]:
 
     """
     Computes power and gas self-generation metrics and appends them to the input consumption DataFrame.
@@ -357,11 +360,6 @@ def calculate_self_generation(consumption_df: pd.DataFrame, total_gas_self_consu
 
     # fill the missing values with 1 (happens if there is no gas consumption and the above valculation tries deviding by 0)
     df.fillna(1, inplace=True)
-
-    # cache factor_gas_no_selfgen
-    template = load_config("base_config.yaml")['factor_gas_no_selfgen_cache_file']
-    path = template.format(year=year)
-    df[['factor_gas_no_selfgen']].to_csv(path, index=True, index_label='industry_sector')
     
     # Return both the enriched DataFrame and the key factors
     return df, df['factor_selfgen_of_total_power'], df['factor_gas_no_selfgen']
@@ -536,7 +534,106 @@ def calculate_regional_energy_consumption(consumption_data, energy_carrier, year
     return consumption_data
 
 
-def calculate_iteratively_industry_regional_consumption(sector_energy_consumption_ugr, regional_energy_consumption_jevi, employees_by_industry_sector_and_regional_ids):
+def calibrate_specific_consumption(specific: np.ndarray, employees: np.ndarray, regional_target: np.ndarray, sector_target: np.ndarray,
+                                   region_stop_sums: np.ndarray, sector_counts: np.ndarray, iterations: int = 8, max_pass_iterations: int = 10,
+                                   region_tolerance: float = 0.1, sector_tolerance: float = 0.01, min_specific: float = 10) -> Tuple[np.ndarray, dict]:
+    """
+    Adjusts the specific consumption (MWh per employee) of the energy intensive industry sectors until the modelled
+    consumption (employees * specific consumption) matches the regional consumption (JEVI) and the consumption per
+    industry sector (UGR). Array version of the iteration of the old dissaggregator, all energy carriers are solved at once.
+
+    Every iteration runs two correction passes:
+        1. regions: where the normalized error of a region is above region_tolerance its specific consumption is scaled
+           by regional_target / model, afterwards all values are scaled to the regional total
+        2. sectors: where the normalized error of an industry sector is above sector_tolerance its specific consumption
+           is scaled by sector_target / model
+    The specific consumption is at least min_specific. A pass stops when all correction factors are 1 or after max_pass_iterations checks.
+
+    Args:
+        specific: np.ndarray (carriers, industry_sectors, regions)
+            initial specific consumption, carriers with fewer industry sectors are padded with 0
+        employees: np.ndarray (carriers, industry_sectors, regions)
+            employees, padded with 0
+        regional_target: np.ndarray (carriers, regions)
+            consumption of the energy intensive industry sectors per region
+        sector_target: np.ndarray (carriers, industry_sectors)
+            consumption per industry sector, padded with 0
+        region_stop_sums: np.ndarray (carriers,)
+            the regions pass stops when the sum of the correction factors equals this value (= number of regions)
+        sector_counts: np.ndarray (carriers,)
+            number of industry sectors (without padding) per carrier
+
+    Returns:
+        Tuple:
+            - np.ndarray (carriers, industry_sectors, regions): adjusted specific consumption
+            - dict: convergence diagnostics, arrays (carriers, iterations):
+                - region_iterations, sector_iterations: checks used in the pass
+                - region_residual, sector_residual: max. absolute normalized error of the last check of the pass
+    """
+
+    specific = np.array(specific, dtype=float)
+    employees = np.ascontiguousarray(employees, dtype=float)
+    regional_target = np.asarray(regional_target, dtype=float)
+    sector_target = np.asarray(sector_target, dtype=float)
+    n_carriers, n_sectors, n_regions = specific.shape
+
+    region_total = np.nansum(regional_target, axis=1)
+    region_mean = region_total / n_regions
+    sector_mean = np.nansum(sector_target, axis=1) / np.asarray(sector_counts)
+
+    diagnostics = {
+        'region_iterations': np.zeros((n_carriers, iterations), dtype=int),
+        'region_residual': np.zeros((n_carriers, iterations)),
+        'sector_iterations': np.zeros((n_carriers, iterations), dtype=int),
+        'sector_residual': np.zeros((n_carriers, iterations)),
+    }
+
+    consumption = employees * specific
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for iteration in range(iterations):
+
+            # 1. regions pass
+            active = np.ones(n_carriers, dtype=bool)
+            for i in range(1, max_pass_iterations + 1):
+                model = np.nansum(consumption, axis=1)
+                error = (regional_target - model) / region_mean[:, None]
+                factor = np.where(np.abs(error) > region_tolerance, regional_target / model, 1.0)
+                diagnostics['region_iterations'][active, iteration] = i
+                diagnostics['region_residual'][active, iteration] = np.nanmax(np.abs(error), axis=1)[active]
+
+                active &= factor.sum(axis=1) != region_stop_sums
+                if i == max_pass_iterations or not active.any():
+                    break
+
+                adjusted = specific * factor[:, None, :]
+                adjusted[adjusted < min_specific] = min_specific
+                adjusted *= (region_total / np.nansum(model, axis=1))[:, None, None]
+                specific = np.where(active[:, None, None], adjusted, specific)
+                consumption = employees * specific
+
+            # 2. sectors pass
+            active = np.ones(n_carriers, dtype=bool)
+            for k in range(1, max_pass_iterations + 1):
+                model = np.nansum(consumption, axis=2)
+                error = (sector_target - model) / sector_mean[:, None]
+                factor = np.where(np.abs(error) > sector_tolerance, sector_target / model, 1.0)
+                diagnostics['sector_iterations'][active, iteration] = k
+                diagnostics['sector_residual'][active, iteration] = np.nanmax(np.abs(error), axis=1)[active]
+
+                # padded industry sectors have a factor of 1
+                active &= factor.sum(axis=1) != n_sectors
+                if k == max_pass_iterations or not active.any():
+                    break
+
+                adjusted = specific * factor[:, :, None]
+                adjusted[adjusted < min_specific] = min_specific
+                specific = np.where(active[:, None, None], adjusted, specific)
+                consumption = employees * specific
+
+    return specific, diagnostics
+
+
+def calculate_iteratively_industry_regional_consumption(sector_energy_consumption_ugr, regional_energy_consumption_jevi, employees_by_industry_sector_and_regional_ids, return_diagnostics: bool = False):
     """
     Resolves the the consumption per industry_sector (from UGR) to regional_ids (with the help of JEVI) in an iterative approach.
     This applies only to the industry sector with heavy energy consumption; CTS industry sector is resolved by the employees data.
@@ -549,12 +646,14 @@ def calculate_iteratively_industry_regional_consumption(sector_energy_consumptio
         year: int, year to calculate the regional energy consumption for
         regional_energy_consumption_jevi: pd.DataFrame with regional energy consumption from JEVI: consumption per regional_id
         employees_by_industry_sector_and_regional_ids: pd.DataFrame with employees by industry_sector and regional_id
-        energy_carrier: str, energy carrier to calculate the consumption for: [power, gas, petrol]
+        return_diagnostics: bool, if True the convergence diagnostics of calibrate_specific_consumption() are returned as well
 
     Returns:
-        pd.DataFrame:
+        list: [power, gas, petrol] consumption pd.DataFrames:
             - index: industry_sectors
             - columns: regional_ids
+        pd.DataFrame (only if return_diagnostics): index [energy_carrier, iteration], columns: passes used and residuals
+            of the regions and the sectors pass
     """
 
     
@@ -620,25 +719,15 @@ def calculate_iteratively_industry_regional_consumption(sector_energy_consumptio
         'Petro_MWh': sector_energy_consumption_ugr['petrol[MWh]']
     })
 
-    iterations_power = 8
-    iterations_gas = 8
-    iterations_petrol = 8
-
-
     ##### calculate the specific demand per industry sector and regional_id with the old dissaggregator code #####
 
 
     # ======= START DATA PREPARATION =======
     # build dataframe with absolute elec and gas demand per district,
     # calculated from specific consumptions and number of employees
-    spez_gv_lk = pd.DataFrame(index=spez_gv.index, columns=lk_ags)
-    spez_sv_lk = pd.DataFrame(index=spez_sv.index, columns=lk_ags)
-    spez_petrol_lk = pd.DataFrame(index=spez_petro.index, columns=lk_ags)
-
-    for lk in lk_ags:
-        spez_gv_lk[lk] = spez_gv['spez. GV']
-        spez_sv_lk[lk] = spez_sv['spez. SV']
-        spez_petrol_lk[lk] = spez_petro['spez. Petro']
+    spez_gv_lk = pd.DataFrame(np.repeat(spez_gv[['spez. GV']].to_numpy(dtype=float), len(lk_ags), axis=1), index=spez_gv.index, columns=lk_ags)
+    spez_sv_lk = pd.DataFrame(np.repeat(spez_sv[['spez. SV']].to_numpy(dtype=float), len(lk_ags), axis=1), index=spez_sv.index, columns=lk_ags)
+    spez_petrol_lk = pd.DataFrame(np.repeat(spez_petro[['spez. Petro']].to_numpy(dtype=float), len(lk_ags), axis=1), index=spez_petro.index, columns=lk_ags)
 
     sv_lk_wz = bze_je_lk_wz * spez_sv_lk  # absolute electricty demand per dis
     gv_lk_wz = bze_je_lk_wz * spez_gv_lk  # absolute gas demand per district
@@ -646,15 +735,12 @@ def calculate_iteratively_industry_regional_consumption(sector_energy_consumptio
     # get energy intensive industrial demand and number of workers per LK
     # energy intensive means a specific consumption >= 10 MWh/worker
     sv_ind_branches = [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 22, 23, 24, 25, 27, 28, 29, 33]
-    sv_lk_wz_e_int = sv_lk_wz.loc[sv_ind_branches]
     bze_sv_e_int = bze_je_lk_wz.loc[sv_ind_branches]
 
     gv_ind_branches = [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 30]
-    gv_lk_wz_e_int = gv_lk_wz.loc[gv_ind_branches]
     bze_gv_e_int = bze_je_lk_wz.loc[gv_ind_branches]
 
     petro_ind_branches = [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 30]
-    petro_lk_wz_e_int = petro_lk_wz.loc[petro_ind_branches]
     bze_petrol_e_int = bze_je_lk_wz.loc[petro_ind_branches]
 
     # get industry branches with energy intensity < 10 MWh/worker
@@ -673,267 +759,44 @@ def calculate_iteratively_industry_regional_consumption(sector_energy_consumptio
 
 
     # 2. adjust the specific demand per industry sector and regional_id
-    # this is the old dissaggregator code refactored into a bastracter function to avoid code duplication
-    # in the old code ther was 400 and 401 -> we could not figure out where these were coming from -> we decided to just use the 400
-
-    
-    # ======= START CALCULATION =======
-    # start of iterations to adjust regional specific demand of energy
-    # energy intensive industries
-    ET = [2, 4, 5]
-    for et in ET:
-        if (et == 2):
-            sv_LK = pd.DataFrame(sv_LK_real.loc[:, 'Verbrauch e-int WZ'])
-            mean_value = sv_LK['Verbrauch e-int WZ'].sum() / len(sv_LK)
-            spez_sv_angepasst = spez_sv_e_int.copy()
-
-            # start loop for adjusting specific power consumption
-            while(iterations_power > 0):
-                iterations_power -= 1
-                y = True
-                i = 0
-                while(y):
-                    # adjust specific demand according to Regionalstatistik
-                    i += 1
-                    sv_LK.loc[:, 'SV Modell e-int [MWh]'] = (
-                        sv_lk_wz_e_int.sum())
-                    sv_LK.loc[:, 'Normierter relativer Fehler'] = (
-                        (sv_LK['Verbrauch e-int WZ']
-                         - sv_LK['SV Modell e-int [MWh]']) / mean_value)
-                    # create new column 'Anpassungsfaktor' and set it to 1.0 (float)
-                    sv_LK.loc[:, 'Anpassungsfaktor'] = 1.0
-                    # Perform the assignment
-                    sv_LK.loc[
-                        lambda x: abs(x['Normierter relativer Fehler']) > 0.1,
-                        'Anpassungsfaktor'
-                    ] = (
-                        sv_LK['Verbrauch e-int WZ'] / sv_LK['SV Modell e-int [MWh]']
-                    )
-                    if(sv_LK['Anpassungsfaktor'].sum() == 401):
-                        y = False
-                    elif(i < 10):
-                        spez_sv_angepasst = (spez_sv_angepasst
-                                             * sv_LK['Anpassungsfaktor']
-                                             .transpose())
-                        spez_sv_angepasst[spez_sv_angepasst < 10] = 10
-                        spez_sv_angepasst = (spez_sv_angepasst
-                                             * sv_LK['Verbrauch e-int WZ']
-                                             .sum()
-                                             / sv_LK['SV Modell e-int [MWh]']
-                                             .sum())
-                        sv_lk_wz_e_int = bze_sv_e_int * spez_sv_angepasst
-                    else:
-                        y = False
-                sv_wz = (pd.DataFrame(sv_lk_wz_e_int.sum(axis=1),
-                                      columns=['SV WZ Modell [MWh]']))
-                k = 0
-                z = True
-                while(z):
-                    # compare adjusted demand to projected demand based on UGR
-                    # adjust specific demands for energy intensive industries
-                    k = k + 1
-                    sv_wz_ugr = (pd.DataFrame(index=sv_ind_branches,
-                                              columns=['SV_MWh_UGR']))
-                    sv_wz_ugr['SV_MWh_UGR'] = (df_ec['SV_MWh']
-                                               .loc[sv_ind_branches]
-                                               .values)
-                    sv_wz_ugr = sv_wz_ugr.merge(sv_wz['SV WZ Modell [MWh]'],
-                                                left_index=True,
-                                                right_index=True)
-                    mean_value2 = sv_wz_ugr['SV_MWh_UGR'].sum()/len(sv_wz_ugr)
-                    sv_wz_ugr.loc[:, 'Normierter relativer Fehler'] = (
-                        (sv_wz_ugr['SV_MWh_UGR']
-                         - sv_wz_ugr['SV WZ Modell [MWh]'])/mean_value2)
-                    # create new column 'Anpassungsfaktor' and set it to 1.0 (float)
-                    sv_wz_ugr.loc[:, 'Anpassungsfaktor'] = 1.0 
-
-                    sv_wz_ugr.loc[lambda x:
-                                  abs(x['Normierter relativer Fehler']) > 0.01,
-                                  'Anpassungsfaktor'] = (
-                                      sv_wz_ugr['SV_MWh_UGR']
-                                      / sv_wz_ugr['SV WZ Modell [MWh]'])
-                    sv_wz['Anpassungsfaktor'] = sv_wz_ugr['Anpassungsfaktor']
-                    # End of this iteration if all correction factors
-                    # ('Anpassungsfaktor') are equal to 1, otherwise adjust
-                    # specific demand by correction factor and continue
-                    # iteraions until 9 iterations are complete
-
-                    if(sv_wz['Anpassungsfaktor'].sum() == len(sv_wz)):
-                        z = False
-                    elif(k < 10):
-                        spez_sv_angepasst = (spez_sv_angepasst
-                                             .multiply(sv_wz
-                                                       ['Anpassungsfaktor'],
-                                                       axis=0))
-                        spez_sv_angepasst[spez_sv_angepasst < 10] = 10
-                        sv_lk_wz_e_int = bze_sv_e_int * spez_sv_angepasst
-                        sv_wz = pd.DataFrame(sv_lk_wz_e_int.sum(axis=1),
-                                             columns=['SV WZ Modell [MWh]'])
-                    else:
-                        z = False
-        elif (et == 4):  # start adjusting loop for gas
-            gv_LK = pd.DataFrame(gv_LK_real.loc[:, 'Verbrauch e-int WZ'])
-            mean_value = gv_LK['Verbrauch e-int WZ'].sum() / len(gv_LK)
-            spez_gv_angepasst = spez_gv_e_int.copy()
-            while(iterations_gas > 0):
-                iterations_gas -= 1
-                y = True
-                i = 0
-                while(y):
-                    i += 1
-                    gv_LK.loc[:, 'GV Modell e-int [MWh]'] = (
-                        gv_lk_wz_e_int.sum())
-                    gv_LK.loc[:, 'Normierter relativer Fehler'] = (
-                        (gv_LK['Verbrauch e-int WZ']
-                         - gv_LK['GV Modell e-int [MWh]']) / mean_value)
-                    #create new column 'Anpassungsfaktor' and set it to 1.0 (float)
-                    gv_LK.loc[:, 'Anpassungsfaktor'] = 1.0
-                    gv_LK.loc[lambda x:
-                              abs(x['Normierter relativer Fehler']) > 0.1,
-                              'Anpassungsfaktor'] = (
-                                  gv_LK['Verbrauch e-int WZ']
-                                  / gv_LK['GV Modell e-int [MWh]'])
-                    if(gv_LK['Anpassungsfaktor'].sum() == 400):
-                        y = False
-                    elif(i < 10):
-                        spez_gv_angepasst = (spez_gv_angepasst
-                                             * gv_LK['Anpassungsfaktor']
-                                             .transpose())
-                        spez_gv_angepasst[spez_gv_angepasst < 10] = 10
-                        spez_gv_angepasst = (spez_gv_angepasst
-                                             * gv_LK['Verbrauch e-int WZ']
-                                             .sum()
-                                             / gv_LK['GV Modell e-int [MWh]']
-                                             .sum())
-                        gv_lk_wz_e_int = bze_gv_e_int * spez_gv_angepasst
-                    else:
-                        y = False
-                gv_wz = pd.DataFrame(gv_lk_wz_e_int.sum(axis=1),
-                                     columns=['GV WZ Modell [MWh]'])
-                k = 0
-                z = True
-                while(z):
-                    k = k + 1
-                    gv_wz_ugr = (pd.DataFrame(index=gv_ind_branches,
-                                              columns=['GV_MWh_UGR']))
-                    gv_wz_ugr['GV_MWh_UGR'] = (df_ec['GV_MWh']
-                                               .loc[gv_ind_branches]
-                                               .values)
-                    gv_wz_ugr = gv_wz_ugr.merge(gv_wz['GV WZ Modell [MWh]'],
-                                                left_index=True,
-                                                right_index=True)
-                    mean_value2 = gv_wz_ugr['GV_MWh_UGR'].sum()/len(gv_wz_ugr)
-                    gv_wz_ugr.loc[:, 'Normierter relativer Fehler'] = (
-                        (gv_wz_ugr['GV_MWh_UGR']
-                         - gv_wz_ugr['GV WZ Modell [MWh]'])/mean_value2)
-                    gv_wz_ugr.loc[:, 'Anpassungsfaktor'] = 1.0
-                    gv_wz_ugr.loc[lambda x:
-                                  abs(x['Normierter relativer Fehler']) > 0.01,
-                                  'Anpassungsfaktor'] = (
-                                      gv_wz_ugr['GV_MWh_UGR']
-                                      / gv_wz_ugr['GV WZ Modell [MWh]'])
-                    gv_wz['Anpassungsfaktor'] = gv_wz_ugr['Anpassungsfaktor']
-                    # End of this iteration if all correction factors
-                    # ('Anpassungsfaktor') are equal to 1, otherwise adjust
-                    # specific demand by correction factor and continue
-                    # iteraions until 9 iterations are complete
-
-                    if(gv_wz['Anpassungsfaktor'].sum() == len(gv_wz)):
-                        z = False
-                    elif(k < 10):
-                        spez_gv_angepasst = (spez_gv_angepasst.multiply(
-                            gv_wz['Anpassungsfaktor'], axis=0))
-                        spez_gv_angepasst[spez_gv_angepasst < 10] = 10
-                        gv_lk_wz_e_int = bze_gv_e_int * spez_gv_angepasst
-                        gv_wz = pd.DataFrame(gv_lk_wz_e_int.sum(axis=1),
-                                             columns=['GV WZ Modell [MWh]'])
-                    else:
-                        z = False
-        elif (et == 5):  # start adjusting loop for petrol
-            petrol_LK = pd.DataFrame(petro_LK_real.loc[:, 'Verbrauch e-int WZ'])
-            mean_value = petrol_LK['Verbrauch e-int WZ'].sum() / len(petrol_LK)
-            spez_petrol_angepasst = spez_petrol_e_int.copy()
-            while(iterations_petrol > 0):
-                iterations_petrol -= 1
-                y = True
-                i = 0
-                while(y):
-                    i += 1
-                    petrol_LK.loc[:, 'Petrol Modell e-int [MWh]'] = (
-                        petro_lk_wz_e_int.sum())
-                    petrol_LK.loc[:, 'Normierter relativer Fehler'] = (
-                        (petrol_LK['Verbrauch e-int WZ'] - petrol_LK['Petrol Modell e-int [MWh]']) / mean_value)
-                    #create new column 'Anpassungsfaktor' and set it to 1.0 (float)
-                    petrol_LK.loc[:, 'Anpassungsfaktor'] = 1.0
-                    petrol_LK.loc[lambda x:
-                              abs(x['Normierter relativer Fehler']) > 0.1,
-                              'Anpassungsfaktor'] = (
-                                  petrol_LK['Verbrauch e-int WZ']
-                                  / petrol_LK['Petrol Modell e-int [MWh]'])
-                    if(petrol_LK['Anpassungsfaktor'].sum() == 400):
-                        y = False
-                    elif(i < 10):
-                        spez_petrol_angepasst = (spez_petrol_angepasst
-                                             * petrol_LK['Anpassungsfaktor']
-                                             .transpose())
-                        spez_petrol_angepasst[spez_petrol_angepasst < 10] = 10
-                        spez_petrol_angepasst = (spez_petrol_angepasst
-                                             * petrol_LK['Verbrauch e-int WZ']
-                                             .sum()
-                                             / petrol_LK['Petrol Modell e-int [MWh]']
-                                             .sum())
-                        petro_lk_wz_e_int = bze_petrol_e_int * spez_petrol_angepasst
-                    else:
-                        y = False
-                petrol_wz = pd.DataFrame(petro_lk_wz_e_int.sum(axis=1),
-                                     columns=['Petrol WZ Modell [MWh]'])
-                k = 0
-                z = True
-                while(z):
-                    k = k + 1
-                    petrol_wz_ugr = (pd.DataFrame(index=petro_ind_branches,
-                                              columns=['Petrol_MWh_UGR']))
-                    petrol_wz_ugr['Petrol_MWh_UGR'] = (df_ec['Petro_MWh']
-                                               .loc[petro_ind_branches]
-                                               .values)
-                    petrol_wz_ugr = petrol_wz_ugr.merge(petrol_wz['Petrol WZ Modell [MWh]'],
-                                                left_index=True,
-                                                right_index=True)
-                    mean_value2 = petrol_wz_ugr['Petrol_MWh_UGR'].sum()/len(petrol_wz_ugr)
-                    petrol_wz_ugr.loc[:, 'Normierter relativer Fehler'] = (
-                        (petrol_wz_ugr['Petrol_MWh_UGR']
-                         - petrol_wz_ugr['Petrol WZ Modell [MWh]'])/mean_value2)
-                    petrol_wz_ugr.loc[:, 'Anpassungsfaktor'] = 1.0
-                    petrol_wz_ugr.loc[lambda x:
-                                  abs(x['Normierter relativer Fehler']) > 0.01,
-                                  'Anpassungsfaktor'] = (
-                                      petrol_wz_ugr['Petrol_MWh_UGR']
-                                      / petrol_wz_ugr['Petrol WZ Modell [MWh]'])
-                    petrol_wz['Anpassungsfaktor'] = petrol_wz_ugr['Anpassungsfaktor']
-                    # End of this iteration if all correction factors
-                    # ('Anpassungsfaktor') are equal to 1, otherwise adjust
-                    # specific demand by correction factor and continue
-                    # iteraions until 9 iterations are complete
-
-                    if(petrol_wz['Anpassungsfaktor'].sum() == len(petrol_wz)):
-                        z = False
-                    elif(k < 10):
-                        spez_petrol_angepasst = (spez_petrol_angepasst.multiply(
-                            petrol_wz['Anpassungsfaktor'], axis=0))
-                        spez_petrol_angepasst[spez_petrol_angepasst < 10] = 10
-                        petro_lk_wz_e_int = bze_petrol_e_int * spez_petrol_angepasst
-                        petrol_wz = pd.DataFrame(petro_lk_wz_e_int.sum(axis=1),
-                                             columns=['Petrol WZ Modell [MWh]'])
-                    else:
-                        z = False
-                    # ======= END CALCULATION =======
-
-
-
-
-    spez_sv_lk.loc[list(spez_sv_angepasst.index)] = spez_sv_angepasst.values
-    spez_gv_lk.loc[list(spez_gv_angepasst.index)] = spez_gv_angepasst.values
-    spez_petrol_lk.loc[list(spez_petrol_angepasst.index)] = spez_petrol_angepasst.values
+    # the iteration of the old dissaggregator code is solved for all energy carriers at once in calibrate_specific_consumption()
+    # in the old code ther was 400 and 401 -> we could not figure out where these were coming from -> the 401 of power is kept
+    # (the regions pass for power never stops early) to reproduce the results
+    carriers = {
+        # carrier: (branches, specific demand, employees, regional consumption (JEVI), sector consumption (UGR), stop sum regions pass, spez_lk)
+        "power": (sv_ind_branches, spez_sv_e_int, bze_sv_e_int, sv_LK_real['Verbrauch e-int WZ'], df_ec['SV_MWh'], 401, spez_sv_lk),
+        "gas": (gv_ind_branches, spez_gv_e_int, bze_gv_e_int, gv_LK_real['Verbrauch e-int WZ'], df_ec['GV_MWh'], 400, spez_gv_lk),
+        "petrol": (petro_ind_branches, spez_petrol_e_int, bze_petrol_e_int, petro_LK_real['Verbrauch e-int WZ'], df_ec['Petro_MWh'], 400, spez_petrol_lk),
+    }
+
+    # 2.1 stack the carriers into (carrier, industry_sector, regional_id) arrays, carriers with fewer industry sectors are padded with 0
+    n_branches = max(len(branches) for branches, *_ in carriers.values())
+    specific = np.zeros((len(carriers), n_branches, len(lk_ags)))
+    employees = np.zeros((len(carriers), n_branches, len(lk_ags)))
+    regional_target = np.zeros((len(carriers), len(lk_ags)))
+    sector_target = np.zeros((len(carriers), n_branches))
+    for c, (branches, spez_e_int, bze_e_int, lk_real, ugr, _, _) in enumerate(carriers.values()):
+        specific[c, :len(branches)] = spez_e_int.reindex(columns=lk_ags).to_numpy(dtype=float)
+        employees[c, :len(branches)] = bze_e_int.reindex(columns=lk_ags).to_numpy(dtype=float)
+        regional_target[c] = lk_real.reindex(lk_ags).to_numpy(dtype=float)
+        sector_target[c, :len(branches)] = ugr.loc[branches].to_numpy(dtype=float)
+
+    # 2.2 solve
+    specific, diagnostics = calibrate_specific_consumption(
+        specific=specific,
+        employees=employees,
+        regional_target=regional_target,
+        sector_target=sector_target,
+        region_stop_sums=np.array([carrier[5] for carrier in carriers.values()]),
+        sector_counts=np.array([len(carrier[0]) for carrier in carriers.values()]),
+    )
+    diagnostics = pd.concat({carrier: pd.DataFrame({name: values[c] for name, values in diagnostics.items()}).rename_axis('iteration')
+                             for c, carrier in enumerate(carriers.keys())}, names=['energy_carrier'])
+    logger.debug(f"Calibration of the specific consumption, residuals of the last iteration:\n{diagnostics.xs(diagnostics.index.get_level_values('iteration').max(), level='iteration')}")
+
+    # 2.3 write the adjusted specific demand back
+    for c, (branches, _, _, _, _, _, spez_lk) in enumerate(carriers.values()):
+        spez_lk.loc[branches] = specific[c, :len(branches)]
 
 
     #  HACK for Wolfsburg: There is no energy demand available Wolfsburg in the
@@ -984,6 +847,9 @@ def calculate_iteratively_industry_regional_consumption(sector_energy_consumptio
     ):
         raise ValueError("total_petrol_consumption is not equal to sector_energy_consumption_ugr['petrol[MWh]']")
 
+    if return_diagnostics:
+        return [total_power_consumption, total_gas_consumption, total_petrol_consumption], diagnostics
+
     return [total_power_consumption, total_gas_consumption, total_petrol_consumption]
 
 
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from src.data_access.local_reader import *
 from src.utils.utils import *
@@ -38,29 +39,45 @@ def apply_efficiency_factor(consumption_data: pd.DataFrame, sector: str, energy_
         raise ValueError("energy_carrier must be either 'power' or 'gas'")
 
 
+    # apply the efficiency factor of the year
+    consumption_data_efficiency_factor = apply_efficiency_factor_years(consumption_data, sector, energy_carrier, [year]).xs(year, level="year")
+
+
+    return consumption_data_efficiency_factor
+
+
+def get_efficiency_factors(sector: str, energy_carrier: str, years: list) -> pd.DataFrame:
+    """
+    Computes the efficiency enhancement factors of several years at once (efficiency rates are loaded once).
+    Until 2019 there are no efficiency enhancements, from 2019 to 2035 the first rate and after 2035 the second rate is applied.
+
+    Args:
+        sector (str): 'cts' or 'industry'
+        energy_carrier (str): 'power' or 'gas'
+        years (list): years from 2000 to 2050
+
+    Returns:
+        pd.DataFrame: efficiency factors
+            Index: year
+            Columns: industry_sector (industry) or application (cts)
+    """
     # load the efficiency rate
     eff_rate = load_efficiency_rate(sector, energy_carrier)
 
 
-    # calculate the efficiency factor
-    if year <= 2019:
-        # our base year is 2018, below that we have no efficiency enhancements
-        #efficiency_factor = pd.DataFrame(1.0, index=eff_rate.columns, columns=eff_rate.index).transpose()
-        efficiency_factor = pd.Series(1.0, index=eff_rate.columns)
-    else:
-        # if year is in the future, function returns a df with calculated enhancement-levels based on year 2019
-        years_phase1 = min(year - 2019, 2035 - 2019)
+    # calculate the efficiency factor: our base year is 2019, below that we have no efficiency enhancements (exponents 0)
+    rate_phase1 = eff_rate.iloc[0].to_numpy(dtype=float)
+    rate_phase2 = eff_rate.iloc[1].to_numpy(dtype=float)
+    factors = []
+    for year in years:
+        years_phase1 = min(max(year - 2019, 0), 2035 - 2019)
         years_phase2 = max(year - 2035, 0)
+        # pow(): pow(2, 3) = 2^3
+        factors.append(pow(1 - rate_phase1, years_phase1) * pow(1 - rate_phase2, years_phase2))
 
-        efficiency_factor = (
-            # pow(): pow(2, 3) = 2^3
-            pow(1 - eff_rate.iloc[0], years_phase1) * pow(1 - eff_rate.iloc[1], years_phase2)
-        )
-
-    if not isinstance(efficiency_factor, pd.Series):
-        raise ValueError("efficiency_factor is not a Series! Apply efficiency factor will fail.")
+    efficiency_factor = pd.DataFrame(np.array(factors), index=pd.Index(list(years), name="year"), columns=eff_rate.columns)
 
-    """ efficiency_factor output examples:
+    """ efficiency_factor output examples (one row):
     -> gas industry:
     industry_sector
     5     0.9810
@@ -145,30 +162,62 @@ def apply_efficiency_factor(consumption_data: pd.DataFrame, sector: str, energy_
     non_energetic_use                       1.000
     """
 
-    # apply the efficiency factor to the consumption data
-    # for industry per industry_sectors and for cts per applications
-    if sector == "industry":
-        consumption_data_efficiency_factor = consumption_data.mul(efficiency_factor, level=0, axis=1)
 
-        sectors_in_data = consumption_data.columns.get_level_values(0).unique()
-        sectors_in_factor = efficiency_factor.index.unique()
-        missing_sectors = sectors_in_data.difference(sectors_in_factor)
+    return efficiency_factor
+
+
+def apply_efficiency_factor_years(consumption_data: pd.DataFrame, sector: str, energy_carrier: str, years: list) -> pd.DataFrame:
+    """
+    Applies the efficiency enhancement factors of several years to the consumption data in one operation.
+    DISS 4.5.2 Modellierung des Effizienzeffekts
+
+    Args:
+        consumption_data (pd.DataFrame): Index: regional_id, MultiIndex columns: [industry_sector, application]
+        sector (str): 'cts' or 'industry'
+        energy_carrier (str): 'power' or 'gas'
+        years (list): years from 2000 to 2050
+
+    Returns:
+        pd.DataFrame: consumption data with efficiency enhancement factors applied
+            MultiIndex index: [year, regional_id]
+            MultiIndex columns: 
+                level=0: industry_sector
+                level=1: application
+    """
+    # validate inputs
+    if max(years) > 2050:
+        raise ValueError("`year` must be lower than or equal to 2050.")
+    if sector not in ["cts", "industry"]:
+        raise ValueError("Sector must be either 'cts' or 'industry'")
+    if energy_carrier not in ["power", "gas"]:
+        raise ValueError("energy_carrier must be either 'power' or 'gas'")
+
+
+    # 1. efficiency factors of all years
+    efficiency_factor = get_efficiency_factors(sector, energy_carrier, years)
+
+
+    # 2. for industry per industry_sectors and for cts per applications: check for missing factors
+    if sector == "industry":
+        column_keys = consumption_data.columns.get_level_values(0)
+        missing_sectors = column_keys.unique().difference(efficiency_factor.columns.unique())
         if not missing_sectors.empty:
             raise ValueError("Check the industry sectors names! Missing industry efficiency factors for:", missing_sectors.tolist())
 
-
     elif sector == "cts":
-        consumption_data_efficiency_factor = consumption_data.mul(efficiency_factor, level=1, axis=1)
-
-        # check for missing application efficiency factors
-        applications_in_data = consumption_data.columns.get_level_values(1).unique()
-        applications_in_factor = efficiency_factor.index.unique()
-        missing_apps = applications_in_data.difference(applications_in_factor)
+        column_keys = consumption_data.columns.get_level_values(1)
+        missing_apps = column_keys.unique().difference(efficiency_factor.columns.unique())
         if not missing_apps.empty:
             raise ValueError("Check the application names! Missing application efficiency factors for:", missing_apps.tolist())
 
 
-    return consumption_data_efficiency_factor
+    # 3. (years x 1 x columns) * (1 x regions x columns)
+    column_factors = efficiency_factor.reindex(columns=column_keys).to_numpy()
+    values = consumption_data.to_numpy(dtype=float)[None, :, :] * column_factors[:, None, :]
+
+    index = pd.MultiIndex.from_product([efficiency_factor.index, consumption_data.index], names=["year", consumption_data.index.name])
+
+    return pd.DataFrame(values.reshape(-1, consumption_data.shape[1]), index=index, columns=consumption_data.columns)
 
 
 def apply_activity_driver(consumption: pd.DataFrame, year_dataset: int, year_future: int):
@@ -198,22 +247,49 @@ def apply_activity_driver(consumption: pd.DataFrame, year_dataset: int, year_fut
     # Validate Inputs: activity drivers are only available for 2015-2050
     if year_dataset not in range(2015, 2051) or year_future not in range(2015, 2051):
         raise ValueError("year_dataset must be between 2015 and 2050. Use the historical consumption!")
+
+    consumption_projected = apply_activity_driver_years(consumption, year_dataset, [year_future]).xs(year_future, level="year")
+
+    return consumption_projected
+
+
+def apply_activity_driver_years(consumption: pd.DataFrame, year_dataset: int, years_future: list) -> pd.DataFrame:
+    """
+    [DISS 4.5]
+    Projects the consumption data to several future years at once, see apply_activity_driver().
+    The activity drivers are loaded, grouped and normalized once.
+
+    Args:
+        consumption (pd.DataFrame): consumption data, Index: industry_sector
+        year_dataset (int): year of the latest UGR data
+        years_future (list): years in the future to project the consumption to
+
+    Returns:
+        pd.DataFrame: consumption data with activity driver applied
+            MultiIndex index: [year, industry_sector]
+            Columns: ['power[MWh]', 'gas[MWh]', 'petrol[MWh]']
+    """
+
+    # Validate Inputs: activity drivers are only available for 2015-2050
+    if year_dataset not in range(2015, 2051) or any(year not in range(2015, 2051) for year in years_future):
+        raise ValueError("year_dataset must be between 2015 and 2050. Use the historical consumption!")
     
     # 2. Get Activity Drivers = Mengeneffekt
     activity_drivers = load_activity_driver_consumption()
 
     # 3. group industry sectors
     df_driver_total = group_activity_drivers(df_driver_total= activity_drivers, columns=consumption.index)
-    #df_driver_total = activity_drivers
 
     # 4. normalize activity drivers year_dataset
-    df_driver_norm = df_driver_total.apply(lambda x: x/x.loc[year_dataset])
+    df_driver_norm = df_driver_total / df_driver_total.loc[year_dataset]
 
-    # 5. get the wanted year
-    df_driver_norm_year = df_driver_norm.loc[year_future]
+    # 5. get the wanted years (industry_sectors without driver e.g. 35 are NaN)
+    df_driver_norm_years = df_driver_norm.loc[list(years_future)].reindex(columns=consumption.index)
 
-    # 6. multiply with consumption
-    consumption_projected = consumption.mul(df_driver_norm_year, axis=0)
+    # 6. multiply with consumption: (years x industry_sectors x 1) * (1 x industry_sectors x energy carriers)
+    values = consumption.to_numpy(dtype=float)[None, :, :] * df_driver_norm_years.to_numpy(dtype=float)[:, :, None]
+    index = pd.MultiIndex.from_product([list(years_future), consumption.index], names=["year", consumption.index.name])
+    consumption_projected = pd.DataFrame(values.reshape(-1, consumption.shape[1]), index=index, columns=consumption.columns)
 
     # 7. set empty values to 0
     #consumption_projected = consumption_projected.fillna(0)
@@ -458,11 +458,13 @@ def get_future_vehicle_consumption_ugr_by_energy_carrier(year: int, end_year: in
     processed_dir = config["s3_future_ev_consumption_cache_dir"]
     processed_file = config["s3_future_ev_consumption_cache_file"]
     preprocessed_file_path = f"{processed_dir}/{processed_file}"
+    cache_params = {"end_year": end_year}
 
-    if not force_preprocessing and os.path.exists(preprocessed_file_path):
-        final_df = pd.read_csv(preprocessed_file_path, index_col=0)
-        final_df = final_df.loc[[year]]
-        return final_df
+    if not force_preprocessing:
+        final_df = load_cache(preprocessed_file_path, index_col=0, stage="ev_fuel_projection", params=cache_params)
+        if final_df is not None:
+            final_df = final_df.loc[[year]]
+            return final_df
 
 
     # 1. load last year of existing data & validate it
@@ -522,8 +524,7 @@ def get_future_vehicle_consumption_ugr_by_energy_carrier(year: int, end_year: in
 
 
     # 10. save to cache
-    os.makedirs(processed_dir, exist_ok=True)
-    proj.to_csv(preprocessed_file_path)
+    save_cache(proj, preprocessed_file_path, stage="ev_fuel_projection", params=cache_params)
 
 
     # 11. filter for the requested year
@@ -643,7 +644,7 @@ def get_normalized_daily_ev_charging_profile_home(type: str, day_type: str) -> p
 
 
 
-def disaggregate_temporal_ev_consumption_for_state(ev_consumption_by_regional_id: pd.DataFrame, state: str, year: int, yearly_charging_profile: pd.DataFrame) -> pd.DataFrame:
+def disaggregate_temporal_ev_consumption_for_state(ev_consumption_by_regional_id: pd.DataFrame, state: str, year: int, yearly_charging_profile: pd.DataFrame, factorized: bool = False) -> pd.DataFrame:
     """
     Disaggregate the ev consumption by charging profile over the year in 10min steps.
 
@@ -656,6 +657,8 @@ def disaggregate_temporal_ev_consumption_for_state(ev_consumption_by_regional_id
             The year of the ev consumption
         yearly_charging_profile: pd.DataFrame
             The yearly normalized charging profile
+        factorized: bool
+            If True a FactorizedTimeseries (charging profiles x ev consumption) is returned
 
     Returns:
         pd.DataFrame
@@ -675,6 +678,22 @@ def disaggregate_temporal_ev_consumption_for_state(ev_consumption_by_regional_id
     ev_consumption = ev_consumption_by_regional_id.loc[
         [federal_state_dict().get(int(str(x)[:-3])) == state for x in ev_consumption_by_regional_id.index]
     ]
+
+
+    # 2. factorized: every column is a charging profile of the state times the consumption of the regional_id
+    if factorized:
+        charging_locations = yearly_charging_profile.columns
+        ev_consumption_by_regional_id_temporal = FactorizedTimeseries.from_profiles(
+            profiles=yearly_charging_profile,
+            profile_positions=np.tile(np.arange(len(charging_locations)), len(ev_consumption)),
+            scales=np.repeat(ev_consumption['power[mwh]'].to_numpy(dtype=float), len(charging_locations)),
+            columns=pd.MultiIndex.from_product([ev_consumption.index, charging_locations], names=['regional_id', 'charging_location'])
+        )
+
+        if not np.isclose(ev_consumption_by_regional_id_temporal.total(), ev_consumption.sum().sum()):
+            raise ValueError("The sum of the ev consumption by regional id temporal is not equal to the sum of the ev consumption by regional id!")
+
+        return ev_consumption_by_regional_id_temporal
     
 
     # 5. iterate over every regional_id and disaggregate the ev consumption by yearly_charging_profile
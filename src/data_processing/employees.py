@@ -1,11 +1,10 @@
 import pandas as pd
-import os
-from collections import defaultdict
 
 
 from src import logger
-from src.utils.utils import fix_region_id
+from src.utils.utils import fix_region_id, aggregate_industry_sectors
 from src.configs.config_loader import load_config
+from src.data_access.cache_storage import load_cache, save_cache
 from src.data_access.api_reader import get_historical_employees, get_future_employees
 from src.data_access.local_reader import load_activity_driver_employees
 from src.data_processing.normalization import normalize_region_ids_columns
@@ -46,10 +45,13 @@ def get_historical_employees_by_industry_sector_and_regional_id(year, force_prep
     # 3. Construct file path
     file_name = filename_pattern.format(year=year)
     preprocessed_file_path = f"{processed_dir}/{file_name}"
+    cache_params = {"year": year, "scenario": "historical"}
 
-    # 4. Check if file exists and force_preprocessing is False
-    if not force_preprocessing and os.path.exists(preprocessed_file_path):
-        return pd.read_csv(preprocessed_file_path, index_col=0)
+    # 4. Check if the (up to date) cache exists and force_preprocessing is False
+    if not force_preprocessing:
+        cached = load_cache(preprocessed_file_path, index_col=0, stage="employees", params=cache_params)
+        if cached is not None:
+            return cached
 
     ## Preprocessing needed
     # Load raw data
@@ -101,9 +103,8 @@ def get_historical_employees_by_industry_sector_and_regional_id(year, force_prep
     if pivoted_df.sum().sum() < 20000000 or pivoted_df.sum().sum() > 80000000:
         raise ValueError(f"Validity check failed: Number of employees: {pivoted_df.sum().sum()}. Must be between 20mio and 80mio")
     
-    ## Save to CSV
-    os.makedirs(processed_dir, exist_ok=True)
-    pivoted_df.to_csv(preprocessed_file_path)
+    ## Save to cache
+    save_cache(pivoted_df, preprocessed_file_path, stage="employees", params=cache_params)
 
     # Return
     return pivoted_df
@@ -145,10 +146,13 @@ def get_future_employees_by_industry_sector_and_regional_id(year, force_preproce
     # 3. Construct file path
     file_name = filename_pattern.format(year=year_requested)
     preprocessed_file_path = f"{processed_dir}/{file_name}"
+    cache_params = {"year": year_requested, "scenario": "future"}
 
-    # 4. Check if file exists and force_preprocessing is False
-    if not force_preprocessing and os.path.exists(preprocessed_file_path):
-        return pd.read_csv(preprocessed_file_path, index_col=0)
+    # 4. Check if the (up to date) cache exists and force_preprocessing is False
+    if not force_preprocessing:
+        cached = load_cache(preprocessed_file_path, index_col=0, stage="employees", params=cache_params)
+        if cached is not None:
+            return cached
 
     ## Preprocessing needed
     # Load raw data
@@ -189,9 +193,8 @@ def get_future_employees_by_industry_sector_and_regional_id(year, force_preproce
         raise ValueError(f"Validity check failed: Number of employees: {pivoted_df.sum().sum()}. Must be between 20mio and 80mio")
 
 
-    # Save to CSV
-    os.makedirs(processed_dir, exist_ok=True)
-    pivoted_df.to_csv(preprocessed_file_path)
+    # Save to cache
+    save_cache(pivoted_df, preprocessed_file_path, stage="employees", params=cache_params)
 
     # Return
     return pivoted_df
@@ -229,22 +232,11 @@ def get_employees_per_industry_sector_groups_and_regional_ids(year):
     # 3. translate industry sectors from openffe to our industry sectors and group the data based on the wz_dict groups
     # Transpose so regions are rows, industry_sector codes are columns
     df_employees = df_emp.transpose()
-    # Get mapping: {original_industry_sector: group_label}
+    # groups in the order of wz_dict(), groups without employees data are 0
     mapping = wz_dict()
-    # Create reverse mapping: {group_label: [original_industry_sector_codes]}
-    group_to_industry_sector = defaultdict(list)
-    for industry_sector, group in mapping.items():
-        group_to_industry_sector[group].append(industry_sector)
-    
-    # For each grouped label, sum the corresponding columns
-    df_employees_grouped = pd.DataFrame(index=df_employees.index)
-    for group_label, industry_sector_list in group_to_industry_sector.items():
-        # Filter only those industry_sector codes that actually exist in df_emp
-        valid_industry_sector = [industry_sector for industry_sector in industry_sector_list if industry_sector in df_emp.index]
-        if valid_industry_sector:
-            df_employees_grouped[group_label] = df_employees[valid_industry_sector].sum(axis=1)
-        else:
-            df_employees_grouped[group_label] = 0.0  # or np.nan if you prefer
+    groups = list(dict.fromkeys(mapping.values()))
+    df_employees_grouped = aggregate_industry_sectors(df_employees, groups=groups, mapping=mapping)
+    df_employees_grouped.columns.name = None
 
     return df_employees_grouped
 
@@ -162,8 +162,76 @@ def make_3level_timeseries(df_gas_switch: pd.DataFrame, state: str, year: int )
 
 
 
+def disagg_3level_timeseries_by_norms(df_gas_switch: pd.DataFrame, state: str, year: int, heat_norm_15min: pd.DataFrame, tempinde_norm_15min: pd.DataFrame) -> pd.DataFrame:
+    """
+    Temporally disaggregates the demand of df_gas_switch per [regional_id, industry_sector, application] of 'state' in one broadcast:
+    space_heating with the temperature dependent profile, all other applications with the temperature independent profile.
+    Same result as filling make_3level_timeseries() column by column, but only the non-zero demands are multiplied
+    and columns with a missing demand (NaN) are never created.
+
+    Parameters
+    ----------
+    df_gas_switch : pd.DataFrame
+        Index   -> regional_id (strings or ints)
+        Columns -> 2‑level MultiIndex (industry_sector, application)
+    state : str
+        Two‑letter state abbreviation, e.g. 'SH', 'NW', ...
+    year : int
+        Calendar year for the time index.
+    heat_norm_15min, tempinde_norm_15min : pd.DataFrame
+        normalized 15‑min profiles, columns -> (str(regional_id), str(industry_sector))
+
+    Returns
+    -------
+    pd.DataFrame
+        index   -> 15‑min DateTimeIndex for the whole year
+        columns -> MultiIndex(levels=[regional_id, industry_sector, application])
+    """
+    # 1) regional_ids of the state and all [regional_id, industry_sector, application] triples (order of make_3level_timeseries())
+    state_map = federal_state_dict()
+    valid_rids = [rid for rid in df_gas_switch.index if state_map.get(int(str(rid)[:-3])) == state]
+    if not valid_rids:
+        raise ValueError(f"No regional_id for state '{state}' found in df_gas_switch.index")
 
-def create_heat_norm_cts(state: str, year: int, energy_carrier: str, force_preprocessing: bool = False) -> pd.DataFrame:
+    sectors = df_gas_switch.columns.get_level_values(0).unique()
+    apps    = df_gas_switch.columns.get_level_values(1).unique()
+    cols = pd.MultiIndex.from_product(
+        [valid_rids, sectors, apps],
+        names=["regional_id", "industry_sector", "application"],
+    )
+    time_index = pd.date_range(start=f"{year}-01-01 00:00", end=f"{year}-12-31 23:45", freq="15min")
+
+    # 2) demand per triple: (sector, application) pairs that are not in df_gas_switch have no demand
+    demand = (df_gas_switch.loc[valid_rids]
+              .reindex(columns=pd.MultiIndex.from_product([sectors, apps]), fill_value=0.0)
+              .to_numpy(dtype=float)
+              .ravel())
+    kept = ~np.isnan(demand)
+    cols, demand = cols[kept], demand[kept]
+    nonzero = demand != 0
+
+    # 3) profile key of every triple
+    profile_keys = pd.MultiIndex.from_arrays([cols.get_level_values(0).astype(str), cols.get_level_values(1).astype(str)])
+    is_space_heating = np.asarray(cols.get_level_values(2) == 'space_heating')
+
+    # 4) (triples x 1) demands * (triples x time) profiles, zero demands stay 0
+    # computed per triple (rows) and transposed at the end: the profiles of a triple are contiguous in memory
+    values = np.zeros((len(cols), len(time_index)))
+    for norm, mask in [(heat_norm_15min, nonzero & is_space_heating), (tempinde_norm_15min, nonzero & ~is_space_heating)]:
+        if not mask.any():
+            continue
+        positions = norm.columns.get_indexer(profile_keys[mask])
+        if (positions < 0).any():
+            raise KeyError(f"Missing profiles for: {profile_keys[mask][positions < 0].tolist()}")
+        if not norm.index.equals(time_index):
+            norm = norm.reindex(time_index)
+        values[mask] = norm.to_numpy(dtype=float).T[positions] * demand[mask, None]
+
+    return pd.DataFrame(values.T, index=time_index, columns=cols)
+
+
+
+def create_heat_norm_cts(state: str, year: int, energy_carrier: str, force_preprocessing: bool = False, refresh=None) -> pd.DataFrame:
     """
     Creates normalised heat demand timeseries for CTS per regional_id, and branch
 
@@ -176,6 +244,10 @@ def create_heat_norm_cts(state: str, year: int, energy_carrier: str, force_prepr
             entries of bl_dict().values(),
             ['SH', 'HH', 'NI', 'HB', 'NW', 'HE', 'RP', 'BW', 'BY', 'SL', 'BE',
             'BB', 'MV', 'SN', 'ST', 'TH']
+        force_preprocessing : bool, default False
+            If True the caches of this function are not used, the applications cache is still used.
+        refresh : RefreshPolicy, optional
+            stages to recompute, see RefreshPolicy in src/data_access/cache_manager.py
 
     Returns:
         heat_norm : pd.DataFrame
@@ -200,16 +272,20 @@ def create_heat_norm_cts(state: str, year: int, energy_carrier: str, force_prepr
     consumption_temp_indep_norm_cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['consumption_temp_indep_norm_cache_file'].format(year=year, state=state, energy_carrier=energy_carrier))
 
     # Check if cache exists and load if available
-    if os.path.exists(heat_norm_cache_file) and os.path.exists(consumption_total_cache_file) and os.path.exists(consumption_temp_indep_norm_cache_file) and not force_preprocessing:
+    cache_params = {"sector": "cts", "energy_carrier": energy_carrier, "year": year, "state": state}
+    policy = get_refresh_policy(refresh=refresh)
+    if (cache_exists(heat_norm_cache_file, stage="heat", params=cache_params) and cache_exists(consumption_total_cache_file, stage="heat", params=cache_params)
+            and cache_exists(consumption_temp_indep_norm_cache_file, stage="heat", params=cache_params)
+            and not (force_preprocessing or policy.should_refresh("heat", cache_params))):
         logger.info(f"Loading cached data for year: {year}, state: {state}, energy_carrier: {energy_carrier}")
-        heat_norm = pd.read_csv(heat_norm_cache_file, index_col=0, header=[0, 1], parse_dates=True)
-        consumption_total = pd.read_csv(consumption_total_cache_file, index_col=0, header=[0, 1], parse_dates=True)
-        consumption_temperature_independent_norm = pd.read_csv(consumption_temp_indep_norm_cache_file, index_col=0, header=[0, 1], parse_dates=True)
+        heat_norm = load_cache(heat_norm_cache_file, index_col=0, header=[0, 1], parse_dates=True)
+        consumption_total = load_cache(consumption_total_cache_file, index_col=0, header=[0, 1], parse_dates=True)
+        consumption_temperature_independent_norm = load_cache(consumption_temp_indep_norm_cache_file, index_col=0, header=[0, 1], parse_dates=True)
         return heat_norm, consumption_total, consumption_temperature_independent_norm
 
 
     # 1. get the consumption data per regional_id and industry_sector (aggregating the applications)
-    consumption_data = disagg_applications_efficiency_factor(sector="cts", energy_carrier=energy_carrier, year=year)
+    consumption_data = disagg_applications_efficiency_factor(sector="cts", energy_carrier=energy_carrier, year=year, refresh=policy)
     consumption_data = consumption_data.T.groupby(level=0).sum().T
 
     # 2. disaggregate consumption of all applications by regional_id, indsutry sector and temporally (1h steps of the year)
@@ -270,10 +346,10 @@ def create_heat_norm_cts(state: str, year: int, energy_carrier: str, force_prepr
         raise ValueError("Sanity check failed: Not all columns in consumption_temperature_independent_norm sum to 0.0 or 1.0")
 
     # Save to cache
-    os.makedirs(cache_dir, exist_ok=True)
-    heat_norm.to_csv(heat_norm_cache_file)
-    consumption_total.to_csv(consumption_total_cache_file)
-    consumption_temperature_independent_norm.to_csv(consumption_temp_indep_norm_cache_file)
+    save_cache(heat_norm, heat_norm_cache_file, stage="heat", params=cache_params)
+    save_cache(consumption_total, consumption_total_cache_file, stage="heat", params=cache_params)
+    save_cache(consumption_temperature_independent_norm, consumption_temp_indep_norm_cache_file, stage="heat", params=cache_params)
+    policy.mark_refreshed("heat", cache_params)
     logger.info(f"Data cached for year: {year}, state: {state}, energy_carrier: {energy_carrier}")
 
     return heat_norm, consumption_total, consumption_temperature_independent_norm
@@ -452,9 +528,7 @@ def create_heat_norm_industry(state: str, year: int, energy_carrier: str, slp: s
 
     # 3. get the temperature allocation
     temp_allo = allocation_temperature_by_day(year=year)
-    # clip at 15 for hot water, below 15°C the water heating demand is assumed
-    # to be constant
-    temperatur_df_clip = temp_allo.clip(15)
+    temp_allo.columns = temp_allo.columns.astype(int)
 
 
     # 4. get hours of the year
@@ -473,9 +547,9 @@ def create_heat_norm_industry(state: str, year: int, energy_carrier: str, slp: s
     # 7. get weekday-factors per day
     F_wd = (gas_slp_weekday_params(state, year=year).set_index('Date')['FW_'+str(slp)]).to_frame()
     # get h-value per day
-    h_slp = h_value(slp, regional_ids, temp_allo)
-    # get h-value for hot water per day
-    h_slp_water = h_value_water(slp, regional_ids,  temperatur_df_clip)
+    h_slp = h_value_by_year(slp, year, regional_ids)
+    # get h-value for hot water per day (clipped at 15°C, below 15°C the water heating demand is assumed to be constant)
+    h_slp_water = h_value_by_year(slp, year, regional_ids, water=True)
 
 
     # 8. multiply h_values and week day values per day
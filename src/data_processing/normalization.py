@@ -1,14 +1,98 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from src.configs.config_loader import load_config
 
 
+# composed region id changes and transition matrices of this process
+REGION_ID_MAPPINGS = {}  # {(changes_files, source_year, target_year): {old_id: new_id}}
+REGION_TRANSITION_MATRICES = {}  # {(changes_files, region_ids, source_year, target_year): matrix}
+
+
+def get_region_id_mapping(source_year: int, target_year: int) -> dict:
+    """
+    Returns the composed region id changes from source_year to target_year: {old_id: new_id} (ids as 5 digit strings).
+    The changes_{year}to{year_next}.csv files are read once per (source_year, target_year) and process.
+    Region ids without changes are not in the mapping.
+
+    Args:
+        source_year (int): year of the data
+        target_year (int): year to normalize the region ids to
+
+    Returns:
+        dict: {old_id: new_id}
+    """
+    regional_id_changes_files = load_config("base_config.yaml")["regional_id_changes_files"]
+    key = (regional_id_changes_files, source_year, target_year)
+    if key in REGION_ID_MAPPINGS:
+        return REGION_ID_MAPPINGS[key]
+
+    # apply the changes of each year from source_year to target_year-1 to all ids changed so far
+    id_mapping = {}
+    for year in range(source_year, target_year):
+        change_file = Path(regional_id_changes_files.format(year=year, year_next=year + 1))
+
+        if change_file.exists():
+            changes = pd.read_csv(change_file)
+            # ensure both old and new AGS codes maintain leading zeros
+            year_mapping = dict(zip(changes['old_ags_lk'].astype(str).str.zfill(5),
+                                    changes['new_ags_lk'].astype(str).str.zfill(5)))
+
+            id_mapping = {old_id: year_mapping.get(current_id, current_id) for old_id, current_id in id_mapping.items()}
+            for old_id, new_id in year_mapping.items():
+                id_mapping.setdefault(old_id, new_id)
+
+    REGION_ID_MAPPINGS[key] = id_mapping
+
+    return id_mapping
+
+
+def get_region_transition_matrix(region_ids, source_year: int, target_year: int) -> pd.DataFrame:
+    """
+    Returns the 0/1 matrix that sums the values of the region ids of source_year to the region ids of target_year.
+    normalized = df @ matrix (regions in the columns), normalized = matrix.T @ df (regions in the rows)
+    The matrix is built once per (region_ids, source_year, target_year) and kept for the process.
+
+    Args:
+        region_ids: Iterable
+            region ids of the data as 5 digit strings (rows of the matrix)
+        source_year (int): year of the data
+        target_year (int): year to normalize the region ids to
+
+    Returns:
+        pd.DataFrame
+            index: region_ids
+            columns: sorted region ids of target_year
+    """
+    region_ids = list(region_ids)
+    key = (load_config("base_config.yaml")["regional_id_changes_files"], tuple(region_ids), source_year, target_year)
+    matrix = REGION_TRANSITION_MATRICES.get(key)
+    if matrix is not None:
+        return matrix.copy()
+
+    # 1. target id of every region id
+    id_mapping = get_region_id_mapping(source_year, target_year)
+    target_ids = [id_mapping.get(region_id, region_id) for region_id in region_ids]
+
+    # 2. build the matrix from the (row, column) entries
+    columns = sorted(set(target_ids))
+    column_by_id = {region_id: column for column, region_id in enumerate(columns)}
+    values = np.zeros((len(region_ids), len(columns)))
+    values[np.arange(len(region_ids)), [column_by_id[target_id] for target_id in target_ids]] = 1.0
+
+    matrix = pd.DataFrame(values, index=region_ids, columns=columns)
+    REGION_TRANSITION_MATRICES[key] = matrix
+
+    return matrix.copy()
+
+
 def normalize_region_ids_rows(df, id_column, data_year, target_year=None):
     """
     NEW
     Normalize region IDs and sum up values for merged regions.
     Only applies changes forward in time (from data_year to target_year).
     Only applies to rows and only for dfs where with unique region ids.
+    The values are summed with the cached transition matrix, see get_region_transition_matrix().
     
     Parameters:
     -----------
@@ -29,7 +113,6 @@ def normalize_region_ids_rows(df, id_column, data_year, target_year=None):
 
     # 1. Load config
     config = load_config("base_config.yaml")
-    regional_id_changes_files = config["regional_id_changes_files"]
     if target_year is None:
         target_year = config["year_for_regional_normalization"]
 
@@ -43,23 +126,12 @@ def normalize_region_ids_rows(df, id_column, data_year, target_year=None):
     if data_year >= target_year:
         return df
     
-    # Apply changes for each year from data_year to target_year-1
-    for year in range(data_year, target_year):
-        change_file = Path(regional_id_changes_files.format(year=year, year_next=year+1))
-        
-        if change_file.exists():
-            # Read changes for this year
-            changes = pd.read_csv(change_file)
-            
-            # Create mapping dictionary - ensure both old and new AGS codes maintain leading zeros
-            mapping = dict(zip(changes['old_ags_lk'].astype(str).str.zfill(5), 
-                             changes['new_ags_lk'].astype(str).str.zfill(5)))
-            
-            # Apply mapping
-            df[id_column] = df[id_column].map(lambda x: mapping.get(x, x))
-    
-    # Sum up all numeric columns for duplicate region IDs
-    df = df.groupby(id_column).sum().reset_index()
+    # 2. sum up all value columns of the same target region id: matrix.T @ values
+    matrix = get_region_transition_matrix(df[id_column], data_year, target_year)
+    values = df.drop(columns=id_column)
+    summed = matrix.to_numpy().T @ values.fillna(0).to_numpy(dtype=float)
+
+    df = pd.DataFrame(summed, index=pd.Index(matrix.columns, name=id_column), columns=values.columns).reset_index()
     
     return df
 
@@ -67,6 +139,7 @@ def normalize_region_ids_columns(df, dataset_year, target_year=None):
     """
     Normalize region IDs in column names by applying yearly mapping changes and combining
     columns that map to the same region ID.
+    The columns are combined with the cached transition matrix, see get_region_transition_matrix().
 
     Parameters:
     -----------
@@ -85,7 +158,6 @@ def normalize_region_ids_columns(df, dataset_year, target_year=None):
     """
     # 1. Load config
     config = load_config("base_config.yaml")
-    regional_id_changes_files = config["regional_id_changes_files"]
     if target_year is None:
         target_year = config["year_for_regional_normalization"]
 
@@ -96,38 +168,12 @@ def normalize_region_ids_columns(df, dataset_year, target_year=None):
     if dataset_year >= target_year:
         return df
 
-    # Get current column names (region IDs)
+    # 2. sum up the columns of the same target region id: df @ matrix
     column_ids = df.columns.astype(str).str.zfill(5)
-    id_mapping = dict(zip(column_ids, column_ids))  # Initialize with identity mapping
-
-    # Apply changes for each year from dataset_year to target_year-1
-    for year in range(dataset_year, target_year):
-        change_file = Path(regional_id_changes_files.format(
-            year=year,
-            year_next=year + 1
-        ))
-
-        if change_file.exists():
-            # Read changes for this year
-            changes = pd.read_csv(change_file)
-
-            # Create mapping dictionary - ensure both old and new AGS codes maintain leading zeros
-            year_mapping = dict(zip(
-                changes['old_ags_lk'].astype(str).str.zfill(5),
-                changes['new_ags_lk'].astype(str).str.zfill(5)
-            ))
-
-            # Update the cumulative mapping
-            id_mapping = {
-                old_id: year_mapping.get(current_id, current_id)
-                for old_id, current_id in id_mapping.items()
-            }
-
-    # Rename columns using the final mapping
-    df.columns = [id_mapping.get(col.zfill(5), col.zfill(5)) for col in df.columns.astype(str)]
+    matrix = get_region_transition_matrix(column_ids, dataset_year, target_year)
+    summed = df.fillna(0).to_numpy(dtype=float) @ matrix.to_numpy()
 
-    # Group and sum columns with the same mapped ID
-    df = df.groupby(level=0, axis=1).sum()
+    df = pd.DataFrame(summed, index=df.index, columns=matrix.columns)
 
     return df
 
@@ -1,4 +1,3 @@
-import ast
 import pandas as pd
 import numpy as np
 from datetime import timedelta
@@ -61,25 +60,46 @@ def allocation_temperature_by_day(year: int, force_preprocessing: bool = False):
 
 
     # 6. Smooth the temperature outside in daily average temperature
-    for regional_id in temp_outside_daily_avg.columns:
-        te = temp_outside_daily_avg[regional_id].values
-        for i in range(len(te)-1, -1, -1):
-            if (i >= 3):
-                te[i] = ((te[i] + 0.5 * te[i - 1] + 0.25 * te[i - 2]
-                         + te[i - 3] * 0.125) / 1.875)
-        temp_outside_daily_avg[regional_id] = te
+    temp_outside_daily_avg = smooth_daily_temperature(temp_outside_daily_avg)
 
 
     # 7. save to cache
     processed_dir = load_config("base_config.yaml")['temperature_allocation_cache_dir']
     processed_file = os.path.join(processed_dir, load_config("base_config.yaml")['temperature_allocation_cache_file'].format(year=year, resolution="day"))
-    os.makedirs(processed_dir, exist_ok=True)
-    temp_outside_daily_avg.to_csv(processed_file)
+    save_cache(temp_outside_daily_avg, processed_file, stage="temperature", params={"year": year, "resolution": "day"})
 
 
     return temp_outside_daily_avg
 
 
+def smooth_daily_temperature(daily_temperature):
+    """
+    Smooths daily average temperatures with the weighted mean of the day and the 3 previous days:
+        te[i] = (te[i] + 0.5 * te[i-1] + 0.25 * te[i-2] + 0.125 * te[i-3]) / 1.875
+    The first 3 days are kept.
+
+    Same result as the old in-place loop over every region that ran backwards from the last day: going backwards,
+    te[i-1], te[i-2] and te[i-3] are not smoothed yet, so every day is smoothed with the unsmoothed values. All
+    columns (e.g. the 400 regions of several weather years) are smoothed at once.
+
+    Args:
+        daily_temperature: pd.DataFrame or np.ndarray
+            days on axis 0, any number of columns
+
+    Returns:
+        smoothed temperatures, same type and shape as the input
+    """
+    te = np.asarray(daily_temperature, dtype=float)
+
+    smoothed = te.copy()
+    smoothed[3:] = (te[3:] + 0.5 * te[2:-1] + 0.25 * te[1:-2] + te[:-3] * 0.125) / 1.875
+
+    if isinstance(daily_temperature, pd.DataFrame):
+        return pd.DataFrame(smoothed, index=daily_temperature.index, columns=daily_temperature.columns)
+
+    return smoothed
+
+
 def allocation_temperature_by_hour(year: int, force_preprocessing: bool = False):
     """
     
@@ -136,8 +156,7 @@ def allocation_temperature_by_hour(year: int, force_preprocessing: bool = False)
     # 6. save to cache
     processed_dir = load_config("base_config.yaml")['temperature_allocation_cache_dir']
     processed_file = os.path.join(processed_dir, load_config("base_config.yaml")['temperature_allocation_cache_file'].format(year=year, resolution="hour"))
-    os.makedirs(processed_dir, exist_ok=True)
-    hourly_temperature_allocation.to_csv(processed_file)
+    save_cache(hourly_temperature_allocation, processed_file, stage="temperature", params={"year": year, "resolution": "hour"})
 
 
     return hourly_temperature_allocation
@@ -220,38 +239,15 @@ def get_temp_outside_hourly_for_regions(year: int):
     temp_series = temp_indexed['values']
 
 
-    # 9. Process 'values' column (handle strings or existing lists/arrays)
-    processed_data = {}
-    for region_id, value_data in temp_series.items():
-        hourly_list = None
-        try:
-            if isinstance(value_data, str):
-                # Attempt to parse string representation of a list
-                parsed_list = ast.literal_eval(value_data)
-                if isinstance(parsed_list, list):
-                    hourly_list = parsed_list
-                else:
-                     raise ValueError(f"Parsed data for region {region_id} is not a list.")
-            elif isinstance(value_data, (list, pd.Series, np.ndarray)):
-                 # Assume it's already a list-like structure
-                 hourly_list = list(value_data) # Convert to standard list
-            else:
-                 raise TypeError(f"Unsupported data type in 'values' for region {region_id}: {type(value_data)}")
-
-            # Validate length
-            if len(hourly_list) != expected_hours:
-                 raise ValueError(f"Data length mismatch for region {region_id}. "
-                                  f"Expected {expected_hours}, found {len(hourly_list)}.")
-
-            processed_data[region_id] = hourly_list
-
-        except (SyntaxError, ValueError, TypeError) as e:
-             logger.warning(f"Error processing data for region {region_id}: {e}")
-             raise ValueError(f"Failed to process 'values' for region {region_id}. Ensure it's a valid list/array (or string representation) with correct length.") from e
-
+    # 9. Process 'values' column (strings or existing lists/arrays) to a (region x hour) array
+    try:
+        hourly_values = list_column_to_array(temp_series, length=expected_hours)
+    except (SyntaxError, ValueError, TypeError) as e:
+        logger.warning(f"Error processing data: {e}")
+        raise ValueError("Failed to process 'values'. Ensure every region has a valid list/array (or string representation) with correct length.") from e
 
 
-    final_df = pd.DataFrame(processed_data, index=datetime_index)
+    final_df = pd.DataFrame(hourly_values.T, index=datetime_index, columns=temp_series.index.to_numpy())
 
     logger.info(f"Successfully created DataFrame with shape {final_df.shape}")
     return final_df
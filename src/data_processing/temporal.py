@@ -1,6 +1,5 @@
 import logging
 import pandas as pd
-import holidays
 import datetime
 from datetime import timedelta
 from typing import Dict, Tuple
@@ -11,6 +10,8 @@ from src import logger
 from src.data_access.local_reader import *
 from src.pipeline.pipe_applications import *
 from src.utils.utils import *
+from src.utils.calendar_days import *
+from src.utils.factorized_timeseries import FactorizedTimeseries
 from src.data_processing.temperature import *
 from src.data_processing.consumption import *
 from src.configs.data import *
@@ -19,7 +20,7 @@ from src.configs.data import *
 
 
 # main functions
-def disaggregate_temporal_industry(consumption_data: pd.DataFrame, year: int, low=0.5, force_preprocessing: bool = False) -> pd.DataFrame:
+def disaggregate_temporal_industry(consumption_data: pd.DataFrame, year: int, low=0.5, force_preprocessing: bool = False, factorized: bool = False) -> pd.DataFrame:
     """
     Calculates the temporal distribution of industrial energy consumption for a
     given energy carrier and year using standard load profiles. 
@@ -37,6 +38,8 @@ def disaggregate_temporal_industry(consumption_data: pd.DataFrame, year: int, lo
         energy_carrier: The energy carrier (e.g., 'power').
         year: The year for the analysis.
         low: Parameter for getting shift load profiles (default 0.5).
+        factorized: If True a FactorizedTimeseries (shift load profiles x annual consumption) is returned
+            instead of the materialized DataFrame.
 
     Returns:
         A DataFrame (35040 rows x 11600 columns) with:
@@ -62,10 +65,9 @@ def disaggregate_temporal_industry(consumption_data: pd.DataFrame, year: int, lo
     slp.index = pd.to_datetime(slp.index)
 
 
-    # 3. Perform Disaggregation (Integrated Logic)
+    # 3. Get the mappings regional_id -> state and industry_sector -> shift load profile
     state_mapping = federal_state_dict()
     profile_mapping = shift_profile_industry()
-    disaggregated_results = {}
 
 
     # 4. Filter consumption columns
@@ -92,72 +94,62 @@ def disaggregate_temporal_industry(consumption_data: pd.DataFrame, year: int, lo
     logger.info(f"Processing {len(consumption_stacked)} regional/industry combinations...")
 
 
-    # 5. Iterate through combinations
-    processed_count = 0
-    error_count = 0 # Counts errors leading to skipping
-    for (regional_id, industry_sector_str), annual_consumption in consumption_stacked.items():
+    # 5. NaN values cannot be disaggregated
+    if consumption_stacked.isna().any():
+        regional_id, industry_sector_str = consumption_stacked[consumption_stacked.isna()].index[0]
+        raise ValueError(f"NaN value found for annual_consumption at "
+                         f"index ({regional_id}, '{industry_sector_str}'). "
+                         f"Processing cannot continue with NaN values.")
+
+
+    # 6. look up the (state, shift profile) column of every regional/industry combination
+    regional_ids = consumption_stacked.index.get_level_values(0)
+    industry_sectors = pd.Index([int(industry_sector_str) for industry_sector_str in consumption_stacked.index.get_level_values(1)])
+    unmapped_sectors = industry_sectors.unique().difference(list(profile_mapping))
+    if not unmapped_sectors.empty:
+        raise ValueError(f"industry sector {unmapped_sectors[0]} not found in profile_mapping")
+    states = pd.Series(regional_ids).astype(int).floordiv(1000).map(state_mapping)
+    load_profile_names = pd.Series(industry_sectors).map(profile_mapping)
+    slp_positions = slp.columns.get_indexer(pd.MultiIndex.from_arrays([states, load_profile_names]))
+
+    valid = slp_positions >= 0
+    for regional_id, industry_sector_int, state_abbr, load_profile_name in zip(regional_ids[~valid], industry_sectors[~valid], states[~valid], load_profile_names[~valid]):
+        if pd.isna(state_abbr):
+            errmsg = f"state number {int(regional_id) // 1000} (from region {regional_id}) not found in state_mapping"
+        else:
+            errmsg = f"SLP column for ({state_abbr}, {load_profile_name}) not found"
+        logger.warning(f"Warning: Skipping combination ({regional_id}, {industry_sector_int}). {errmsg}")
+    logger.info(f"Disaggregation finished. Processed (incl. zeros): {valid.sum()}, Errors/Skipped: {(~valid).sum()}")
 
-        # Check specifically for NaN values and raise an error (Processing continues if annual_consumption is 0.0 or positive)
-        if pd.isna(annual_consumption):
-            error_count += 1 # Increment count before raising
-            # Raise error immediately - stops the whole process
-            raise ValueError(f"NaN value found for annual_consumption at "
-                             f"index ({regional_id}, '{industry_sector_str}'). "
-                             f"Processing cannot continue with NaN values.")
-        try:
-            # Proceed with disaggregation logic (this now includes 0.0 values)
-            state_num = int(regional_id) // 1000
-            state_abbr = state_mapping[state_num]
-            industry_sector_int = int(industry_sector_str)
-            load_profile_name = profile_mapping[industry_sector_int]
-            profile_series = slp[(state_abbr, load_profile_name)]
-
-            # Multiply profile by consumption (if 0.0, result is Series of zeros)
-            disaggregated_series = profile_series * annual_consumption
-
-            disaggregated_results[(regional_id, industry_sector_int)] = disaggregated_series
-            processed_count += 1
-
-        except KeyError as e:
-             # Handle missing keys in mappings or SLP columns
-             if e.args[0] == state_num:
-                  errmsg = f"state number {state_num} (from region {regional_id}) not found in state_mapping"
-             elif e.args[0] == industry_sector_int:
-                  errmsg = f"industry sector {industry_sector_int} not found in profile_mapping"
-             elif isinstance(e.args[0], tuple) and e.args[0] == (state_abbr, load_profile_name):
-                   errmsg = f"SLP column for ({state_abbr}, {load_profile_name}) not found"
-             else:
-                   errmsg = f"Mapping/Selection key not found: {e}"
-             logger.warning(f"Warning: Skipping combination ({regional_id}, {industry_sector_str}). {errmsg}")
-             error_count += 1
-        except Exception as e:
-            # Catch other unexpected errors during calculation
-            logger.warning(f"Warning: An unexpected error occurred for combination ({regional_id}, {industry_sector_str}): {e}")
-            error_count += 1
-
-
-    logger.info(f"Disaggregation loop finished. Processed (incl. zeros): {processed_count}, Errors/Skipped: {error_count}")
-
-    # Combine results (includes columns with zeros if annual_consumption was 0)
-    if not disaggregated_results:
+    if not valid.any():
         logger.warning("Warning: No data was successfully processed. Resulting DataFrame will be empty.")
         empty_cols = pd.MultiIndex(levels=[[],[]], codes=[[],[]], names=['regional_id', 'industry_sector'])
         return pd.DataFrame(index=slp.index, columns=empty_cols)
 
-    final_df = pd.DataFrame(disaggregated_results)
-    final_df.columns.names = ['regional_id', 'industry_sector']
 
-    # 6. calculate the total consumption for plausalilty check
-    total_consumption_end = final_df.sum().sum()
+    # 7. combine the profile matrix with the annual consumption vector (one column per combination)
+    # the shift load profiles are already normalized
+    factorized_df = FactorizedTimeseries.from_profiles(profiles=slp,
+                                                       profile_positions=slp_positions[valid],
+                                                       scales=consumption_stacked.to_numpy(dtype=float)[valid],
+                                                       columns=pd.MultiIndex.from_arrays([regional_ids[valid], industry_sectors[valid]],
+                                                                                         names=['regional_id', 'industry_sector']),
+                                                       normalize=False)
+
+    # 8. calculate the total consumption for plausalilty check
+    total_consumption_end = factorized_df.total()
     if not np.isclose(total_consumption_end, total_consumption_start):
         raise ValueError("Warning: Total consumption is not the same as the start! "
                          f"total_consumption_start: {total_consumption_start}, "
                          f"total_consumption_end: {total_consumption_end}")
 
-    return final_df
+    if factorized:
+        return factorized_df
 
+    return factorized_df.to_frame()
 
-def disagg_temporal_heat_CTS(consumption_data: pd.DataFrame, year: int, state_list: list = federal_state_dict().values()) -> pd.DataFrame:
+
+def disagg_temporal_heat_CTS(consumption_data: pd.DataFrame, year: int, state_list: list = federal_state_dict().values(), factorized: bool = False) -> pd.DataFrame:
     """
     [DISS 4.4.3.2 Erstellung von Wärmebedarfszeitreihen]
 
@@ -170,6 +162,8 @@ def disagg_temporal_heat_CTS(consumption_data: pd.DataFrame, year: int, state_li
     Args:
         consumption_data: DataFrame containing consumption data with columns ['regional_id', 'industry_sector']
         year: The year for the analysis
+        factorized: if True a FactorizedTimeseries with one profile per (regional_id, SLP) is returned,
+            the (hours x columns) values are never materialized
 
 
     Returns:
@@ -178,68 +172,39 @@ def disagg_temporal_heat_CTS(consumption_data: pd.DataFrame, year: int, state_li
             index: hours of the given year
     """
 
-    # 1. get the number of hours in the year
-    hours_of_year = get_hours_of_year(year)
+    # 1. get the temperature allocation for a future year per day and regional_id
+    daily_temperature_allocation = allocation_temperature_by_day(year=year)
 
 
-    # 2. get the temperature allocation for a future year per
-    daily_temperature_allocation = allocation_temperature_by_day(year=year)
+    # 2. regional_ids as int columns
+    temperature_allocation = daily_temperature_allocation.set_axis(daily_temperature_allocation.columns.astype(int), axis=1)
+
 
+    # 3. create the (day type x temperature bucket x hour) lookup table of every gas SLP once
+    slp_tables = {slp: get_gas_load_profile_lookup_table(slp) for slp in dict.fromkeys(load_profiles_cts_gas().values())}
 
-    # 3. create a empty dataframe with all regional ids and 15min steps
-    df = pd.DataFrame(0, 
-                        columns=daily_temperature_allocation.columns,
-                        index=pd.date_range((str(year) + '-01-01'),
-                        periods=hours_of_year, freq='h'))
 
     # 4. iterate over all states
+    df_list = []
     for state in state_list:
 
         logger.info(f"Disaggregating gas consumption for state: {state}")
 
+        # 4.1 daily consumption per regional_id and industry_sector
         tw_df = disagg_daily_gas_slp_cts(gas_consumption=consumption_data, state=state, temperatur_df=daily_temperature_allocation, year=year)
 
-        # adds new column "BL" to gv_lk with the abbreviation of the state based on the regional code
-        gv_lk = (consumption_data.assign(federal_state=[federal_state_dict().get(int(x[:-3]))
-                                    for x in consumption_data.index.astype(str)]))
-
-        # filter temperatur_df for the regional codes of the state and save it in t_allo_df
-        daily_temperature_allocation.columns = daily_temperature_allocation.columns.astype(str)
-        t_allo_df = daily_temperature_allocation[gv_lk.loc[gv_lk['federal_state'] == state].index.astype(str)]
-
-        for col in t_allo_df.columns:
-            t_allo_df[col].values[t_allo_df[col].values < -15] = -15
-            t_allo_df[col].values[(t_allo_df[col].values > -15)
-                                    & (t_allo_df[col].values < -10)] = -10
-            t_allo_df[col].values[(t_allo_df[col].values > -10)
-                                    & (t_allo_df[col].values < -5)] = -5
-            t_allo_df[col].values[(t_allo_df[col].values > -5)
-                                    & (t_allo_df[col].values < 0)] = 0
-            t_allo_df[col].values[(t_allo_df[col].values > 0)
-                                    & (t_allo_df[col].values < 5)] = 5
-            t_allo_df[col].values[(t_allo_df[col].values > 5)
-                                    & (t_allo_df[col].values < 10)] = 10
-            t_allo_df[col].values[(t_allo_df[col].values > 10)
-                                    & (t_allo_df[col].values < 15)] = 15
-            t_allo_df[col].values[(t_allo_df[col].values > 15)
-                                    & (t_allo_df[col].values < 20)] = 20
-            t_allo_df[col].values[(t_allo_df[col].values > 20)
-                                    & (t_allo_df[col].values < 25)] = 25
-            t_allo_df[col].values[(t_allo_df[col].values > 25)] = 100
-            t_allo_df = t_allo_df.astype('int32')
-
-
-        f_wd = ['FW_BA', 'FW_BD', 'FW_BH', 'FW_GA', 'FW_GB', 'FW_HA',
-                'FW_KO', 'FW_MF', 'FW_MK', 'FW_PD', 'FW_WA',
-                'FW_SpaceHeating-MFH', 'FW_SpaceHeating-EFH',
-                'FW_Cooking_HotWater-HKO']
-        calender_df = (gas_slp_weekday_params(state, year=year).drop(columns=f_wd))
-
-        temp_calender_df = (pd.concat([calender_df.reset_index(), t_allo_df.reset_index()], axis=1))
-        
+        # 4.2 temperature bucket of the gas SLPs for every day and regional_id of the state
+        # like the original per-state bucketing (cast to int32 after the first column): the first regional_id of the state
+        # is bucketed with its exact temperature, all others with the temperature truncated to int
+        state_regional_ids = [int(regional_id) for regional_id in consumption_data.index if federal_state_dict().get(int(str(regional_id)[:-3])) == state]
+        state_temperature_allocation = np.trunc(temperature_allocation[state_regional_ids])
+        state_temperature_allocation.iloc[:, :1] = temperature_allocation[state_regional_ids[:1]]
+        temperature_buckets = get_gas_slp_temperature_buckets(state_temperature_allocation)
 
+        # 4.3 day types (MO, DI, ..., SO) of the state
+        day_types = get_gas_slp_day_types(state=state, year=year)
 
-        if temp_calender_df.isnull().values.any():
+        if len(day_types) != len(temperature_buckets):
             raise KeyError('The chosen historical weather year and the '
                             'chosen projected year have mismatching '
                             'lengths. This could be due to gap years. '
@@ -247,102 +212,20 @@ def disagg_temporal_heat_CTS(consumption_data: pd.DataFrame, year: int, state_li
                             'hist_weather_year() in config.py to a year of '
                             'matching length.')
 
-        # Create new column "Tagestyp" in temp_calender_df. Fill it with the weekday of the date based on the columns MO, DI, MI, DO, FR, SA, SO of the df
-        temp_calender_df['Tagestyp'] = 'MO'
-        for typ in ['DI', 'MI', 'DO', 'FR', 'SA', 'SO']:
-            (temp_calender_df.loc[temp_calender_df[typ], 'Tagestyp']) = typ
-
-
-
-        # create a list of all regional codes of the given state
-        regional_id_list = gv_lk.loc[gv_lk['federal_state'] == state].index.astype(str)
-
-
-        # iterate over every regional code in the list_lk... 'info: dauert
-        for regional_id in regional_id_list:
-
-            logger.info(f"Disaggregating gas consumption for regional id: {regional_id} in state: {state}")
-             # create empty df with index equal to every hour of the year in the format e.g. 2018-01-04 18:00:00 starting from 2018-01-01 00:00:00
-            lk_df = pd.DataFrame(index=pd.date_range((str(year) + '-01-01'), periods=hours_of_year, freq='h'))
-            
-            
-            #tw_df_lk = tw_df.loc[int(regional_id),]
-            regional_id_int = int(regional_id)
-
-            # Get first level of column MultiIndex and convert to int
-            col_level_0 = tw_df.columns.get_level_values(0).astype(int)
-
-            # Filter columns safely
-            tw_df_lk = tw_df.loc[:, col_level_0 == regional_id_int]
-            #tw_df_lk = tw_df.loc[:, tw_df.columns.get_level_values(0) == int(regional_id)]
-            tw_df_lk.columns = tw_df_lk.columns.get_level_values(1)
-            tw_df_lk.columns = tw_df_lk.columns.astype(int)
-
-            tw_df_lk.index = pd.DatetimeIndex(tw_df_lk.index)
-            last_hour = tw_df_lk.copy()[-1:]
-            last_hour.index = last_hour.index + timedelta(1)
-
-             # add the first day of the year year+1 to the tw_df_lk
-            tw_df_lk = pd.concat([tw_df_lk, last_hour])
-
-            # add the hours to the tw_df_lk and remove the last hour -> got hours for the whole year: 2018-01-01 00:00:00 to 2018-12-31 23:00:00
-            # Values for every hour of a day are the same
-            tw_df_lk = tw_df_lk.resample('h').ffill()
-            tw_df_lk = tw_df_lk[:-1]
-
-            # get from temp_calender_df for every day the Tagestyp=Wochentag and the coulumn of the regional code we are currently iterating over
-            temp_cal = temp_calender_df.copy()
-            temp_cal = temp_cal[['Date', 'Tagestyp', regional_id]].set_index("Date")
-
-            last_hour = temp_cal.copy()[-1:]
-            last_hour.index = last_hour.index + timedelta(1)
-
-            temp_cal = pd.concat([temp_cal, last_hour])
-
-            #temp_cal.index = pd.to_datetime(temp_cal.index)
-            temp_cal = temp_cal.resample('h').ffill()
-            temp_cal = temp_cal[:-1]
-            temp_cal['Stunde'] = pd.DatetimeIndex(temp_cal.index).time
-            temp_cal = temp_cal.set_index(["Tagestyp", regional_id, 'Stunde'])
-
-            # iterate over all load profiles/ industry_sectors
-            for slp in list(dict.fromkeys(load_profiles_cts_gas().values())):
-
-
-                slp_profil = load_gas_load_profile(slp)
-
-
-                slp_profil = pd.DataFrame(slp_profil.set_index(['Tagestyp', 'Temperatur\nin °C\nkleiner']))
-                slp_profil.columns = pd.to_datetime(slp_profil.columns, format='%H:%M:%S')
-                slp_profil.columns = pd.DatetimeIndex(
-                    slp_profil.columns).time
-                slp_profil = slp_profil.stack()
-
-                # First, compute the 'Prozent' column
-                temp_cal['Prozent'] = [slp_profil[x] for x in temp_cal.index]
-
-                # Prepare a dictionary to store the new columns
-                new_cols = {}
-                for wz in [k for k, v in load_profiles_cts_gas().items() if v.startswith(slp)]:
-                    colname = f"{regional_id}_{wz}"
-                    new_cols[colname] = tw_df_lk[wz].values * temp_cal['Prozent'].values / 100
+        # 4.4 hourly consumption for all regional_ids of the state at once
+        if factorized:
+            df_list.append(disagg_hourly_gas_slp_factorized(daily_consumption=tw_df, day_types=day_types, temperature_buckets=temperature_buckets, slp_tables=slp_tables, year=year))
+        else:
+            df_list.append(disagg_hourly_gas_slp(daily_consumption=tw_df, day_types=day_types, temperature_buckets=temperature_buckets, slp_tables=slp_tables, year=year))
 
-                # Convert the dictionary to a DataFrame using the same index as lk_df (and df)
-                new_cols_df = pd.DataFrame(new_cols, index=lk_df.index)
+    if factorized:
+        factorized_df = FactorizedTimeseries.concat(df_list)
+        if factorized_df.profiles.isna().any().any() or factorized_df.mapping.isna().any().any():
+            raise ValueError(f"The disaggregated temporal consumption contains NaN values in year {year}")
+        return factorized_df
 
-                # Concatenate the new columns to your existing DataFrames at once
-                lk_df = pd.concat([lk_df, new_cols_df], axis=1)
-                df = pd.concat([df, new_cols_df], axis=1)
-            df[str(regional_id)] = lk_df.sum(axis=1)
+    df = pd.concat(df_list, axis=1)
 
-    # 5. drop the regional id consumption columns
-    df.columns = df.columns.astype(str)
-    df = df.drop(columns=gv_lk.index.astype(str))
-
-    # 6. make the columns a multiindex
-    df.columns = pd.MultiIndex.from_tuples([(int(x), int(y)) for x, y in
-                                    df.columns.str.split('_')])
-    
 
     # sanity check
     if df.isna().any().any():
@@ -351,11 +234,16 @@ def disagg_temporal_heat_CTS(consumption_data: pd.DataFrame, year: int, state_li
     return df
 
 
-def disaggregate_temporal_power_CTS(consumption_data: pd.DataFrame, year: int) -> pd.DataFrame: 
+def disaggregate_temporal_power_CTS(consumption_data: pd.DataFrame, year: int, factorized: bool = False) -> pd.DataFrame: 
     """
     This is the old function
+
+    factorized: if True a FactorizedTimeseries is returned, see disaggregate_temporal_power_CTS_factorized()
     
     """
+
+    if factorized:
+        return disaggregate_temporal_power_CTS_factorized(consumption_data=consumption_data, year=year)
     
     sv_yearly = consumption_data.assign(BL=lambda x: [federal_state_dict().get(int(i[: -3]))
                                         for i in x.index.astype(str)])
@@ -429,17 +317,76 @@ def disaggregate_temporal_power_CTS(consumption_data: pd.DataFrame, year: int) -
     return DF
 
 
-def disagg_temporal_petrol_CTS(consumption_data: pd.DataFrame, year: int) -> pd.DataFrame:
+def disaggregate_temporal_power_CTS_factorized(consumption_data: pd.DataFrame, year: int) -> FactorizedTimeseries:
+    """
+    Same as disaggregate_temporal_power_CTS() but built directly from the power SLPs of the states and the annual consumption:
+    one profile per (state, SLP), the (15min x columns) values are never materialized.
+
+    Returns:
+        FactorizedTimeseries:
+            columns: [LK, WZ] in the order of disaggregate_temporal_power_CTS()
+            profiles: one per (state, SLP)
+    """
+
+    sv_yearly = consumption_data.assign(BL=lambda x: [federal_state_dict().get(int(i[: -3]))
+                                        for i in x.index.astype(str)])
+    total_sum = sv_yearly.drop('BL', axis=1).sum().sum()
+    idx = pd.date_range(start=str(year), end=str(year+1), freq='15min')[:-1]
+
+    profiles_list = []
+    profile_positions = []
+    scales = []
+    columns = []
+    for state in federal_state_dict().values():
+        logger.info('Working on state: {}.'.format(state))
+        sv_lk_wz = (sv_yearly
+                    .loc[lambda x: x['BL'] == state]
+                    .drop(columns=['BL'])
+                    .transpose()
+                    .assign(SLP=lambda x: [load_profiles_cts_power()[int(i)] for i in x.index]))
+
+        slp_bl = get_CTS_power_slp(state, year=year)
+        assert slp_bl.index.equals(idx), "The time-indizes are not aligned"
+
+        # one profile per SLP of the state, one (profile, annual consumption) pair per [regional_id, industry_sector]
+        for slp in sv_lk_wz['SLP'].unique():
+            sv_lk = sv_lk_wz.loc[sv_lk_wz['SLP'] == slp].drop(columns=['SLP']).stack()
+            sv_lk = sv_lk[sv_lk >= 0]
+
+            profile_positions.extend([len(profiles_list)] * len(sv_lk))
+            profiles_list.append(slp_bl[slp].to_numpy(dtype=float))
+            scales.extend(sv_lk.to_numpy(dtype=float))
+            columns.extend((int(regional_id), int(industry_sector)) for industry_sector, regional_id in sv_lk.index)
+
+    profiles = pd.DataFrame(np.column_stack(profiles_list) if profiles_list else np.empty((len(idx), 0)), index=idx)
+    factorized_df = FactorizedTimeseries.from_profiles(profiles=profiles,
+                                                       profile_positions=profile_positions,
+                                                       scales=scales,
+                                                       columns=pd.MultiIndex.from_tuples(columns, names=['LK', 'WZ']),
+                                                       normalize=False)
+
+    # Plausibility check:
+    msg = ('The sum of yearly consumptions (={:.3f}) and the sum of disaggrega'
+           'ted consumptions (={:.3f}) do not match! Please check algorithm!')
+    disagg_sum = factorized_df.total()
+    assert np.isclose(total_sum, disagg_sum), msg.format(total_sum, disagg_sum)
+
+    return factorized_df
+
+
+def disagg_temporal_petrol_CTS(consumption_data: pd.DataFrame, year: int, factorized: bool = False) -> pd.DataFrame:
     """
     Disaggregate the consumption data for petrol in the CTS sector handeled like gas
+    factorized: if True a FactorizedTimeseries is returned, see disagg_temporal_heat_CTS()
     """
 
-    df = disagg_temporal_heat_CTS(consumption_data=consumption_data, year=year)
+    df = disagg_temporal_heat_CTS(consumption_data=consumption_data, year=year, factorized=factorized)
 
     # sanity check
-    if not np.isclose(df.sum().sum(), consumption_data.sum().sum(), atol=1e-6):
+    disaggregated_sum = df.total() if factorized else df.sum().sum()
+    if not np.isclose(disaggregated_sum, consumption_data.sum().sum(), atol=1e-6):
         raise ValueError(f"The sum of the disaggregated temporal consumption is not equal to the sum of the initial consumption data in year {year}")
-    if df.isna().any().any():
+    if not factorized and df.isna().any().any():
         raise ValueError(f"The disaggregated temporal consumption contains NaN values in year {year}")
 
     return df
@@ -483,37 +430,18 @@ def get_shift_load_profiles_by_state_and_year(state: str, low: float = 0.5, year
     # 1. Create datetime index for the full year in 15-minute steps
     idx = pd.date_range(start=f'{year}-01-01', end=f'{year+1}-01-01', freq='15min')[:-1]    # Build DataFrame and extract features using .dt accessors (faster + cleaner)
     df = pd.DataFrame({'Date': idx})
-    df['Day'] = df['Date'].dt.date
     df['Hour'] = df['Date'].dt.time
-    df['DayOfYear'] = df['Date'].dt.dayofyear
     # Store number of periods
     periods = len(df) # = number of 15min takts in the year
     
 
 
-    # 2. create holiday mask
-    # Extract all holiday dates for the state and year
-    holiday_dates = holidays.DE(state=state, years=year).keys()
-    # Create a boolean mask for rows in df where 'Day' is a holiday
-    hd = df['Day'].isin(holiday_dates)
-    
-
-
-    # 3. create weekday mask
-    # Get weekday as integer (0=Mon, ..., 6=Sun)
-    weekday = df['Date'].dt.weekday
-    # Mark workdays (Mon-Fri) that are not holidays
-    df['workday'] = (weekday < 5) & (~hd)
-    # Saturdays, excluding holidays
-    df['saturday'] = (weekday == 5) & (~hd)
-    # Sundays or any holiday
-    df['sunday'] = (weekday == 6) | hd
-    # 24th and 31st of december are treated like a saturday
-    special_days = {datetime.date(year, 12, 24), datetime.date(year, 12, 31)}
-    special_mask = df['Day'].isin(special_days)
-    # Set all other weekday flags to False for these special days
-    df.loc[special_mask, ['workday', 'sunday']] = False
-    df.loc[special_mask, 'saturday'] = True
+    # 2. create day type masks from the calendar
+    # holidays are treated like sundays, 24th and 31st of december like saturdays
+    day_types = np.repeat(get_slp_day_types(state=state, year=year), 96)
+    df['workday'] = day_types < SLP_SATURDAY
+    df['saturday'] = day_types == SLP_SATURDAY
+    df['sunday'] = day_types == SLP_SUNDAY
     
 
 
@@ -603,12 +531,52 @@ def get_shift_load_profiles_by_state_and_year(state: str, low: float = 0.5, year
     return df
 
 
+# profiles, seasons and day types of the VDEW power SLPs
+POWER_SLP_PROFILES = ['H0', 'L0', 'L1', 'L2', 'G0', 'G1', 'G2', 'G3', 'G4', 'G5', 'G6']
+POWER_SLP_SEASONS = ['WIZ', 'SOZ', 'UEZ']
+POWER_SLP_DAY_TYPES = ['WD', 'SA', 'SU']
+
+# in-process memo: {profile: np.ndarray (season x day type x quarter-hour)}
+POWER_SLP_TABLES_CACHE = {}
+# in-process memo: {(state, year): pd.DataFrame from get_CTS_power_slp()}
+CTS_POWER_SLP_CACHE = {}
+
+
+def get_power_load_profile_lookup_table(profile: str) -> np.ndarray:
+    """
+    Returns the VDEW power load profile as a lookup table.
+
+    Args:
+        profile: str
+            must be one of POWER_SLP_PROFILES
+
+    Returns:
+        np.ndarray: shape (3, 3, 96) = (POWER_SLP_SEASONS, POWER_SLP_DAY_TYPES, quarter-hours from 00:00 to 23:45)
+    """
+
+    if profile not in POWER_SLP_TABLES_CACHE:
+        df_load = load_power_load_profile(profile)
+        df_load.columns = ['Hour', 'SA_WIZ', 'SU_WIZ', 'WD_WIZ', 'SA_SOZ',
+                           'SU_SOZ', 'WD_SOZ', 'SA_UEZ', 'SU_UEZ', 'WD_UEZ']
+        # the file starts at 00:15 and ends with 00:00 -> move 00:00 to the front
+        df_slp = pd.concat([df_load.iloc[[len(df_load) - 2]], df_load.iloc[2:97]])
+
+        POWER_SLP_TABLES_CACHE[profile] = np.stack([
+            np.stack([df_slp[f'{day_type}_{season}'].to_numpy(dtype=float) for day_type in POWER_SLP_DAY_TYPES])
+            for season in POWER_SLP_SEASONS
+        ])
+
+    return POWER_SLP_TABLES_CACHE[profile]
+
+
 def get_CTS_power_slp(state, year: int):
     """
     Return the electric standard load profiles in normalized units
     ('normalized' means here that the sum over all time steps equals one).
     DISS 4.4.1
 
+    The profiles are memoized per (state, year).
+
     Parameters
     ----------
     state: str
@@ -624,89 +592,49 @@ def get_CTS_power_slp(state, year: int):
             die SLPs: ['H0', 'L0', 'L1', 'L2', 'G0', 'G1', 'G2', 'G3', 'G4', 'G5', 'G6']
         -> the sum of the SLP columns equals ~1
     """
-    def Leistung(Tag_Zeit, mask, df, df_SLP):
-        u = pd.merge(df[mask], df_SLP[['Hour', Tag_Zeit]], on=['Hour'], how='left')
-        v = pd.merge(df, u[['Date', Tag_Zeit]], on=['Date'], how='left')
-        v_filled = v.infer_objects(copy=False).fillna(0.0)
-        v_filled = v_filled.infer_objects(copy=False)
-        return v_filled[Tag_Zeit]
 
+    key = (state, int(year))
+    if key in CTS_POWER_SLP_CACHE:
+        return CTS_POWER_SLP_CACHE[key].copy()
 
+    # 1. calendar of the year in 15min steps
     idx = pd.date_range(start=str(year), end=str(year+1), freq='15min')[:-1]
     df = (pd.DataFrame(data={'Date': idx})
             .assign(Day=lambda x: pd.DatetimeIndex(x['Date']).date)
             .assign(Hour=lambda x: pd.DatetimeIndex(x['Date']).time)
             .assign(DayOfYear=lambda x:
                     pd.DatetimeIndex(x['Date']).dayofyear.astype(int)))
-    
-    mask_holidays = []
-    for i in range(0, len(holidays.DE(state=state, years=year))):
-        mask_holidays.append('Null')
-        mask_holidays[i] = ((df['Day'] == [x for x in holidays.DE(state=state, years=year).items()][i][0]))
-
-
-    hd = mask_holidays[0]
-    
-    for i in range(1, len(holidays.DE(state=state, years=year))):
-        hd = hd | mask_holidays[i]
-    
-    df['WD'] = df['Date'].apply(lambda x: x.weekday() < 5) & (~hd)
-    df['SA'] = df['Date'].apply(lambda x: x.weekday() == 5) & (~hd)
-    df['SU'] = df['Date'].apply(lambda x: x.weekday() == 6) | hd
-    
-    mask = df['Day'].isin([datetime.date(year, 12, 24), datetime.date(year, 12, 31)])
-
-    df.loc[mask, ['WD', 'SU']] = False
-    df.loc[mask, 'SA'] = True
-
-
-    wiz1 = df.loc[df['Date'] < (str(year) + '-03-21 00:00:00')]
-    wiz2 = df.loc[df['Date'] >= (str(year) + '-11-01')]
-
-
-    soz = (df.loc[((str(year) + '-05-15') <= df['Date'])  & (df['Date'] < (str(year) + '-09-15'))])
-    uez1 = (df.loc[((str(year) + '-03-21') <= df['Date'])  & (df['Date'] < (str(year) + '-05-15'))])
-    uez2 = (df.loc[((str(year) + '-09-15') <= df['Date']) & (df['Date'] <= (str(year) + '-10-31'))])
-
-
-    df = df.assign(WIZ=lambda x: (x.Day.isin(wiz1.Day) | x.Day.isin(wiz2.Day)),
-                   SOZ=lambda x: x.Day.isin(soz.Day),
-                   UEZ=lambda x: (x.Day.isin(uez1.Day) | x.Day.isin(uez2.Day)))
-
-    last_strings = []
-
 
+    # 2. day type per day: 0 = WD, 1 = SA, 2 = SU
+    # holidays are treated like sundays, 24th and 31st of december like saturdays
+    day_types = np.clip(get_slp_day_types(state=state, year=year) - SLP_SATURDAY + 1, 0, 2)
+
+    # 3. season per day: 0 = WIZ, 1 = SOZ, 2 = UEZ
+    days = get_days_index(year)
+    seasons = np.full(len(days), 2)
+    seasons[(days < f'{year}-03-21') | (days >= f'{year}-11-01')] = 0
+    seasons[(days >= f'{year}-05-15') & (days < f'{year}-09-15')] = 1
+
+    quarter_hours = len(idx) // len(days)
+    day_types = np.repeat(day_types, quarter_hours)
+    seasons = np.repeat(seasons, quarter_hours)
+    for i, day_type in enumerate(POWER_SLP_DAY_TYPES):
+        df[day_type] = day_types == i
+    for i, season in enumerate(POWER_SLP_SEASONS):
+        df[season] = seasons == i
+
+    # 4. look up all SLPs at once and normalize them
     # SLPs: H= Haushalt, L= Landwirtschaft, G= Gewerbe
-    for profile in ['H0', 'L0', 'L1', 'L2', 'G0', 'G1', 'G2', 'G3', 'G4', 'G5', 'G6']:
-        
-        df_load = load_power_load_profile(profile)
+    tables = np.stack([get_power_load_profile_lookup_table(profile) for profile in POWER_SLP_PROFILES])
+    quarter_hour = np.tile(np.arange(quarter_hours), len(days))
+    values = tables[:, seasons, day_types, quarter_hour].T
+    values = values / values.sum(axis=0)
+    df[POWER_SLP_PROFILES] = values
 
-        df_load.columns = ['Hour', 'SA_WIZ', 'SU_WIZ', 'WD_WIZ', 'SA_SOZ',
-                           'SU_SOZ', 'WD_SOZ', 'SA_UEZ', 'SU_UEZ', 'WD_UEZ']
-        df_load.loc[1] = df_load.loc[len(df_load) - 2]
-        df_SLP = df_load[1:97]
-        df_SLP = df_SLP.reset_index()[['Hour', 'SA_WIZ', 'SU_WIZ', 'WD_WIZ',
-                                       'SA_SOZ', 'SU_SOZ', 'WD_SOZ', 'SA_UEZ',
-                                       'SU_UEZ', 'WD_UEZ']]
-        wd_wiz = Leistung('WD_WIZ', (df.WD & df.WIZ), df, df_SLP)
-        wd_soz = Leistung('WD_SOZ', (df.WD & df.SOZ), df, df_SLP)
-        wd_uez = Leistung('WD_UEZ', (df.WD & df.UEZ), df, df_SLP)
-        sa_wiz = Leistung('SA_WIZ', (df.SA & df.WIZ), df, df_SLP)
-        sa_soz = Leistung('SA_SOZ', (df.SA & df.SOZ), df, df_SLP)
-        sa_uez = Leistung('SA_UEZ', (df.SA & df.UEZ), df, df_SLP)
-        su_wiz = Leistung('SU_WIZ', (df.SU & df.WIZ), df, df_SLP)
-        su_soz = Leistung('SU_SOZ', (df.SU & df.SOZ), df, df_SLP)
-        su_uez = Leistung('SU_UEZ', (df.SU & df.UEZ), df, df_SLP)
-        Summe = (wd_wiz + wd_soz + wd_uez + sa_wiz + sa_soz + sa_uez
-                 + su_wiz + su_soz + su_uez)
-        Last = 'Last_' + str(profile)
-        last_strings.append(Last)
-        df[Last] = Summe
-        total = sum(df[Last])
-        df_normiert = df[Last] / total
-        df[profile] = df_normiert
-
-    return df.drop(columns=last_strings).set_index('Date')
+    df = df.set_index('Date')
+    CTS_POWER_SLP_CACHE[key] = df
+
+    return df.copy()
 
 
 def get_shift_load_profiles_by_year(year: int, low: float = 0.5, force_preprocessing: bool = False):
@@ -729,7 +657,7 @@ def get_shift_load_profiles_by_year(year: int, low: float = 0.5, force_preproces
 
     # 1. load from cache if not force_preprocessing and cache exists
     if not force_preprocessing:
-         combined_slp = load_shift_load_profiles_by_year_cache(year=year)
+         combined_slp = load_shift_load_profiles_by_year_cache(year=year, low=low)
 
          if combined_slp is not None:
             return combined_slp
@@ -753,8 +681,7 @@ def get_shift_load_profiles_by_year(year: int, low: float = 0.5, force_preproces
     # 5. save to cache
     processed_dir = load_config("base_config.yaml")['shift_load_profiles_cache_dir']
     processed_file = os.path.join(processed_dir, load_config("base_config.yaml")['shift_load_profiles_cache_file'].format(year=year))
-    os.makedirs(processed_dir, exist_ok=True)
-    combined_slp.to_csv(processed_file)    
+    save_cache(combined_slp, processed_file, stage="shift_load_profiles", params={"year": year, "low": low})
 
     return combined_slp
 
@@ -906,52 +833,20 @@ def gas_slp_weekday_params(state: int, year: int):
 
     
 
-    idx = pd.date_range(start=str(year), end=str(year+1), freq='d')[:-1]
+    # 1. get the day types (holidays are sundays, 24th and 31st of december are saturdays)
+    idx = get_days_index(year)
+    day_types = get_slp_day_types(state=state, year=year)
     df = (pd.DataFrame(data={'Date': idx})
-            .assign(Day=lambda x: pd.DatetimeIndex(x['Date']).date)
-            .assign(DayOfYear=lambda x:
-                    pd.DatetimeIndex(x['Date']).dayofyear.astype(int)))
-
-
-    mask_holiday = []
-    for i in range(0, len(holidays.DE(state=state, years=year))):
-        mask_holiday.append('Null')
-        mask_holiday[i] = ((df['Day'] == [x for x in holidays.DE(state=state,
-                                          years=year).items()][i][0]))
-    hd = mask_holiday[0]
-
-
-    for i in range(1, len(holidays.DE(state=state, years=year))):
-        hd = hd | mask_holiday[i]
-    df['MO'] = df['Date'].apply(lambda x: x.weekday() == 0)
-    df['MO'] = df['MO'] & (~hd)
-    df['DI'] = df['Date'].apply(lambda x: x.weekday() == 1)
-    df['DI'] = df['DI'] & (~hd)
-    df['MI'] = df['Date'].apply(lambda x: x.weekday() == 2)
-    df['MI'] = df['MI'] & (~hd)
-    df['DO'] = df['Date'].apply(lambda x: x.weekday() == 3)
-    df['DO'] = df['DO'] & (~hd)
-    df['FR'] = df['Date'].apply(lambda x: x.weekday() == 4)
-    df['FR'] = df['FR'] & (~hd)
-    df['SA'] = df['Date'].apply(lambda x: x.weekday() == 5)
-    df['SA'] = df['SA'] & (~hd)
-    df['SO'] = df['Date'].apply(lambda x: x.weekday() == 6)
-    df['SO'] = df['SO'] | hd
-    hld = [(datetime.date(int(year), 12, 24)),
-           (datetime.date(int(year), 12, 31))]
-    
-    mask = df['Day'].isin(hld)
-    df.loc[mask, ['MO', 'DI', 'MI', 'DO', 'FR', 'SO']] = False
-    df.loc[mask, 'SA'] = True
-
+            .assign(Day=lambda x: pd.DatetimeIndex(x['Date']).date))
+    for i, wd in enumerate(GAS_SLP_DAY_TYPES):
+        df[wd] = day_types == i
 
+    # 2. add the weekday parameters of every SLP
     par = pd.DataFrame.from_dict(gas_load_profile_parameters_dict())
     for slp in par.index:
-        df['FW_'+str(slp)] = 0.0
-        for wd in ['MO', 'DI', 'MI', 'DO', 'FR', 'SA', 'SO']:
-            df.loc[df[wd], ['FW_'+str(slp)]] = par.loc[slp, wd]
-    
-    return_df = df.drop(columns=['DayOfYear']).set_index('Day')
+        df['FW_'+str(slp)] = par.loc[slp, GAS_SLP_DAY_TYPES].to_numpy(dtype=float)[day_types]
+
+    return_df = df.set_index('Day')
 
     return return_df
 
@@ -992,15 +887,242 @@ def h_value(slp: str, regional_id_list: list, temperature_allocation: pd.DataFra
     mW = par['mW'][slp]
     bW = par['bW'][slp]
 
-    # calculate h-values for every district and every day
-    all_dates_of_the_year = temperature_df_districts.index.to_numpy()
-    for district in regional_id_list:
-        logger.info(f"calculateing h_value for district: {district} ")
-        for date in all_dates_of_the_year:
-            temperature_df_districts.loc[date, district] = ((A / (1 + pow(B / (temperature_df_districts.loc[date, district] - 40), C)) + D)
-                                     + max(mH * temperature_df_districts.loc[date, district] + bH, mW * temperature_df_districts.loc[date, district] + bW))
-    
-    return temperature_df_districts
+    # calculate h-values for every district and every day at once
+    temperature = temperature_df_districts.to_numpy(dtype=float)
+    h_values = ((A / (1 + np.power(B / (temperature - 40), C)) + D)
+                + np.maximum(mH * temperature + bH, mW * temperature + bW))
+
+    return pd.DataFrame(h_values, index=temperature_df_districts.index, columns=temperature_df_districts.columns)
+
+
+# in-process cache of h_value_by_year()
+H_VALUE_CACHE = {}
+
+
+def h_value_by_year(slp: str, year: int, regional_id_list: list, water: bool = False) -> pd.DataFrame:
+    """
+    Memoized variant of h_value() and h_value_water() based on the temperature allocation of the given year.
+    The h-values are cached per (slp, year, set of regional_ids) for the running process.
+
+    Args:
+        slp : str
+            Must be one of ['BA', 'BD', 'BH', 'GA', 'GB', 'HA',
+                            'KO', 'MF', 'MK', 'PD', 'WA']
+        year : int
+        regional_id_list : list of district keys in state e.g. ['11000'] for Berlin
+        water : bool, default False
+            If True the h-values for hot water are returned (temperature clipped at 15°C, see h_value_water())
+
+    Returns:
+        pd.DataFrame
+            index: days of the year
+            columns: regional_ids (int) in the order of regional_id_list
+    """
+    regional_id_list = [int(rid) for rid in regional_id_list]
+    key = (slp, year, frozenset(regional_id_list), water)
+
+    if key not in H_VALUE_CACHE:
+        temperature_allocation = allocation_temperature_by_day(year=year)
+        if water:
+            H_VALUE_CACHE[key] = h_value_water(slp, regional_id_list, temperature_allocation.clip(15))
+        else:
+            H_VALUE_CACHE[key] = h_value(slp, regional_id_list, temperature_allocation)
+
+    return H_VALUE_CACHE[key][regional_id_list].copy()
+
+
+
+# gas SLP lookup tables: day types and upper temperature limits ("Temperatur in °C kleiner") of the BDEW gas SLPs
+GAS_SLP_DAY_TYPES = ['MO', 'DI', 'MI', 'DO', 'FR', 'SA', 'SO']
+GAS_SLP_TEMPERATURE_BUCKETS = [-15, -10, -5, 0, 5, 10, 15, 20, 25, 100]
+
+
+def get_gas_load_profile_lookup_table(slp: str) -> np.ndarray:
+    """
+    Returns the hourly shares of the given gas SLP as a lookup table.
+
+    Args:
+        slp: str
+            Name of the gas SLP, e.g. 'BD'
+
+    Returns:
+        np.ndarray: shape (7, 10, 24) = (day type, temperature bucket, hour of the day)
+            - day types see GAS_SLP_DAY_TYPES
+            - temperature buckets see GAS_SLP_TEMPERATURE_BUCKETS
+            - values: share of the daily consumption in percent
+    """
+    slp_profil = load_gas_load_profile(slp).set_index(['Tagestyp', 'Temperatur\nin °C\nkleiner'])
+    slp_profil.columns = pd.to_datetime(slp_profil.columns.astype(str), format='%H:%M:%S').hour
+    slp_profil = slp_profil.sort_index(axis=1)
+
+    day_type_pos = pd.Index(GAS_SLP_DAY_TYPES).get_indexer(slp_profil.index.get_level_values(0))
+    bucket_pos = pd.Index(GAS_SLP_TEMPERATURE_BUCKETS).get_indexer(slp_profil.index.get_level_values(1))
+    if (day_type_pos < 0).any() or (bucket_pos < 0).any() or len(slp_profil.columns) != 24:
+        raise ValueError(f"Unexpected format of the gas load profile {slp}")
+
+    table = np.full((len(GAS_SLP_DAY_TYPES), len(GAS_SLP_TEMPERATURE_BUCKETS), 24), np.nan)
+    table[day_type_pos, bucket_pos, :] = slp_profil.to_numpy(dtype=float)
+    if np.isnan(table).any():
+        raise ValueError(f"Gas load profile {slp} does not contain all day types and temperature buckets")
+
+    return table
+
+
+def get_gas_slp_temperature_buckets(temperature_allocation: pd.DataFrame) -> pd.DataFrame:
+    """
+    Assigns every daily temperature to the temperature bucket of the gas SLPs.
+    A temperature belongs to the first bucket it does not exceed, temperatures above 25°C belong to the bucket 100.
+
+    Args:
+        temperature_allocation: pd.DataFrame with results from allocation_temperature_by_day(year)
+
+    Returns:
+        pd.DataFrame:
+            index: days of the year
+            columns: regional_ids (int)
+            values: position of the bucket in GAS_SLP_TEMPERATURE_BUCKETS
+    """
+    bucket_pos = np.searchsorted(GAS_SLP_TEMPERATURE_BUCKETS, temperature_allocation.to_numpy(dtype=float), side='left')
+    bucket_pos = bucket_pos.clip(max=len(GAS_SLP_TEMPERATURE_BUCKETS) - 1)
+
+    return pd.DataFrame(bucket_pos, index=temperature_allocation.index, columns=temperature_allocation.columns.astype(int))
+
+
+def get_gas_slp_day_types(state: str, year: int) -> np.ndarray:
+    """
+    Returns the day type of the gas SLPs for every day of the year.
+
+    Args:
+        state: str
+        year: int
+
+    Returns:
+        np.ndarray: position of the day type in GAS_SLP_DAY_TYPES for every day of the year
+    """
+    # holidays are sundays, 24th and 31st of december are saturdays; the codes follow the order of GAS_SLP_DAY_TYPES
+    return get_slp_day_types(state=state, year=year)
+
+
+def order_gas_slp_columns(daily_consumption: pd.DataFrame) -> pd.DataFrame:
+    """
+    Orders the [regional_id, industry_sector] columns by regional_id, SLP and industry_sector (order of load_profiles_cts_gas()).
+    """
+    slp_mapping = load_profiles_cts_gas()
+    slp_order = list(dict.fromkeys(slp_mapping.values()))
+    industry_sector_order = list(slp_mapping.keys())
+    regional_id_order = list(dict.fromkeys(daily_consumption.columns.get_level_values(0).astype(int)))
+    columns = sorted(daily_consumption.columns, key=lambda x: (regional_id_order.index(int(x[0])),
+                                                               slp_order.index(slp_mapping[int(x[1])]),
+                                                               industry_sector_order.index(int(x[1]))))
+
+    return daily_consumption[columns]
+
+
+def disagg_hourly_gas_slp(daily_consumption: pd.DataFrame, day_types: np.ndarray, temperature_buckets: pd.DataFrame, slp_tables: dict, year: int) -> pd.DataFrame:
+    """
+    Disaggregates daily gas consumption into hourly values with the gas SLPs of the industry_sectors.
+    The hourly shares of all regional_ids are looked up at once in the (day type x temperature bucket x hour) tables.
+
+    Args:
+        daily_consumption: pd.DataFrame
+            MultiIndex columns: [regional_id, industry_sector]
+            index: days of the year
+        day_types: np.ndarray from get_gas_slp_day_types()
+        temperature_buckets: pd.DataFrame from get_gas_slp_temperature_buckets()
+        slp_tables: dict {slp: lookup table from get_gas_load_profile_lookup_table()}
+        year: int
+
+    Returns:
+        pd.DataFrame:
+            MultiIndex columns: [regional_id, industry_sector] ordered by regional_id, SLP and industry_sector
+            index: hours of the given year
+    """
+
+    # 1. order the columns by regional_id, SLP and industry_sector
+    slp_mapping = load_profiles_cts_gas()
+    daily_consumption = order_gas_slp_columns(daily_consumption)
+
+    regional_ids = daily_consumption.columns.get_level_values(0).astype(int)
+    industry_sectors = daily_consumption.columns.get_level_values(1).astype(int)
+    slps = np.array([slp_mapping[x] for x in industry_sectors])
+
+
+    # 2. look up the hourly shares per day, hour and column
+    bucket_pos = temperature_buckets[regional_ids].to_numpy()
+    hours = np.arange(24)
+    shares = np.empty((len(day_types), 24, len(industry_sectors)))
+    for slp in dict.fromkeys(slps):
+        cols = np.flatnonzero(slps == slp)
+        shares[:, :, cols] = slp_tables[slp][day_types[:, None, None], bucket_pos[:, None, cols], hours[None, :, None]]
+
+
+    # 3. multiply the daily consumption with the hourly shares
+    shares *= daily_consumption.to_numpy(dtype=float)[:, None, :] / 100
+
+    df = pd.DataFrame(shares.reshape(len(day_types) * 24, len(industry_sectors)),
+                      index=pd.date_range((str(year) + '-01-01'), periods=len(day_types) * 24, freq='h'),
+                      columns=pd.MultiIndex.from_arrays([regional_ids, industry_sectors]))
+
+    return df
+
+
+def disagg_hourly_gas_slp_factorized(daily_consumption: pd.DataFrame, day_types: np.ndarray, temperature_buckets: pd.DataFrame, slp_tables: dict, year: int) -> FactorizedTimeseries:
+    """
+    Same as disagg_hourly_gas_slp() but without materializing the (hours x columns) values:
+    the daily consumption of all industry_sectors of a regional_id with the same SLP is proportional
+    (daily profile of the regional_id x annual consumption), so only one hourly profile per (regional_id, SLP) is built.
+
+    Args:
+        see disagg_hourly_gas_slp()
+
+    Returns:
+        FactorizedTimeseries:
+            columns: [regional_id, industry_sector] ordered by regional_id, SLP and industry_sector
+            profiles: one per (regional_id, SLP)
+    """
+
+    # 1. order the columns by regional_id, SLP and industry_sector
+    slp_mapping = load_profiles_cts_gas()
+    daily_consumption = order_gas_slp_columns(daily_consumption)
+
+    regional_ids = daily_consumption.columns.get_level_values(0).astype(int)
+    industry_sectors = daily_consumption.columns.get_level_values(1).astype(int)
+    slps = np.array([slp_mapping[x] for x in industry_sectors])
+
+
+    # 2. annual consumption per column and normalized daily consumption per (regional_id, SLP)
+    # the column with the largest annual consumption of a (regional_id, SLP) represents its daily profile
+    daily = daily_consumption.to_numpy(dtype=float)
+    scales = daily.sum(axis=0)
+    profile_numbers, profile_keys = pd.factorize(pd.MultiIndex.from_arrays([regional_ids, slps]))
+    representatives = pd.Series(np.abs(scales)).groupby(profile_numbers).idxmax().to_numpy()
+    representative_sums = scales[representatives]
+    daily_profiles = np.zeros((len(day_types), len(profile_keys)))
+    nonzero = representative_sums != 0
+    daily_profiles[:, nonzero] = daily[:, representatives[nonzero]] / representative_sums[nonzero]
+
+
+    # 3. look up the hourly shares per day, hour and profile
+    profile_regional_ids = profile_keys.get_level_values(0)
+    profile_slps = np.asarray(profile_keys.get_level_values(1))
+    bucket_pos = temperature_buckets[profile_regional_ids].to_numpy()
+    hours = np.arange(24)
+    shares = np.empty((len(day_types), 24, len(profile_keys)))
+    for slp in dict.fromkeys(profile_slps):
+        cols = np.flatnonzero(profile_slps == slp)
+        shares[:, :, cols] = slp_tables[slp][day_types[:, None, None], bucket_pos[:, None, cols], hours[None, :, None]]
+    shares *= daily_profiles[:, None, :] / 100
+
+    profiles = pd.DataFrame(shares.reshape(len(day_types) * 24, len(profile_keys)),
+                            index=pd.date_range((str(year) + '-01-01'), periods=len(day_types) * 24, freq='h'))
+
+
+    # 4. one (profile, annual consumption) pair per column
+    return FactorizedTimeseries.from_profiles(profiles=profiles,
+                                              profile_positions=profile_numbers,
+                                              scales=scales,
+                                              columns=pd.MultiIndex.from_arrays([regional_ids, industry_sectors]),
+                                              normalize=True)
 
 
 
@@ -1034,11 +1156,7 @@ def disagg_temporal_heat_CTS_water_by_state(state: str, year: int, energy_carrie
 
 
 
-    # 1. get the number of hours in the year
-    hours_of_year = get_hours_of_year(year)
-
-
-    # 2. get the temperature allocation
+    # 1. get the temperature allocation
     daily_temperature_allocation = allocation_temperature_by_day(year=year)
     daily_temperature_allocation.columns = daily_temperature_allocation.columns.astype(str)
 
@@ -1047,117 +1165,29 @@ def disagg_temporal_heat_CTS_water_by_state(state: str, year: int, energy_carrie
     daily_temperature_allocation.clip(15, inplace=True)
 
 
-    # create DataFrame from temperature and use timestamp as index
-    df = pd.DataFrame(0, columns=daily_temperature_allocation.columns,
-                        index=pd.date_range((str(year) + '-01-01'), periods=hours_of_year, freq='H'))
-    
-
     # for state in bl_dict().values():
     logger.info(f'Working on state: {state}.')
     tw_df, gv_lk = disagg_daily_gas_slp_water(state, daily_temperature_allocation, year=year, energy_carrier=energy_carrier)
-    
-    gv_lk = (gv_lk.assign(federal_state=[federal_state_dict().get(int(x[:-3]))
-                                for x in gv_lk.index.astype(str)]))
-    
-
-    daily_temperature_allocation.columns = daily_temperature_allocation.columns.map(str)
-    regional_ids = gv_lk.loc[gv_lk['federal_state'] == state].index.astype(str).tolist()
-    t_allo_df = daily_temperature_allocation[regional_ids]
-
-    t_allo_df.values[:] = 100  # changed
-    t_allo_df = t_allo_df.astype('int32')
 
-    f_wd = ['FW_BA', 'FW_BD', 'FW_BH', 'FW_GA', 'FW_GB', 'FW_HA', 'FW_KO',
-            'FW_MF', 'FW_MK', 'FW_PD', 'FW_WA']
-    
 
-    calender_df = (gas_slp_weekday_params(state, year=year).drop(columns=f_wd))
+    # 2. the temperature independent consumption always uses the temperature bucket 100
+    regional_ids = tw_df.columns.get_level_values(0).unique()
+    t_allo_df = pd.DataFrame(100, index=daily_temperature_allocation.index, columns=regional_ids)
+    temperature_buckets = get_gas_slp_temperature_buckets(t_allo_df)
 
-    temp_calender_df = (pd.concat([calender_df.reset_index(), t_allo_df.reset_index()], axis=1))
+    day_types = get_gas_slp_day_types(state=state, year=year)
 
-    if temp_calender_df.isnull().values.any():
+    if len(day_types) != len(temperature_buckets):
         raise KeyError('The chosen historical weather year and the chosen '
                         'projected year have mismatching lengths.'
                         'This could be due to gap years. Please change the '
                         'historical year in hist_weather_year() in '
                         'config.py to a year of matching length.')
 
-    temp_calender_df['Tagestyp'] = 'MO'
-    for typ in ['DI', 'MI', 'DO', 'FR', 'SA', 'SO']:
-        (temp_calender_df.loc[temp_calender_df[typ], 'Tagestyp']) = typ
-
-
-    # create a list of all regional codes of the given state
-    regional_id_list = gv_lk.loc[gv_lk['federal_state'] == state].index.astype(str)
-
-    # iterate over all regional codes
-    for regional_id in regional_id_list:
-        lk_df = pd.DataFrame(index=pd.date_range((str(year) + '-01-01'), periods=hours_of_year, freq='H'))
-        tw_df_lk = tw_df.loc[:, int(regional_id)]
-        tw_df_lk.index = pd.DatetimeIndex(tw_df_lk.index)
-        last_hour = tw_df_lk.copy()[-1:]
-        last_hour.index = last_hour.index + timedelta(1)
-
-
-
-        # add the first day of the year year+1 to the tw_df_lk
-        tw_df_lk = pd.concat([tw_df_lk, last_hour])
-
-
-        # add the hours to the tw_df_lk and remove the last hour -> got hours for the whole year: 2018-01-01 00:00:00 to 2018-12-31 23:00:00
-        # Values for every hour of a day are the same
-        tw_df_lk = tw_df_lk.resample('h').ffill()
-        tw_df_lk = tw_df_lk[:-1]
-
-
-
-        # get from temp_calender_df for every day the Tagestyp=Wochentag and the coulumn of the regional code we are currently iterating over
-        temp_cal = temp_calender_df.copy()
-        temp_cal = temp_cal[['Date', 'Tagestyp', regional_id]].set_index("Date")
 
-
-        last_hour = temp_cal.copy()[-1:]
-        last_hour.index = last_hour.index + timedelta(1)
-
-
-        temp_cal = pd.concat([temp_cal, last_hour])
-
-
-
-        #temp_cal.index = pd.to_datetime(temp_cal.index)
-        temp_cal = temp_cal.resample('h').ffill()
-
-        temp_cal = temp_cal[:-1]
-        temp_cal['Stunde'] = pd.DatetimeIndex(temp_cal.index).time
-        temp_cal = temp_cal.set_index(["Tagestyp", regional_id, 'Stunde'])
-
-        for slp in list(dict.fromkeys(load_profiles_cts_gas().values())):
-
-            slp_profil = load_gas_load_profile(slp)
-            
-            slp_profil = pd.DataFrame(slp_profil.set_index(
-                ['Tagestyp', 'Temperatur\nin °C\nkleiner']))
-            slp_profil.columns = pd.to_datetime(slp_profil.columns,
-                                                format='%H:%M:%S')
-            slp_profil.columns = pd.DatetimeIndex(slp_profil.columns).time
-            slp_profil = slp_profil.stack()
-            temp_cal['Prozent'] = [slp_profil[x] for x in temp_cal.index]
-            for wz in [k for k, v in load_profiles_cts_gas().items() if v.startswith(slp)]:
-                lk_df[str(regional_id) + '_' + str(wz)] = (tw_df_lk[wz].values
-                                                    * temp_cal['Prozent'].values/100)
-                
-                df[str(regional_id) + '_' + str(wz)] = (tw_df_lk[wz].values
-                                                * temp_cal['Prozent'].values/100)
-
-
-
-        df[str(regional_id)] = lk_df.sum(axis=1)
- 
-
-
-    df = df.drop(columns=gv_lk.index.astype(str))
-    df.columns = pd.MultiIndex.from_tuples([(int(x), int(y)) for x, y in
-                                    df.columns.str.split('_')])
+    # 3. disaggregate the daily consumption of all regional_ids into hours
+    slp_tables = {slp: get_gas_load_profile_lookup_table(slp) for slp in dict.fromkeys(load_profiles_cts_gas().values())}
+    df = disagg_hourly_gas_slp(daily_consumption=tw_df, day_types=day_types, temperature_buckets=temperature_buckets, slp_tables=slp_tables, year=year)
     
     # sanity check
     if df.isna().any().any():
@@ -1298,9 +1328,9 @@ def h_value_water(slp, regional_id_list, temperatur_df):
     mW = par['mW'][slp]
     bW = par['bW'][slp]
 
-    for regional_id in regional_id_list:
-        # Vectorized assignment to update the entire column
-        temp_df[regional_id] = D + mW * temp_df[regional_id] + bW
+    # calculate h-values for every district and every day at once
+    temp_df = D + mW * temp_df.astype(float) + bW
+
     return temp_df
 
 
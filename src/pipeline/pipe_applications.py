@@ -9,7 +9,7 @@ Dissaggregating the consumption data (per industry sector and regional_id) based
 """
 
 # main function (with cache)
-def disagg_applications_efficiency_factor(sector: str, energy_carrier: str, year: int, force_preprocessing: bool = False) -> pd.DataFrame:
+def disagg_applications_efficiency_factor(sector: str, energy_carrier: str, year: int, force_preprocessing: bool = False, refresh=None, refresh_from: str = None) -> pd.DataFrame:
     """    
     Takes the current consumption data and dissaggragates it for applications and applies efficiency enhancement factors
     (equals spacial.disagg_applications_eff() in old code)
@@ -18,6 +18,8 @@ def disagg_applications_efficiency_factor(sector: str, energy_carrier: str, year
         sector (str): 'cts' or 'industry'
         energy_carrier (str): 'power' or 'gas'
         year (int): Year from 2000 to 2050
+        force_preprocessing (bool): If True, this stage is recomputed, the consumption data is loaded from the cache
+        refresh, refresh_from: stages to recompute, see RefreshPolicy in src/data_access/cache_manager.py
 
     Returns:
         pd.DataFrame: consumption data with efficiency enhancement factors applied
@@ -35,8 +37,10 @@ def disagg_applications_efficiency_factor(sector: str, energy_carrier: str, year
         raise ValueError("`energy_carrier` must be 'power', 'gas' or 'petrol'")
     
 
-    # 1. load from cache if not force_preprocessing and cache exists
-    if not force_preprocessing:
+    # 1. load from cache if the stage is not refreshed and the cache exists
+    policy = get_refresh_policy(refresh=refresh, refresh_from=refresh_from, force_preprocessing=force_preprocessing, stage="applications")
+    cache_params = {"sector": sector, "energy_carrier": energy_carrier, "year": year}
+    if not policy.should_refresh("applications", cache_params):
          consumption_data_with_efficiency_factor = load_consumption_data_with_efficiency_factor_cache(sector=sector, energy_carrier=energy_carrier, year=year)
 
          if consumption_data_with_efficiency_factor is not None:
@@ -45,7 +49,7 @@ def disagg_applications_efficiency_factor(sector: str, energy_carrier: str, year
 
     
     # 2. get consumption data dissaggregated by industry sector and regional_id for a year and energy carrier[power, gas, petrol]
-    consumption_data_sectors_regional = get_consumption_data_per_indsutry_sector_energy_carrier(year=year, cts_or_industry=sector, energy_carrier=energy_carrier, force_preprocessing=force_preprocessing)
+    consumption_data_sectors_regional = get_consumption_data_per_indsutry_sector_energy_carrier(year=year, cts_or_industry=sector, energy_carrier=energy_carrier, refresh=policy)
 
 
     # 4. dissaggregate for applications - consumption data is already filtered to contain only relevant industry_sectors(cts/industry)
@@ -67,8 +71,8 @@ def disagg_applications_efficiency_factor(sector: str, energy_carrier: str, year
     logger.info("Saving to cache...")
     processed_dir = load_config("base_config.yaml")['consumption_data_with_efficiency_factor_cache_dir']
     processed_file = os.path.join(processed_dir, load_config("base_config.yaml")['consumption_data_with_efficiency_factor_cache_file'].format(sector=sector, energy_carrier=energy_carrier, year=year))
-    os.makedirs(processed_dir, exist_ok=True)
-    consumption_data_with_efficiency_factor.to_csv(processed_file)
+    save_cache(consumption_data_with_efficiency_factor, processed_file, stage="applications", params=cache_params)
+    policy.mark_refreshed("applications", cache_params)
     logger.info(f"Cached: disagg_applications_efficiency_factor(sector={sector}, energy_carrier={energy_carrier}, year={year})")
        
 
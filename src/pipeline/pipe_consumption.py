@@ -9,9 +9,17 @@ from src.data_processing.effects import *
 
 
 # main function with cache: Consumption data for a specific year and energy carrier
-def get_consumption_data(year: int, energy_carrier: str, force_preprocessing: bool = False) -> pd.DataFrame:
+def get_consumption_data(year: int, energy_carrier: str, force_preprocessing: bool = False, refresh=None, refresh_from: str = None) -> pd.DataFrame:
     """
     Get consumption data for a specific year.
+    The consumption of all energy carriers is computed in one run (UGR, employees, JEVI and calibration are shared),
+    so all three carriers and factor_gas_no_selfgen are cached together.
+
+    Args:
+        year (int): Year from 2000 to 2050
+        energy_carrier (str): 'power' or 'gas' or 'petrol'
+        force_preprocessing (bool): If True, this stage is recomputed even if a cache file exists
+        refresh, refresh_from: stages to recompute, see RefreshPolicy in src/data_access/cache_manager.py
     """
 
 
@@ -22,8 +30,10 @@ def get_consumption_data(year: int, energy_carrier: str, force_preprocessing: bo
         raise ValueError("Energy carrier must be 'power' or 'gas' or 'petrol'")
     
 
-    # 1. load from cache if not force_preprocessing and cache exists
-    if not force_preprocessing:
+    # 1. load from cache if the stage is not refreshed and the cache exists (factor_gas_no_selfgen is needed by the applications)
+    policy = get_refresh_policy(refresh=refresh, refresh_from=refresh_from, force_preprocessing=force_preprocessing, stage="consumption")
+    cache_params = {"year": year, "energy_carrier": energy_carrier}
+    if not policy.should_refresh("consumption", cache_params) and factor_gas_no_selfgen_cache_exists(year):
          consumption_data = load_consumption_data_cache(year=year, energy_carrier=energy_carrier)
 
          if consumption_data is not None:
@@ -33,39 +43,36 @@ def get_consumption_data(year: int, energy_carrier: str, force_preprocessing: bo
 
 
 
-    # 2. get the consumption data: historical or projected in the future
+    # 2. get the consumption data of all energy carriers: historical or projected in the future
     consumption_data_power, consumption_data_gas, consumption_data_petrol = get_consumption_data_historical_and_future(year)
-
-
-    # 3. return the correct consumption data for the energy carrier
-    if energy_carrier == "power":
-        consumption_data = consumption_data_power
-    elif energy_carrier == "gas":
-        consumption_data = consumption_data_gas
-    elif energy_carrier == "petrol":
-        consumption_data = consumption_data_petrol
-    else:
-        raise ValueError("Energy carrier must be 'power' or 'gas' or 'petrol'")   
+    consumption_data_by_energy_carrier = {"power": consumption_data_power, "gas": consumption_data_gas, "petrol": consumption_data_petrol}
 
     
     # validation: check if there are no NaN values
-    if consumption_data.isnull().any().any():
-        raise ValueError("consumption_data contains NaN values")
+    for carrier, consumption_data in consumption_data_by_energy_carrier.items():
+        if consumption_data.isnull().any().any():
+            raise ValueError(f"consumption_data {carrier} contains NaN values")
     
 
-    # 4. save to cache
-    logger.info(f"Saving consumption data {energy_carrier} for year {year} to cache...")
+    # 3. save all energy carriers to cache: later requests of the other carriers are cache hits
     processed_dir = load_config("base_config.yaml")['consumption_data_cache_dir']
-    processed_file = os.path.join(processed_dir, load_config("base_config.yaml")['consumption_data_cache_file'].format(energy_carrier=energy_carrier, year=year))
-    os.makedirs(processed_dir, exist_ok=True)
-    consumption_data.to_csv(processed_file)
-    logger.info(f"Cached: get_consumption_data(year={year}, energy_carrier={energy_carrier} saved to {processed_file}")
+    for carrier, consumption_data in consumption_data_by_energy_carrier.items():
+        logger.info(f"Saving consumption data {carrier} for year {year} to cache...")
+        carrier_params = {"year": year, "energy_carrier": carrier}
+        processed_file = os.path.join(processed_dir, load_config("base_config.yaml")['consumption_data_cache_file'].format(energy_carrier=carrier, year=year))
+        processed_file = save_cache(consumption_data, processed_file, stage="consumption", params=carrier_params)
+        policy.mark_refreshed("consumption", carrier_params)
+        logger.info(f"Cached: get_consumption_data(year={year}, energy_carrier={carrier} saved to {processed_file}")
+
+
+    # 4. return the correct consumption data for the energy carrier
+    consumption_data = consumption_data_by_energy_carrier[energy_carrier]
 
     return consumption_data
 
 
 # fiter get_consumption_data() for cts or industry
-def get_consumption_data_per_indsutry_sector_energy_carrier(year: int, cts_or_industry: str, energy_carrier: str, force_preprocessing: bool = True) -> pd.DataFrame:
+def get_consumption_data_per_indsutry_sector_energy_carrier(year: int, cts_or_industry: str, energy_carrier: str, force_preprocessing: bool = False, refresh=None, refresh_from: str = None) -> pd.DataFrame:
     """
     Get consumption data for a specific year and filter it per cts or industry
     = spacial.disagg_CTS_industry()
@@ -74,7 +81,8 @@ def get_consumption_data_per_indsutry_sector_energy_carrier(year: int, cts_or_in
         year (int): The year to get consumption data for
         cts_or_industry (str): 'cts' or 'industry'
         energy_carrier (str): 'power' or 'gas' or 'petrol'
-        force_preprocessing (bool): If True, the data will be preprocessed even if a cache file exists
+        force_preprocessing (bool): If True, the consumption data will be preprocessed even if a cache file exists
+        refresh, refresh_from: stages to recompute, see RefreshPolicy in src/data_access/cache_manager.py
     """
     # 1. validate the year and cts_or_industry
     if year < 2000 or year > 2045:
@@ -86,7 +94,7 @@ def get_consumption_data_per_indsutry_sector_energy_carrier(year: int, cts_or_in
 
 
     # 2. get the consumption data
-    consumption_data = get_consumption_data(year=year, energy_carrier=energy_carrier, force_preprocessing=force_preprocessing)
+    consumption_data = get_consumption_data(year=year, energy_carrier=energy_carrier, force_preprocessing=force_preprocessing, refresh=refresh, refresh_from=refresh_from)
 
 
     # 3. filter the consumption data
@@ -121,6 +129,7 @@ def get_consumption_data_historical_and_future(year: int) -> pd.DataFrame:
     # 0.1. get the ugr_genisis_year_end = year of the last UGR data
     ugr_genisis_year_end = load_config("base_config.yaml")["ugr_genisis_year_end"]
     year_for_projection = None
+    requested_year = year
 
     # 0. validate the year
     if year < 2000 or year > 2045:
@@ -168,7 +177,11 @@ def get_consumption_data_historical_and_future(year: int) -> pd.DataFrame:
     # self gen is only missing for gas, we get the total gas self consumption from JEVI. For power selfgen is already included
     total_gas_self_consuption = get_total_gas_industry_self_consuption(year)
     decomposition_factors_power = load_decomposition_factors_power()
-    consumption_data, factor_power_selfgen, factor_gas_no_selfgen = calculate_self_generation(ugr_data, total_gas_self_consuption, decomposition_factors_power, year_for_projection)
+    consumption_data, factor_power_selfgen, factor_gas_no_selfgen = calculate_self_generation(ugr_data, total_gas_self_consuption, decomposition_factors_power)
+
+    # 5.1 cache factor_gas_no_selfgen for the requested year (used by the applications for gas)
+    factor_gas_no_selfgen_file = load_config("base_config.yaml")['factor_gas_no_selfgen_cache_file'].format(year=requested_year)
+    save_cache(factor_gas_no_selfgen.to_frame().rename_axis('industry_sector'), factor_gas_no_selfgen_file, stage="consumption", params={"year": requested_year})
 
 
     # 6. fix the industry consumption with iterative approach and dissaggregate the consumption to regional_ids
@@ -254,7 +254,7 @@ def s3_electric_vehicle_consumption(year: int) -> pd.DataFrame:
 # Main function combining s1, s2 and s3
 # ! for KBA_1 & KBA_2 this returns the total consumption of cars (home_charging + work_charging + public_charging)
 # ! for UGR this only returns the consumption of home_charging
-def electric_vehicle_consumption_by_regional_id(year: int, szenario: str, s2_szenario: str = None, force_preprocessing: bool = False) -> pd.DataFrame:
+def electric_vehicle_consumption_by_regional_id(year: int, szenario: str, s2_szenario: str = None, force_preprocessing: bool = False, refresh=None, refresh_from: str = None) -> pd.DataFrame:
     """
     Loads the registered electric vehicles by regional id for the given year in the past or future
 
@@ -276,6 +276,8 @@ def electric_vehicle_consumption_by_regional_id(year: int, szenario: str, s2_sze
             Szenario to load the data for
         force_preprocessing: bool
             If True, the data will be preprocessed even if the cache file exists
+        refresh, refresh_from: optional
+            stages to recompute, see RefreshPolicy in src/data_access/cache_manager.py
 
     Returns:
         pd.DataFrame: DataFrame with the registered electric vehicles by regional id for the given year
@@ -301,11 +303,12 @@ def electric_vehicle_consumption_by_regional_id(year: int, szenario: str, s2_sze
     # 0.1 check the cache
     cache_dir = load_config("base_config.yaml")['electric_vehicle_consumption_by_regional_id_cache_dir']
     cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['electric_vehicle_consumption_by_regional_id_cache_file'].format(year=year, szenario=szenario, s2_szenario=s2_szenario))
+    cache_params = {"year": year, "szenario": szenario, "s2_szenario": s2_szenario}
+    policy = get_refresh_policy(refresh=refresh, refresh_from=refresh_from, force_preprocessing=force_preprocessing, stage="ev_regional")
 
-    if os.path.exists(cache_file) and not force_preprocessing:
+    if cache_exists(cache_file, stage="ev_regional", params=cache_params) and not policy.should_refresh("ev_regional", cache_params):
         logger.info(f"Load electric_vehicle_consumption_by_regional_id from cache for year: {year}, szenario: {szenario}, s2_szenario: {s2_szenario}")
-        ev_consumption_by_region =  pd.read_csv(cache_file)
-        ev_consumption_by_region.set_index("regional_id", inplace=True)
+        ev_consumption_by_region =  load_cache(cache_file, index_col="regional_id")
         return ev_consumption_by_region
 
 
@@ -327,9 +330,9 @@ def electric_vehicle_consumption_by_regional_id(year: int, szenario: str, s2_sze
     # 2. save the data to the cache
     if ev_consumption_by_region.isna().any().any():
         raise ValueError("DataFrame contains NaN values")
-    os.makedirs(cache_dir, exist_ok=True)
     logger.info(f"Save electric_vehicle_consumption_by_regional_id to cache for year: {year}, szenario: {szenario}, s2_szenario: {s2_szenario}")
-    ev_consumption_by_region.to_csv(cache_file)    
+    save_cache(ev_consumption_by_region, cache_file, stage="ev_regional", params=cache_params)
+    policy.mark_refreshed("ev_regional", cache_params)
 
 
     return ev_consumption_by_region
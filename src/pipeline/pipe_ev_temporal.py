@@ -15,7 +15,7 @@ LAST_YEAR_EXISTING_DATA_UGR = load_config()["last_year_existing_fuel_consumption
 
 
 
-def electric_vehicle_consumption_by_region_id_and_temporal_resolution(year: int, szenario: str, s2_szenario: str = None, force_preprocessing: bool = False) -> pd.DataFrame:
+def electric_vehicle_consumption_by_region_id_and_temporal_resolution(year: int, szenario: str, s2_szenario: str = None, force_preprocessing: bool = False, factorized: bool = False, refresh=None, refresh_from: str = None) -> pd.DataFrame:
     """
     This function disaggregates the ev consumption by regional id to a temporal resolution (10min steps).
     
@@ -24,12 +24,19 @@ def electric_vehicle_consumption_by_region_id_and_temporal_resolution(year: int,
         year (int): The year of the data.
         szenario (str): The scenario of the data for the ev consumption by regional id.
         s2_szenario (str, optional): The s2 scenario of the data for the ev consumption by regional id. Defaults to None.
+        factorized (bool, optional): Whether to return (and cache) a FactorizedTimeseries holding only the charging
+            profiles per state and the consumption per regional id. Defaults to False.
+        force_preprocessing (bool, optional): Whether to recompute the temporal disaggregation, the regional ev
+            consumption is still loaded from its cache. Defaults to False.
+        refresh, refresh_from (optional): stages to recompute e.g. refresh_from='ev_regional', see RefreshPolicy in
+            src/data_access/cache_manager.py. Defaults to None.
 
     Returns:
         pd.DataFrame: The ev consumption by regional id and temporal resolution.
             - index: daytime
             - column[0]: regional_ids
             - column[1]: charging_consumption [home_charging, work_charging, public_charging]
+        FactorizedTimeseries if factorized=True
     """
 
 
@@ -51,21 +58,31 @@ def electric_vehicle_consumption_by_region_id_and_temporal_resolution(year: int,
     # 0.1 load from cache if available
     cache_dir = load_config("base_config.yaml")['electric_vehicle_consumption_by_regional_id_temporal_cache_dir']
     cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['electric_vehicle_consumption_by_regional_id_temporal_cache_file'].format(year=year, szenario=szenario, s2_szenario=s2_szenario))
-
-    if os.path.exists(cache_file) and not force_preprocessing:
+    factorized_cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['electric_vehicle_consumption_by_regional_id_temporal_factorized_cache_file'].format(part="{part}", year=year, szenario=szenario, s2_szenario=s2_szenario))
+    profiles_file = factorized_cache_file.format(part="profiles")
+    mapping_file = factorized_cache_file.format(part="mapping")
+    cache_params = {"year": year, "szenario": szenario, "s2_szenario": s2_szenario}
+    policy = get_refresh_policy(refresh=refresh, refresh_from=refresh_from, force_preprocessing=force_preprocessing, stage="ev_temporal")
+    refresh_ev_temporal = policy.should_refresh("ev_temporal", cache_params)
+
+    if factorized and cache_exists(profiles_file, stage="ev_temporal", params=cache_params) and cache_exists(mapping_file, stage="ev_temporal", params=cache_params) and not refresh_ev_temporal:
+        logger.info(f"Load factorized electric_vehicle_consumption_by_regional_id from cache for year: {year}, szenario: {szenario}, s2_szenario: {s2_szenario}")
+        return FactorizedTimeseries.from_frames(profiles=load_cache(profiles_file, index_col=0, parse_dates=True), mapping=load_cache(mapping_file, index_col=None))
+
+    if not factorized and cache_exists(cache_file, stage="ev_temporal", params=cache_params) and not refresh_ev_temporal:
         logger.info(f"Load electric_vehicle_consumption_by_regional_id from cache for year: {year}, szenario: {szenario}, s2_szenario: {s2_szenario}")
-        ev_consumption_by_region =  pd.read_csv(cache_file)
-        ev_consumption_by_region.set_index("regional_id", inplace=True)
+        ev_consumption_by_region =  load_cache(cache_file, header=[0, 1], index_col=0, parse_dates=True)
         return ev_consumption_by_region
 
     
     # 1. load data
-    ev_consumption_by_regional_id = electric_vehicle_consumption_by_regional_id(year=year, szenario=szenario, s2_szenario=s2_szenario)
+    ev_consumption_by_regional_id = electric_vehicle_consumption_by_regional_id(year=year, szenario=szenario, s2_szenario=s2_szenario, refresh=policy)
 
 
 
     # 2. disaggregate the data by temporal resolution
     ev_consumption_by_regional_id_and_temporal_resolution = pd.DataFrame()
+    ev_consumption_by_state_list = []
     state_counter = 1
 
     # 2.1. iterate over all states ( to also include state-holidays)
@@ -84,12 +101,32 @@ def electric_vehicle_consumption_by_region_id_and_temporal_resolution(year: int,
 
 
         # 2.3. disaggregate the data by temporal resolution
-        ev_consumption_by_state = disaggregate_temporal_ev_consumption_for_state(ev_consumption_by_regional_id=ev_consumption_by_regional_id, state=state, year=year, yearly_charging_profile=yearly_charging_profile)
+        ev_consumption_by_state = disaggregate_temporal_ev_consumption_for_state(ev_consumption_by_regional_id=ev_consumption_by_regional_id, state=state, year=year, yearly_charging_profile=yearly_charging_profile, factorized=factorized)
 
 
         # 2.4. append the result
-        ev_consumption_by_regional_id_and_temporal_resolution = pd.concat([ev_consumption_by_regional_id_and_temporal_resolution, ev_consumption_by_state], axis=1)
+        if factorized:
+            ev_consumption_by_state_list.append(ev_consumption_by_state)
+        else:
+            ev_consumption_by_regional_id_and_temporal_resolution = pd.concat([ev_consumption_by_regional_id_and_temporal_resolution, ev_consumption_by_state], axis=1)
+
+
+    # 5. factorized: validate and save the profiles and the mapping
+    if factorized:
+        ev_consumption_factorized = FactorizedTimeseries.concat(ev_consumption_by_state_list)
+
+        if ev_consumption_factorized.profiles.isnull().any().any() or ev_consumption_factorized.mapping.isnull().any().any():
+            raise ValueError("There are still NaNs in the result")
+        if not np.isclose(ev_consumption_factorized.total(), ev_consumption_by_regional_id.sum().sum()):
+            raise ValueError("The sum of the ev consumption by regional id temporal is not equal to the sum of the ev consumption by regional id!")
+
+        logger.info(f"Save factorized ev_consumption_by_regional_id_and_temporal_resolution to cache for year: {year}, szenario: {szenario}, s2_szenario: {s2_szenario}")
+        profiles, mapping = ev_consumption_factorized.to_frames()
+        save_cache(profiles, profiles_file, stage="ev_temporal", params=cache_params)
+        save_cache(mapping, mapping_file, index=False, stage="ev_temporal", params=cache_params)
+        policy.mark_refreshed("ev_temporal", cache_params)
 
+        return ev_consumption_factorized
 
 
     # 6. validate the result
@@ -100,9 +137,9 @@ def electric_vehicle_consumption_by_region_id_and_temporal_resolution(year: int,
     
 
     # 7. save to cache
-    os.makedirs(cache_dir, exist_ok=True)
     logger.info(f"Save ev_consumption_by_regional_id_and_temporal_resolution to cache for year: {year}, szenario: {szenario}, s2_szenario: {s2_szenario}")
-    ev_consumption_by_regional_id_and_temporal_resolution.to_csv(cache_file)   
+    save_cache(ev_consumption_by_regional_id_and_temporal_resolution, cache_file, stage="ev_temporal", params=cache_params)
+    policy.mark_refreshed("ev_temporal", cache_params)
 
 
     return ev_consumption_by_regional_id_and_temporal_resolution
@@ -17,7 +17,7 @@ Assumptions:
 
 
 # Main function
-def temporal_elec_load_from_fuel_switch(year: int, state: str, energy_carrier: str, sector: str, switch_to: str, force_preprocessing: bool = False, float_precision: int = 10) -> pd.DataFrame:
+def temporal_elec_load_from_fuel_switch(year: int, state: str, energy_carrier: str, sector: str, switch_to: str, force_preprocessing: bool = False, float_precision: int = None, refresh=None, refresh_from: str = None) -> pd.DataFrame:
     """
     Calculates the electricity demand that is needed to replace the gas or petrol consumption.
 
@@ -33,9 +33,12 @@ def temporal_elec_load_from_fuel_switch(year: int, state: str, energy_carrier: s
         switch_to : str
             The target energy carrier to calculate the electricity demand for.
         force_preprocessing : bool, default False
-            If True, the function will not use the cache and will recalculate the data.
-        float_precision : int, default 10
-            The precision of the float numbers.
+            If True, the function will not use its cache and will recalculate the data. The intermediate
+            caches (fuel switch demand, heat norms, applications, consumption) are still used.
+        float_precision : int, default None
+            The precision of the float numbers in csv caches (not needed for the parquet cache backend).
+        refresh, refresh_from : optional
+            stages to recompute e.g. {'heat'} or refresh_from='applications', see RefreshPolicy in src/data_access/cache_manager.py
 
     Returns:
         pd.DataFrame() : timestamp as index, multicolumns with nuts-3, branch and applications
@@ -62,9 +65,11 @@ def temporal_elec_load_from_fuel_switch(year: int, state: str, energy_carrier: s
     # 0.1 get from cache if available
     cache_dir = load_config("base_config.yaml")['temporal_elec_load_from_fuel_switch_cache_dir']
     cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['temporal_elec_load_from_fuel_switch_cache_file'].format(year=year, state=state, energy_carrier=energy_carrier, sector=sector, switch_to=switch_to))
-    if os.path.exists(cache_file) and not force_preprocessing:
+    cache_params = {"sector": sector, "energy_carrier": energy_carrier, "year": year, "state": state, "switch_to": switch_to}
+    policy = get_refresh_policy(refresh=refresh, refresh_from=refresh_from)
+    if cache_exists(cache_file, stage="heat", params=cache_params) and not (force_preprocessing or policy.should_refresh("heat", cache_params)):
         logger.info(f"Load temporal_elec_load_from_fuel_switch from cache for year: {year}, state: {state}, sector: {sector}, energy_carrier: {energy_carrier}, switch_to: {switch_to}")
-        temporal_fuel_switch =  pd.read_csv(cache_file)
+        temporal_fuel_switch =  load_cache(cache_file, index_col=None)
         return temporal_fuel_switch
 
     
@@ -74,21 +79,21 @@ def temporal_elec_load_from_fuel_switch(year: int, state: str, energy_carrier: s
         if energy_carrier == "gas":
 
             if sector == "cts":
-                temporal_fuel_switch = temporal_cts_elec_load_from_fuel_switch_gas(year=year, state=state, switch_to=switch_to)
+                temporal_fuel_switch = temporal_cts_elec_load_from_fuel_switch_gas(year=year, state=state, switch_to=switch_to, refresh=policy)
             elif sector == "industry":
-                temporal_fuel_switch = temporal_industry_elec_load_from_fuel_switch_gas(year=year, state=state, switch_to=switch_to)
+                temporal_fuel_switch = temporal_industry_elec_load_from_fuel_switch_gas(year=year, state=state, switch_to=switch_to, refresh=policy)
             else:
                 raise ValueError(f"Invalid sector: {sector}")
             
         if energy_carrier == "petrol":
             if sector == "cts":
-                temporal_fuel_switch = temporal_cts_elec_load_from_fuel_switch_petrol(year=year, state=state, switch_to=switch_to)
+                temporal_fuel_switch = temporal_cts_elec_load_from_fuel_switch_petrol(year=year, state=state, switch_to=switch_to, refresh=policy)
             elif sector == "industry":
-                temporal_fuel_switch = temporal_industry_elec_load_from_fuel_switch_petrol(year=year, state=state, switch_to=switch_to)
+                temporal_fuel_switch = temporal_industry_elec_load_from_fuel_switch_petrol(year=year, state=state, switch_to=switch_to, refresh=policy)
             else:
                 raise ValueError(f"Invalid sector: {sector}")
     elif switch_to == "hydrogen":
-        temporal_fuel_switch = temporal_hydrogen_load_from_fuel_switch(year=year, energy_carrier=energy_carrier, state=state)
+        temporal_fuel_switch = temporal_hydrogen_load_from_fuel_switch(year=year, energy_carrier=energy_carrier, state=state, refresh=policy)
         
     
 
@@ -97,9 +102,9 @@ def temporal_elec_load_from_fuel_switch(year: int, state: str, energy_carrier: s
         raise ValueError("DataFrame contains NaN values")
     
     # save to cache
-    os.makedirs(cache_dir, exist_ok=True)
     logger.info(f"Save temporal_elec_load_from_fuel_switch to cache for year: {year}, state: {state}, sector: {sector}, energy_carrier: {energy_carrier}, switch_to: {switch_to}")
-    temporal_fuel_switch.to_csv(cache_file, float_format=f"%.{float_precision}f")    
+    save_cache(temporal_fuel_switch, cache_file, float_precision=float_precision, stage="heat", params=cache_params)
+    policy.mark_refreshed("heat", cache_params)
 
 
 
@@ -108,7 +113,7 @@ def temporal_elec_load_from_fuel_switch(year: int, state: str, energy_carrier: s
 
 
 # Gas - CTS:
-def temporal_cts_elec_load_from_fuel_switch_gas(year: int, state: str, switch_to: str):
+def temporal_cts_elec_load_from_fuel_switch_gas(year: int, state: str, switch_to: str, refresh: RefreshPolicy = None):
     """
     Converts timeseries of gas demand per NUTS-3 and branch and application to
         electric consumption timeseries. Uses COP timeseries for heat
@@ -141,11 +146,11 @@ def temporal_cts_elec_load_from_fuel_switch_gas(year: int, state: str, switch_to
 
     # 1. get gas demand for fuel switch
     sector = "cts"
-    df_heat_switch = sector_fuel_switch_fom_gas_petrol(sector=sector, switch_to=switch_to, year=year, energy_carrier=energy_carrier)
+    df_heat_switch = sector_fuel_switch_fom_gas_petrol(sector=sector, switch_to=switch_to, year=year, energy_carrier=energy_carrier, refresh=refresh)
 
 
     # 2. temporally disaggregate gas demand for fuel switch
-    df_temp_heat_switch = disagg_temporal_cts_fuel_switch(df_gas_switch=df_heat_switch, state=state, year=year, energy_carrier=energy_carrier)
+    df_temp_heat_switch = disagg_temporal_cts_fuel_switch(df_gas_switch=df_heat_switch, state=state, year=year, energy_carrier=energy_carrier, refresh=refresh)
     """
     index: timestamp
     columns: [regional_id, industry_sector, application]
@@ -164,7 +169,7 @@ def temporal_cts_elec_load_from_fuel_switch_gas(year: int, state: str, switch_to
 
 
 # Gas -Industry:
-def temporal_industry_elec_load_from_fuel_switch_gas(year: int, state: str, switch_to: str):
+def temporal_industry_elec_load_from_fuel_switch_gas(year: int, state: str, switch_to: str, refresh: RefreshPolicy = None):
     """
     Converts timeseries of gas demand per NUTS-3 and branch and application to
         electric consumption timeseries. Uses COP timeseries for heat
@@ -221,7 +226,7 @@ def temporal_industry_elec_load_from_fuel_switch_gas(year: int, state: str, swit
 
 
 # Petrol - CTS
-def temporal_cts_elec_load_from_fuel_switch_petrol(year: int, state: str, switch_to: str):
+def temporal_cts_elec_load_from_fuel_switch_petrol(year: int, state: str, switch_to: str, refresh: RefreshPolicy = None):
     """
     Converts timeseries of gas demand per NUTS-3 and branch and application to
         electric consumption timeseries. Uses COP timeseries for heat
@@ -259,11 +264,11 @@ def temporal_cts_elec_load_from_fuel_switch_petrol(year: int, state: str, switch
     
 
     # 1. get gas demand for fuel switch
-    df_petrol_switch = sector_fuel_switch_fom_gas_petrol(sector=sector, switch_to=switch_to, year=year, energy_carrier=energy_carrier)
+    df_petrol_switch = sector_fuel_switch_fom_gas_petrol(sector=sector, switch_to=switch_to, year=year, energy_carrier=energy_carrier, refresh=refresh)
 
 
     # 2. disaggregate petrol demand for fuel switch
-    df_temp_petrol_switch = disagg_temporal_cts_fuel_switch(df_gas_switch=df_petrol_switch, state=state, year=year, energy_carrier=energy_carrier)
+    df_temp_petrol_switch = disagg_temporal_cts_fuel_switch(df_gas_switch=df_petrol_switch, state=state, year=year, energy_carrier=energy_carrier, refresh=refresh)
 
 
     # 3. calculate total demand
@@ -275,7 +280,7 @@ def temporal_cts_elec_load_from_fuel_switch_petrol(year: int, state: str, switch
 
 
 # Petrol - Industry
-def temporal_industry_elec_load_from_fuel_switch_petrol(year: int, state: str, switch_to: str):
+def temporal_industry_elec_load_from_fuel_switch_petrol(year: int, state: str, switch_to: str, refresh: RefreshPolicy = None):
     """
     Converts timeseries of gas demand per NUTS-3 and branch and application to
         electric consumption timeseries. Uses COP timeseries for heat
@@ -336,7 +341,7 @@ def temporal_industry_elec_load_from_fuel_switch_petrol(year: int, state: str, s
 
 
 # Main function hydrogen
-def temporal_hydrogen_load_from_fuel_switch(year: int, energy_carrier: str, state: str, force_preprocessing: bool = False, float_precision: int = 10) -> pd.DataFrame:
+def temporal_hydrogen_load_from_fuel_switch(year: int, energy_carrier: str, state: str, force_preprocessing: bool = False, float_precision: int = None, refresh=None, refresh_from: str = None) -> pd.DataFrame:
     """
     Determines hydrogen consumption to replace gas consumption.
 
@@ -347,6 +352,10 @@ def temporal_hydrogen_load_from_fuel_switch(year: int, energy_carrier: str, stat
             The energy carrier to calculate the hydrogen demand for.
         state : str
             The state to calculate the hydrogen demand for.
+        force_preprocessing : bool, default False
+            If True, the function will not use its cache, the intermediate caches are still used.
+        refresh, refresh_from : optional
+            stages to recompute, see RefreshPolicy in src/data_access/cache_manager.py
 
     Returns:
         pd.DataFrame() : timestamp as index, multicolumns with nuts-3, branch and applications
@@ -355,12 +364,14 @@ def temporal_hydrogen_load_from_fuel_switch(year: int, energy_carrier: str, stat
     # 0.1 get from cache if available
     cache_dir = load_config("base_config.yaml")['temporal_hydrogen_load_from_fuel_switch_cache_dir']
     cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['temporal_hydrogen_load_from_fuel_switch_cache_file'].format(year=year, state=state, energy_carrier=energy_carrier))
-    if os.path.exists(cache_file) and not force_preprocessing:
+    cache_params = {"sector": "industry", "energy_carrier": energy_carrier, "year": year, "state": state, "switch_to": "hydrogen"}
+    policy = get_refresh_policy(refresh=refresh, refresh_from=refresh_from)
+    if cache_exists(cache_file, stage="heat", params=cache_params) and not (force_preprocessing or policy.should_refresh("heat", cache_params)):
         logger.info(f"Load temporal_hydrogen_load_from_fuel_switch from cache for year: {year}, state: {state}, energy_carrier: {energy_carrier}")
-        temporal_fuel_switch =  pd.read_csv(cache_file)
+        temporal_fuel_switch =  load_cache(cache_file, index_col=None)
         return temporal_fuel_switch
     
-    df_gas_switch = sector_fuel_switch_fom_gas_petrol(sector="industry", switch_to="hydrogen", year=year, energy_carrier=energy_carrier)
+    df_gas_switch = sector_fuel_switch_fom_gas_petrol(sector="industry", switch_to="hydrogen", year=year, energy_carrier=energy_carrier, refresh=policy)
 
 
     df_temp_gas_switch = disagg_temporal_industry_fuel_switch(df_gas_switch=df_gas_switch, state=state, year=year, energy_carrier=energy_carrier)
@@ -372,16 +383,16 @@ def temporal_hydrogen_load_from_fuel_switch(year: int, energy_carrier: str, stat
 
 
     # save to cache
-    os.makedirs(cache_dir, exist_ok=True)
     logger.info(f"Save temporal_hydrogen_load_from_fuel_switch to cache for year: {year}, state: {state}, energy_carrier: {energy_carrier}")
-    df_hydro.to_csv(cache_file, float_format=f"%.{float_precision}f")    
+    save_cache(df_hydro, cache_file, float_precision=float_precision, stage="heat", params=cache_params)
+    policy.mark_refreshed("heat", cache_params)
     return df_hydro
 
 
 
 # Gas & Petrol 
 # calculate the gas that has to be switched to Power/ H2
-def sector_fuel_switch_fom_gas_petrol(sector: str, switch_to: str, year: int, energy_carrier: str, force_preprocessing: bool = False) -> pd.DataFrame:
+def sector_fuel_switch_fom_gas_petrol(sector: str, switch_to: str, year: int, energy_carrier: str, force_preprocessing: bool = False, refresh=None, refresh_from: str = None) -> pd.DataFrame:
     """
     Determines yearly gas/petrol demand per branch and regional id for heat applications
     that will be replaced by power or hydrogen in the future.
@@ -402,6 +413,10 @@ def sector_fuel_switch_fom_gas_petrol(sector: str, switch_to: str, year: int, en
             must be one of ['power', 'hydrogen']
         energy_carrier: str
             must be one of ['gas', 'petrol']
+        force_preprocessing: bool
+            if True the cache of this function is not used, the applications and consumption caches are still used
+        refresh, refresh_from: optional
+            stages to recompute, see RefreshPolicy in src/data_access/cache_manager.py
     Returns:
         pd.DataFrame:
             index: regional_id (all 400)
@@ -427,12 +442,14 @@ def sector_fuel_switch_fom_gas_petrol(sector: str, switch_to: str, year: int, en
     cache_file = os.path.join(cache_dir, load_config("base_config.yaml")['sector_fuel_switch_fom_gas_petrol_cache_file'].format(year=year, sector=sector, switch_to=switch_to, energy_carrier=energy_carrier))
 
     # Check if cache exists and load if available
-    if os.path.exists(cache_file) and not force_preprocessing:
+    cache_params = {"sector": sector, "energy_carrier": energy_carrier, "year": year, "switch_to": switch_to}
+    policy = get_refresh_policy(refresh=refresh, refresh_from=refresh_from)
+    if cache_exists(cache_file, stage="heat", params=cache_params) and not (force_preprocessing or policy.should_refresh("heat", cache_params)):
         logger.info(f"Loading cached data for year: {year}, sector: {sector}, switch_to: {switch_to}, energy_carrier: {energy_carrier}")
-        return pd.read_csv(cache_file, index_col=0, header=[0, 1])
+        return load_cache(cache_file, index_col=0, header=[0, 1])
 
     # 1. load consumption data by application and wz and region
-    df_consumption = disagg_applications_efficiency_factor(year=year, energy_carrier=energy_carrier, sector=sector)
+    df_consumption = disagg_applications_efficiency_factor(year=year, energy_carrier=energy_carrier, sector=sector, refresh=policy)
     df_consumption.columns = pd.MultiIndex.from_tuples(
         [(str(b), str(a)) for b, a in df_consumption.columns],
         names=df_consumption.columns.names
@@ -460,14 +477,14 @@ def sector_fuel_switch_fom_gas_petrol(sector: str, switch_to: str, year: int, en
     df_fossil_switch = df_fossil_switch.loc[:, ~(df_fossil_switch == 0).all()]
 
     # Save to cache
-    os.makedirs(cache_dir, exist_ok=True)
-    df_fossil_switch.to_csv(cache_file)
+    save_cache(df_fossil_switch, cache_file, stage="heat", params=cache_params)
+    policy.mark_refreshed("heat", cache_params)
     logger.info(f"Data cached for year: {year}, sector: {sector}, switch_to: {switch_to}, energy_carrier: {energy_carrier}")
 
     return df_fossil_switch
 
 # temaporal disaggregation of gas/petrol demand
-def disagg_temporal_cts_fuel_switch(df_gas_switch: pd.DataFrame, state: str, year: int, energy_carrier: str) -> pd.DataFrame:
+def disagg_temporal_cts_fuel_switch(df_gas_switch: pd.DataFrame, state: str, year: int, energy_carrier: str, refresh: RefreshPolicy = None) -> pd.DataFrame:
     """
     Temporally disaggregates CTS gas demand, which will be switched to
     electricity or hydrogen, by state.
@@ -482,6 +499,8 @@ def disagg_temporal_cts_fuel_switch(df_gas_switch: pd.DataFrame, state: str, yea
                 'BB', 'MV', 'SN', 'ST', 'TH']
         year : int
             Year of the data
+        refresh : RefreshPolicy, optional
+            passed to create_heat_norm_cts()
     
     Returns:
         pd.DataFrame() : timestamp as index, multicolumns with nuts-3, branch and
@@ -503,27 +522,16 @@ def disagg_temporal_cts_fuel_switch(df_gas_switch: pd.DataFrame, state: str, yea
 
 
 
-    # 1. create a multicolumn dataframe from the given dataframe and state:
-    new_df = make_3level_timeseries(df_gas_switch=df_gas_switch, state=state, year=year)
-    """ new_df is a dataframe with the following columns:
-
-    columns:            ['regional_id', 'industry_sector', 'application']
-    index:              [datetime]: year in 15 min timesteps
-    values:             [float]: 0
-    
-    """
-
-
-    # 2. get normalized timeseries for temperature dependent and temperature
+    # 1. get normalized timeseries for temperature dependent and temperature
     # independent gas demand in CTS - hourly
-    heat_norm_1h, consumption_total, gas_tempinde_norm_1h = create_heat_norm_cts(state=state, year=year, energy_carrier=energy_carrier)
+    heat_norm_1h, consumption_total, gas_tempinde_norm_1h = create_heat_norm_cts(state=state, year=year, energy_carrier=energy_carrier, refresh=refresh)
     heat_norm_1h.columns = heat_norm_1h.columns.map(lambda col: tuple(map(str, col)))
     gas_tempinde_norm_1h.columns = gas_tempinde_norm_1h.columns.map(lambda col: tuple(map(str, col)))
     
 
 
 
-    # 3. heat_norm: transform it into a 15-minute resolution using interpolation and normalize
+    # 2. heat_norm: transform it into a 15-minute resolution using interpolation and normalize
     """ interpolation:
     00:00 → 10.0
     00:15 → NaN
@@ -557,7 +565,7 @@ def disagg_temporal_cts_fuel_switch(df_gas_switch: pd.DataFrame, state: str, yea
     heat_norm_15min = heat_norm_15min.fillna(0.0)
 
 
-    # 4.gas_tempinde_norm: transform it into a 15-minute resolution using interpolation and normalize
+    # 3. gas_tempinde_norm: transform it into a 15-minute resolution using interpolation and normalize
     gas_tempinde_norm_15min_uncomplete = (gas_tempinde_norm_1h
         .resample('15min').asfreq()
         .interpolate(method='linear', limit_direction='forward', axis=0))
@@ -575,25 +583,17 @@ def disagg_temporal_cts_fuel_switch(df_gas_switch: pd.DataFrame, state: str, yea
 
 
 
-    # 5. create temp disaggregated gas demands per nuts-3, branch and app
-    all_regional_ids = new_df.columns.get_level_values(0).unique()
-    for regional_id in all_regional_ids:
-
-        df_switch_region = df_gas_switch.loc[regional_id]
-        for industry_sector in df_switch_region.index.get_level_values(0).unique():
-            
-            df_switch_branch = df_switch_region.loc[industry_sector]
-            for app in df_switch_branch.index:
-
-                # space heating will be handled with the temperature dependent profile, the others with a general profile
-                if app == 'space_heating':
-                    new_df[regional_id, industry_sector, app] = ((df_gas_switch.loc[regional_id][industry_sector, app]) * (heat_norm_15min[str(regional_id), str(industry_sector)]))
-                else:
-                    new_df[regional_id, industry_sector, app] = ((df_gas_switch.loc[regional_id][industry_sector, app]) * (gas_tempinde_norm_15min[str(regional_id), str(industry_sector)]))
-        
+    # 4. create temp disaggregated gas demands per nuts-3, branch and app in one broadcast
+    # space heating will be handled with the temperature dependent profile, the others with a general profile
+    # only the [regional_id, industry_sector, application] of the state with a demand are created
+    new_df = disagg_3level_timeseries_by_norms(df_gas_switch=df_gas_switch, state=state, year=year, heat_norm_15min=heat_norm_15min, tempinde_norm_15min=gas_tempinde_norm_15min)
+    """ new_df is a dataframe with the following columns:
 
-    # 6. drop all columns that have only nan values
-    new_df.dropna(axis=1, how='all', inplace=True)
+    columns:            ['regional_id', 'industry_sector', 'application']
+    index:              [datetime]: year in 15 min timesteps
+    values:             [float]
+    
+    """
 
 
     return new_df
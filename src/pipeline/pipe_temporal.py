@@ -7,7 +7,7 @@ from src.data_processing.application import *
 
 
 
-def disaggregate_temporal(energy_carrier: str, sector: str, year: int, force_preprocessing: bool = False, float_precision: int = 10) -> pd.DataFrame:
+def disaggregate_temporal(energy_carrier: str, sector: str, year: int, force_preprocessing: bool = False, float_precision: int = 10, factorized: bool = False, refresh=None, refresh_from: str = None) -> pd.DataFrame:
     """
     Disaggregate the temporal data for a given energy carrier and sector.
 
@@ -16,14 +16,23 @@ def disaggregate_temporal(energy_carrier: str, sector: str, year: int, force_pre
         energy_carrier (str): The energy carrier to disaggregate.
         sector (str): The sector to disaggregate.
         year (int): The year to disaggregate.
-        force_preprocessing (bool, optional): Whether to force the preprocessing. Defaults to False.
-        float_precision (int, optional): The precision of the float to reduce the file size. Defaults to 10.
+        force_preprocessing (bool, optional): Whether to recompute the temporal disaggregation. The upstream stages
+            (applications, consumption) still use their caches, use refresh/refresh_from to recompute them. Defaults to False.
+        float_precision (int, optional): The precision of the float to reduce the file size of csv caches. Ignored
+            by the parquet cache backend (see cache_backend and cache_float32 in base_config.yaml). Defaults to 10.
+        factorized (bool, optional): Whether to return (and cache) a FactorizedTimeseries holding only the unique
+            normalized profiles and the annual consumption per column. Defaults to False.
+        refresh (optional): stages to recompute e.g. {'temporal', 'applications'} or 'all', see RefreshPolicy in
+            src/data_access/cache_manager.py. Defaults to None.
+        refresh_from (str, optional): recompute this stage and all stages after it e.g. 'applications'. Defaults to None.
 
     Returns:
         pd.DataFrame: 
             MultiIndex columns: [regional_id, industry_sector]
             index: hours/15min of the given year
         e.g. for cts gas: 8760 rows x 23200 (=400*58) columns = 2.032.3200  values -> 3.59GB with full float precision 18
+        FactorizedTimeseries if factorized=True: memory scales with the number of unique profiles
+            (e.g. 16 states x 9 shift load profiles for industry)
     """
 
     # 0. validate the input
@@ -36,8 +45,14 @@ def disaggregate_temporal(energy_carrier: str, sector: str, year: int, force_pre
 
 
     # 0.1 check if the cache exists
-    if not force_preprocessing:
-        consumption_disaggregate_temporal = load_consumption_disaggregate_temporal_cache(sector=sector, energy_carrier=energy_carrier, year=year)
+    policy = get_refresh_policy(refresh=refresh, refresh_from=refresh_from, force_preprocessing=force_preprocessing, stage="temporal")
+    cache_params = {"sector": sector, "energy_carrier": energy_carrier, "year": year}
+    refresh_temporal = policy.should_refresh("temporal", cache_params)
+    if not refresh_temporal:
+        if factorized:
+            consumption_disaggregate_temporal = load_consumption_disaggregate_temporal_factorized_cache(sector=sector, energy_carrier=energy_carrier, year=year)
+        else:
+            consumption_disaggregate_temporal = load_consumption_disaggregate_temporal_cache(sector=sector, energy_carrier=energy_carrier, year=year)
 
         if consumption_disaggregate_temporal is not None:
             logger.info(f"Loading from cache: disaggregate_temporal(sector={sector}, energy_carrier={energy_carrier}, year={year})")
@@ -45,7 +60,7 @@ def disaggregate_temporal(energy_carrier: str, sector: str, year: int, force_pre
 
 
     # 1. Get the consumption data with efficiency factor
-    consumption_data = disagg_applications_efficiency_factor(sector=sector, energy_carrier=energy_carrier, year=year, force_preprocessing=force_preprocessing)
+    consumption_data = disagg_applications_efficiency_factor(sector=sector, energy_carrier=energy_carrier, year=year, refresh=policy)
 
 
 
@@ -53,39 +68,54 @@ def disaggregate_temporal(energy_carrier: str, sector: str, year: int, force_pre
     if sector == "industry":
         # sum over the applications but with efficiency factor
         consumption_data = consumption_data.T.groupby(level=0).sum().T
-        consumption_disaggregate_temporal = disaggregate_temporal_industry(consumption_data=consumption_data, year=year, low=0.5, force_preprocessing=force_preprocessing)
+        consumption_disaggregate_temporal = disaggregate_temporal_industry(consumption_data=consumption_data, year=year, low=0.5, force_preprocessing=refresh_temporal, factorized=factorized)
 
     elif sector == "cts":
         if energy_carrier == "gas":
              # sum over the applications but with efficiency factor
             consumption_data = consumption_data.T.groupby(level=0).sum().T
-            consumption_disaggregate_temporal = disagg_temporal_heat_CTS(consumption_data=consumption_data, year=year)
+            consumption_disaggregate_temporal = disagg_temporal_heat_CTS(consumption_data=consumption_data, year=year, factorized=factorized)
 
         elif energy_carrier == "power":
              # sum over the applications but with efficiency factor
             consumption_data = consumption_data.T.groupby(level=0).sum().T
-            consumption_disaggregate_temporal = disaggregate_temporal_power_CTS(consumption_data=consumption_data, year=year)
+            consumption_disaggregate_temporal = disaggregate_temporal_power_CTS(consumption_data=consumption_data, year=year, factorized=factorized)
 
         elif energy_carrier == "petrol":
             # resolve with SLPs
             consumption_data = consumption_data.T.groupby(level=0).sum().T
-            consumption_disaggregate_temporal = disagg_temporal_petrol_CTS(consumption_data=consumption_data, year=year)
+            consumption_disaggregate_temporal = disagg_temporal_petrol_CTS(consumption_data=consumption_data, year=year, factorized=factorized)
 
         
-
     # sanity check
-    if not np.isclose(consumption_disaggregate_temporal.sum().sum(), consumption_data.sum().sum(), atol=1e-6):
+    if factorized:
+        disaggregated_sum = consumption_disaggregate_temporal.total()
+        contains_nan = consumption_disaggregate_temporal.profiles.isna().any().any() or consumption_disaggregate_temporal.mapping.isna().any().any()
+    else:
+        disaggregated_sum = consumption_disaggregate_temporal.sum().sum()
+        contains_nan = consumption_disaggregate_temporal.isna().any().any()
+    if not np.isclose(disaggregated_sum, consumption_data.sum().sum(), atol=1e-6):
         raise ValueError(f"The sum of the disaggregated temporal consumption is not equal to the sum of the initial consumption data for {sector} and {energy_carrier} in year {year}")
-    if consumption_disaggregate_temporal.isna().any().any():
+    if contains_nan:
         raise ValueError(f"The disaggregated temporal consumption contains NaN values for {sector} and {energy_carrier} in year {year}")
 
 
     # 2. save to cache
     logger.info("Saving to cache...")
     processed_dir = load_config("base_config.yaml")['consumption_disaggregate_temporal_cache_dir']
-    processed_file = os.path.join(processed_dir, load_config("base_config.yaml")['consumption_disaggregate_temporal_cache_file'].format(energy_carrier=energy_carrier, year=year, sector=sector))
-    os.makedirs(processed_dir, exist_ok=True)
-    consumption_disaggregate_temporal.to_csv(processed_file, float_format=f"%.{float_precision}f")
+    if factorized:
+        processed_file = load_config("base_config.yaml")['consumption_disaggregate_temporal_factorized_cache_file']
+        processed_file = os.path.join(processed_dir, processed_file.format(part="{part}", energy_carrier=energy_carrier, year=year, sector=sector))
+        profiles, mapping = consumption_disaggregate_temporal.to_frames()
+        save_cache(profiles, processed_file.format(part="profiles"), stage="temporal", params=cache_params)
+        save_cache(mapping, processed_file.format(part="mapping"), index=False, stage="temporal", params=cache_params)
+    else:
+        processed_file = os.path.join(processed_dir, load_config("base_config.yaml")['consumption_disaggregate_temporal_cache_file'].format(energy_carrier=energy_carrier, year=year, sector=sector))
+        # chunks by state and month, see load_consumption_disaggregate_temporal_cache()
+        column_states = [get_state_by_regional_id(regional_id) for regional_id in consumption_disaggregate_temporal.columns.get_level_values(0)]
+        processed_file = save_chunked_cache(consumption_disaggregate_temporal, processed_file, column_groups=column_states, float_precision=float_precision,
+                                            stage="temporal", params=cache_params)
+    policy.mark_refreshed("temporal", cache_params)
     logger.info(f"Disaggregated temporal consumption for {sector} and {energy_carrier} in year {year} saved to {processed_file}")
 
 
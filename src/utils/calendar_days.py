@@ -0,0 +1,142 @@
+import os
+import datetime
+import numpy as np
+import pandas as pd
+import holidays
+
+from src import logger
+from src.configs.config_loader import load_config
+from src.data_access.cache_storage import load_cache, save_cache
+
+
+# Day type codes (one int8 per day of the year):
+#   bits 0-2: weekday (0=Mon, ..., 6=Sun)
+#   bit 3:    public holiday in the state
+#   bit 4:    24th or 31st of december (treated like a saturday by the SLPs)
+WEEKDAY_MASK = 7
+HOLIDAY_FLAG = 8
+SPECIAL_DAY_FLAG = 16
+
+# SLP day types: 0-4 = workdays Mon-Fri, 5 = saturday, 6 = sunday/holiday
+SLP_SATURDAY = 5
+SLP_SUNDAY = 6
+
+# in-process memo: {(state, year): np.ndarray}
+DAY_TYPE_CODES_CACHE = {}
+
+
+def get_days_index(year: int) -> pd.DatetimeIndex:
+    """
+    Returns the daily DatetimeIndex of the given year.
+    """
+    return pd.date_range(start=f"{year}-01-01", end=f"{year}-12-31", freq='D')
+
+
+def build_day_type_codes(state: str, year: int) -> np.ndarray:
+    """
+    Builds the day type codes for every day of the year in the given state.
+
+    Args:
+        state: str
+            two-letter state abbreviation, e.g. 'BW'
+        year: int
+
+    Returns:
+        np.ndarray (int8): day type code for every day of the year, see WEEKDAY_MASK, HOLIDAY_FLAG, SPECIAL_DAY_FLAG
+
+    Raises:
+        KeyError: if the state is not a German state known by the holidays library
+    """
+
+    # 1. get the holidays for the state and year
+    try:
+        holiday_dates = holidays.DE(state=state, years=year).keys()
+    except NotImplementedError:
+        raise KeyError(f"Invalid German state abbreviation: '{state}'")
+
+    # 2. weekday arithmetic on the day numbers (1970-01-01 was a thursday)
+    days = get_days_index(year)
+    day_numbers = days.values.astype('datetime64[D]').astype(np.int64)
+    codes = ((day_numbers + 3) % 7).astype(np.int8)
+
+    # 3. holidays
+    holiday_numbers = np.array(sorted(holiday_dates), dtype='datetime64[D]').astype(np.int64)
+    codes[np.isin(day_numbers, holiday_numbers)] |= HOLIDAY_FLAG
+
+    # 4. 24th and 31st of december
+    special_numbers = np.array([datetime.date(year, 12, 24), datetime.date(year, 12, 31)], dtype='datetime64[D]').astype(np.int64)
+    codes[np.isin(day_numbers, special_numbers)] |= SPECIAL_DAY_FLAG
+
+    return codes
+
+
+def get_day_type_codes(state: str, year: int, force_preprocessing: bool = False) -> np.ndarray:
+    """
+    Returns the day type codes for every day of the year in the given state.
+    The codes are memoized in process and cached on disk.
+
+    Args:
+        state: str
+            two-letter state abbreviation, e.g. 'BW'
+        year: int
+        force_preprocessing: bool
+            if True the codes are rebuilt and the caches are overwritten
+
+    Returns:
+        np.ndarray (int8): day type code for every day of the year, see build_day_type_codes()
+    """
+
+    state = state.upper()
+    year = int(year)
+    key = (state, year)
+
+    # 1. in-process memo
+    if key in DAY_TYPE_CODES_CACHE and not force_preprocessing:
+        return DAY_TYPE_CODES_CACHE[key]
+
+    # 2. disk cache
+    config = load_config("base_config.yaml")
+    cache_dir = config['day_type_codes_cache_dir']
+    cache_file = os.path.join(cache_dir, config['day_type_codes_cache_file'].format(state=state, year=year))
+
+    cache_params = {'state': state, 'year': year}
+
+    codes = None
+    cached = None if force_preprocessing else load_cache(cache_file, index_col=None, stage="day_types", params=cache_params)
+    if cached is not None:
+        codes = cached['code'].to_numpy(dtype=np.int8)
+        if len(codes) != len(get_days_index(year)):
+            logger.warning(f"Invalid day type cache {cache_file}, rebuilding it.")
+            codes = None
+
+    # 3. build and save
+    if codes is None:
+        codes = build_day_type_codes(state=state, year=year)
+        save_cache(pd.DataFrame({'date': get_days_index(year), 'code': codes}), cache_file, index=False, stage="day_types", params=cache_params)
+
+    codes.flags.writeable = False
+    DAY_TYPE_CODES_CACHE[key] = codes
+
+    return codes
+
+
+def get_slp_day_types(state: str, year: int) -> np.ndarray:
+    """
+    Returns the day type of the standard load profiles for every day of the year:
+    0-4 = workdays monday to friday, 5 = saturday, 6 = sunday.
+    Holidays are sundays, the 24th and 31st of december are saturdays.
+
+    Args:
+        state: str
+        year: int
+
+    Returns:
+        np.ndarray (int8)
+    """
+
+    codes = get_day_type_codes(state=state, year=year)
+
+    day_types = np.where(codes & HOLIDAY_FLAG, SLP_SUNDAY, codes & WEEKDAY_MASK)
+    day_types = np.where(codes & SPECIAL_DAY_FLAG, SLP_SATURDAY, day_types)
+
+    return day_types.astype(np.int8)
@@ -0,0 +1,338 @@
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+class FactorizedTimeseries:
+    """
+    Temporal result stored as unique normalized profiles times annual totals.
+
+    Most temporal outputs are a normalized profile (e.g. a SLP of a state) times the annual
+    consumption of a [regional_id, industry_sector] column. Instead of materializing
+    timesteps x columns values only the unique profiles and one (profile, scale) pair per
+    column are held. Columns, slices and aggregates are materialized on demand.
+
+    Attributes:
+        profiles: pd.DataFrame
+            index: timesteps
+            columns: profile number 0..n-1, every profile sums to 1 over the full year
+            (or is all zero, or holds the raw values of a column that sums to 0 with scale 1)
+        mapping: pd.DataFrame
+            index: columns of the materialized DataFrame (e.g. MultiIndex [regional_id, industry_sector])
+            columns: ['profile', 'scale']
+
+    Example:
+        ts = FactorizedTimeseries.from_frame(df)
+        ts.sum(level='regional_id')         # hourly consumption per regional_id
+        ts.loc['2020-01'].resample('h')     # january in hourly resolution
+        ts[1001]                            # materialized columns of regional_id 1001
+        ts.to_frame()                       # fully materialized DataFrame
+    """
+
+    def __init__(self, profiles: pd.DataFrame, mapping: pd.DataFrame):
+
+        if not {'profile', 'scale'}.issubset(mapping.columns):
+            raise ValueError("mapping must have the columns ['profile', 'scale']")
+        if len(mapping) > 0 and (mapping['profile'].min() < 0 or mapping['profile'].max() >= profiles.shape[1]):
+            raise ValueError("mapping references profiles that do not exist")
+
+        self.profiles = profiles
+        self.mapping = mapping[['profile', 'scale']].astype({'profile': np.int64, 'scale': float})
+
+
+    @classmethod
+    def from_profiles(cls, profiles: pd.DataFrame, profile_positions, scales, columns: pd.Index, normalize: bool = True) -> "FactorizedTimeseries":
+        """
+        Creates a FactorizedTimeseries from a profile matrix and one (profile, scale) pair per column.
+
+        Args:
+            profiles: pd.DataFrame
+                index: timesteps, columns: profiles
+            profile_positions: array-like
+                position of the profile in profiles for every column
+            scales: array-like
+                scale of every column (e.g. the annual consumption)
+            columns: pd.Index
+                columns of the materialized DataFrame
+            normalize: bool
+                if True the profiles are normalized to a sum of 1 and the scales are adjusted
+
+        Returns:
+            FactorizedTimeseries: only the profiles used by the columns are kept
+        """
+
+        profile_positions = np.asarray(profile_positions, dtype=np.int64)
+        scales = np.asarray(scales, dtype=float)
+
+        # 1. keep only the used profiles
+        used, profile_numbers = np.unique(profile_positions, return_inverse=True)
+        values = profiles.to_numpy(dtype=float)[:, used]
+
+        # 2. normalize the profiles and move the sums into the scales
+        if normalize:
+            sums = values.sum(axis=0)
+            nonzero = sums != 0
+            values[:, nonzero] /= sums[nonzero]
+            scales = scales * np.where(nonzero, sums, 1.0)[profile_numbers]
+
+        return cls(profiles=pd.DataFrame(values, index=profiles.index),
+                   mapping=pd.DataFrame({'profile': profile_numbers, 'scale': scales}, index=columns))
+
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, decimals: int = 12) -> "FactorizedTimeseries":
+        """
+        Factorizes a materialized DataFrame: columns with the same normalized profile
+        (rounded to 'decimals') share one profile.
+
+        Args:
+            df: pd.DataFrame
+                index: timesteps, columns: e.g. MultiIndex [regional_id, industry_sector]
+            decimals: int
+                precision used to detect identical profiles
+
+        Returns:
+            FactorizedTimeseries
+        """
+
+        # 1. normalize every column by its sum
+        # columns that sum to 0 but have non-zero values (e.g. positive and negative values) keep their raw values with scale 1
+        values = np.array(df.to_numpy(dtype=float), order='F')
+        sums = values.sum(axis=0)
+        nonzero = sums != 0
+        values[:, nonzero] /= sums[nonzero]
+        scales = np.where(nonzero, sums, np.where(values.any(axis=0), 1.0, 0.0))
+
+        # 2. deduplicate the normalized profiles
+        rounded = np.asfortranarray(np.round(values, decimals) + 0.0)
+        profile_ids = {}
+        profile_positions = np.empty(values.shape[1], dtype=np.int64)
+        for i in range(values.shape[1]):
+            key = hashlib.blake2b(rounded[:, i].tobytes(), digest_size=16).digest()
+            profile_positions[i] = profile_ids.setdefault(key, len(profile_ids))
+
+        first_columns = np.unique(profile_positions, return_index=True)[1]
+
+        return cls(profiles=pd.DataFrame(values[:, first_columns], index=df.index),
+                   mapping=pd.DataFrame({'profile': profile_positions, 'scale': scales}, index=df.columns))
+
+
+    @classmethod
+    def concat(cls, timeseries_list: list) -> "FactorizedTimeseries":
+        """
+        Concatenates FactorizedTimeseries with the same time index along the columns.
+        """
+
+        if not timeseries_list:
+            raise ValueError("timeseries_list must not be empty")
+
+        profiles_list = []
+        mapping_list = []
+        offset = 0
+        for timeseries in timeseries_list:
+            if not timeseries.index.equals(timeseries_list[0].index):
+                raise ValueError("All timeseries must have the same time index")
+            profiles_list.append(timeseries.profiles.to_numpy(dtype=float))
+            mapping_list.append(timeseries.mapping.assign(profile=timeseries.mapping['profile'] + offset))
+            offset += timeseries.profiles.shape[1]
+
+        return cls(profiles=pd.DataFrame(np.hstack(profiles_list), index=timeseries_list[0].index),
+                   mapping=pd.concat(mapping_list))
+
+
+    # properties
+    @property
+    def index(self) -> pd.Index:
+        return self.profiles.index
+
+    @property
+    def columns(self) -> pd.Index:
+        return self.mapping.index
+
+    @property
+    def shape(self) -> tuple:
+        return (len(self.index), len(self.columns))
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory of the profiles and the mapping in bytes.
+        """
+        return int(self.profiles.memory_usage(index=False).sum() + self.mapping.memory_usage(index=False).sum())
+
+    @property
+    def loc(self) -> "_FactorizedTimeseriesLocIndexer":
+        """
+        Label based selection of time windows: ts.loc[start:end] returns a FactorizedTimeseries,
+        ts.loc[start:end, columns] returns the materialized DataFrame.
+        """
+        return _FactorizedTimeseriesLocIndexer(self)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __repr__(self) -> str:
+        return (f"FactorizedTimeseries({self.shape[0]} timesteps x {self.shape[1]} columns, "
+                f"{self.profiles.shape[1]} unique profiles)")
+
+
+    # materialization
+    def to_frame(self, columns: pd.Index = None) -> pd.DataFrame:
+        """
+        Materializes the timeseries.
+
+        Args:
+            columns: pd.Index, optional
+                subset of the columns to materialize, default all columns
+
+        Returns:
+            pd.DataFrame
+                index: timesteps, columns: columns
+        """
+
+        mapping = self.mapping if columns is None else self.mapping.loc[columns]
+
+        return self._materialize(mapping)
+
+
+    def _materialize(self, mapping: pd.DataFrame) -> pd.DataFrame:
+        values = self.profiles.to_numpy(dtype=float)[:, mapping['profile'].to_numpy()]
+        values *= mapping['scale'].to_numpy()
+
+        return pd.DataFrame(values, index=self.index, columns=mapping.index)
+
+
+    def __getitem__(self, key):
+        """
+        Materializes the selected columns with the same semantics as DataFrame[key].
+        """
+
+        positions = pd.Series(np.arange(len(self.mapping)), index=self.mapping.index)[key]
+
+        if not isinstance(positions, pd.Series):
+            profile_number = self.mapping['profile'].iloc[positions]
+            scale = self.mapping['scale'].iloc[positions]
+            return pd.Series(self.profiles.iloc[:, profile_number].to_numpy() * scale, index=self.index, name=key)
+
+        df = self._materialize(self.mapping.iloc[positions.to_numpy()])
+        df.columns = positions.index
+
+        return df
+
+
+    # aggregations
+    def column_totals(self) -> pd.Series:
+        """
+        Returns the sum over all timesteps of every column.
+        """
+        profile_sums = self.profiles.sum(axis=0).to_numpy()
+
+        return pd.Series(profile_sums[self.mapping['profile'].to_numpy()] * self.mapping['scale'].to_numpy(), index=self.columns)
+
+
+    def total(self) -> float:
+        """
+        Returns the sum over all timesteps and columns.
+        """
+        return float(self.column_totals().sum())
+
+
+    def sum(self, level=None):
+        """
+        Sums the columns for every timestep.
+
+        Args:
+            level: int, str or list, optional
+                column level(s) to group by, default None sums all columns
+
+        Returns:
+            pd.Series if level is None, otherwise pd.DataFrame with one column per group
+        """
+
+        profile_numbers = self.mapping['profile'].to_numpy()
+        scales = self.mapping['scale'].to_numpy()
+        n_profiles = self.profiles.shape[1]
+
+        # 1. all columns: weight every profile with the sum of its scales
+        if level is None:
+            weights = np.bincount(profile_numbers, weights=scales, minlength=n_profiles)
+            return pd.Series(self.profiles.to_numpy(dtype=float) @ weights, index=self.index)
+
+        # 2. by group: (profiles x groups) weight matrix
+        grouped = self.mapping.groupby(level=level, sort=False)
+        group_numbers = grouped.ngroup().to_numpy()
+        groups = grouped.size().index
+        weights = np.zeros((n_profiles, len(groups)))
+        np.add.at(weights, (profile_numbers, group_numbers), scales)
+
+        return pd.DataFrame(self.profiles.to_numpy(dtype=float) @ weights, index=self.index, columns=groups)
+
+
+    def resample(self, rule: str, agg: str = 'sum') -> "FactorizedTimeseries":
+        """
+        Resamples the profiles to another temporal resolution.
+
+        Args:
+            rule: str
+                pandas offset alias e.g. 'h' or 'D'
+            agg: str
+                must be one of ['sum', 'mean']
+
+        Returns:
+            FactorizedTimeseries
+        """
+
+        if agg not in ['sum', 'mean']:
+            raise ValueError(f"Invalid agg: {agg}, must be one of ['sum', 'mean']")
+
+        profiles = getattr(self.profiles.resample(rule), agg)()
+
+        return FactorizedTimeseries(profiles=profiles, mapping=self.mapping)
+
+
+    # persistence
+    def to_frames(self) -> tuple:
+        """
+        Returns the profiles and the mapping (with the columns as regular columns) to store them in a cache.
+
+        Returns:
+            tuple: (profiles, mapping) pd.DataFrames, restore with from_frames()
+        """
+        return self.profiles, self.mapping.reset_index()
+
+
+    @classmethod
+    def from_frames(cls, profiles: pd.DataFrame, mapping: pd.DataFrame) -> "FactorizedTimeseries":
+        """
+        Restores a FactorizedTimeseries from the frames returned by to_frames().
+        """
+        profiles = profiles.copy()
+        profiles.columns = profiles.columns.astype(int)
+        mapping = mapping.set_index([c for c in mapping.columns if c not in ['profile', 'scale']])
+
+        return cls(profiles=profiles, mapping=mapping)
+
+
+
+class _FactorizedTimeseriesLocIndexer:
+    """
+    Label based time window selection for FactorizedTimeseries.loc
+    """
+
+    def __init__(self, timeseries: FactorizedTimeseries):
+        self._timeseries = timeseries
+
+    def __getitem__(self, key):
+
+        if isinstance(key, tuple) and len(key) == 2:
+            rows, columns = key
+            return self[rows][columns]
+
+        profiles = self._timeseries.profiles.loc[key]
+
+        # single timestep
+        if isinstance(profiles, pd.Series):
+            mapping = self._timeseries.mapping
+            return pd.Series(profiles.to_numpy()[mapping['profile'].to_numpy()] * mapping['scale'].to_numpy(), index=mapping.index, name=key)
+
+        return FactorizedTimeseries(profiles=profiles, mapping=self._timeseries.mapping)
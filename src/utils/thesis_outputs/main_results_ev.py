@@ -29,6 +29,7 @@ from src.data_processing.heat import *
 from src.data_processing.cop import *
 from src.pipeline.pipe_ev_regional_consumption import *
 from src.pipeline.pipe_ev_temporal import *
+from src.data_access.cache_storage import load_cache, get_cache_file
 
 now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 
@@ -119,10 +120,10 @@ path_consumption = "src/utils/thesis_outputs/ev/ev_consumption_s3_by energy_carr
 def graph_ev_consumption_by_energy_carrier_s3():
     # Load data
     csv_path = "data/processed/electric_vehicles/s3_future_ev_consumption/s3_future_ev_consumption.csv"
-    df = pd.read_csv(csv_path)
-
-    # Set year as index for plotting
-    df.set_index("year", inplace=True)
+    # year as index for plotting
+    df = load_cache(csv_path, index_col="year", stage="ev_fuel_projection", params={"end_year": 2045})
+    if df is None:
+        raise FileNotFoundError(f"S3 future ev consumption cache file {get_cache_file(csv_path)} not found or outdated. Run get_future_vehicle_consumption_ugr_by_energy_carrier() first.")
 
     # Translate column names to natural language
     column_translation = {
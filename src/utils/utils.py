@@ -1,7 +1,9 @@
 from collections import defaultdict
+import numpy as np
 import pandas as pd
 from ast import literal_eval as lit_eval
 from src.configs.mappings import *
+from src.utils.calendar_days import get_day_type_codes, HOLIDAY_FLAG, WEEKDAY_MASK
 import holidays
 
 def fix_region_id(rid):
@@ -11,6 +13,95 @@ def fix_region_id(rid):
     return rid[:-3]     # remove last 3 chars
 
 
+# aggregation matrices of this process: {(industry_sectors, groups, mapping): matrix}
+INDUSTRY_SECTOR_AGGREGATION_MATRICES = {}
+
+
+def get_industry_sector_group_members(group) -> list:
+    """
+    Returns the WZ codes of an industry sector group, e.g. '10-12' -> [10, 11, 12] and '16' -> [16].
+    """
+    group = str(group)
+    if '-' in group:
+        start_wz, end_wz = map(int, group.split('-'))
+        return list(range(start_wz, end_wz + 1))
+
+    return [int(group)]
+
+
+def get_industry_sector_aggregation_matrix(industry_sectors, groups=None, mapping: dict = None) -> pd.DataFrame:
+    """
+    Returns the 0/1 matrix that sums industry sectors (e.g. the 88 WZ codes) to industry sector groups (e.g. the 48 ranges of the UGR data).
+    grouped = df @ matrix (industry sectors in the columns of df)
+    The matrix is built once per (industry_sectors, groups, mapping) from the (row, column) entries and kept for the process.
+
+    Args:
+        industry_sectors: Iterable
+            industry sector codes of the data (rows of the matrix)
+        groups: Iterable, optional
+            industry sector groups (columns of the matrix), default: the 48 groups of industry_sector_groups() sorted by WZ code
+        mapping: dict, optional
+            {industry_sector: group}, default: a WZ code belongs to the group whose range contains it.
+            For the openffe codes of the employees use wz_dict().
+
+    Returns:
+        pd.DataFrame
+            index: industry_sectors
+            columns: groups
+            industry sectors without a group have a row of zeros, groups without industry sectors a column of zeros
+    """
+    if groups is None:
+        groups = sorted(industry_sector_groups(), key=lambda group: get_industry_sector_group_members(group)[0])
+    industry_sectors, groups = list(industry_sectors), list(groups)
+
+    key = (tuple(industry_sectors), tuple(groups), tuple(mapping.items()) if mapping is not None else None)
+    matrix = INDUSTRY_SECTOR_AGGREGATION_MATRICES.get(key)
+    if matrix is not None:
+        return matrix.copy()
+
+    # 1. {industry_sector: group}
+    if mapping is None:
+        mapping = {wz: group for group in groups for wz in get_industry_sector_group_members(group)}
+        lookup = lambda industry_sector: mapping.get(int(industry_sector)) if str(industry_sector).isdigit() else None
+    else:
+        lookup = mapping.get
+
+    # 2. (row, column) entries of the industry sectors with a group
+    column_by_group = {group: column for column, group in enumerate(groups)}
+    entries = [(row, column_by_group[lookup(industry_sector)]) for row, industry_sector in enumerate(industry_sectors)
+               if lookup(industry_sector) in column_by_group]
+
+    # 3. build the matrix
+    values = np.zeros((len(industry_sectors), len(groups)))
+    if entries:
+        rows, columns = zip(*entries)
+        values[list(rows), list(columns)] = 1.0
+
+    matrix = pd.DataFrame(values, index=pd.Index(industry_sectors, name="industry_sector"), columns=pd.Index(groups, name="industry_sector"))
+    INDUSTRY_SECTOR_AGGREGATION_MATRICES[key] = matrix
+
+    return matrix.copy()
+
+
+def aggregate_industry_sectors(df: pd.DataFrame, groups=None, mapping: dict = None) -> pd.DataFrame:
+    """
+    Sums the industry sector columns of df to industry sector groups with one matrix product, see get_industry_sector_aggregation_matrix().
+    Missing values count as 0 (like DataFrame.sum()).
+
+    Args:
+        df (pd.DataFrame): industry sectors in the columns
+        groups: industry sector groups of the result, default: the 48 groups of industry_sector_groups()
+        mapping (dict): {industry_sector: group}, default: WZ ranges
+
+    Returns:
+        pd.DataFrame: same index as df, columns: groups
+    """
+    matrix = get_industry_sector_aggregation_matrix(df.columns, groups, mapping)
+    values = df.fillna(0).to_numpy(dtype=float) @ matrix.to_numpy()
+
+    return pd.DataFrame(values, index=df.index, columns=matrix.columns)
+
+
 def group_industry_sectors(df, mapping_dict=industry_sector_groups()):
 
     """
@@ -24,30 +115,15 @@ def group_industry_sectors(df, mapping_dict=industry_sector_groups()):
     Returns:
         pd.DataFrame: DataFrame with grouped ranges and remaining individual sectors
     """
-    # Create a copy to avoid modifying the original DataFrame
-    result_df = df.copy()
-    
-    # Process each mapping item
-    for item in mapping_dict:
-        if '-' in item:
-            # Handle range
-            start_str, end_str = item.split('-')
-            try:
-                start, end = int(start_str), int(end_str)
-                # Find columns within this range
-                cols_to_sum = [i for i in range(start, end + 1) if i in df.columns]
-                
-                if cols_to_sum:
-                    # Create new column with sum
-                    result_df[item] = df[cols_to_sum].sum(axis=1)
-                    # Remove original columns that were summed
-                    result_df = result_df.drop(columns=cols_to_sum)
-            except ValueError:
-                continue
-
-
-    # Ensure all df column names are strings for comparison
-    df_columns_str = [str(col) for col in result_df.columns]
+    # 1. aggregation matrix of the ranges
+    ranges = [item for item in mapping_dict if '-' in item]
+    matrix = get_industry_sector_aggregation_matrix(df.columns, ranges)
+    in_range = matrix.to_numpy().any(axis=1)
+    ranges_found = matrix.columns[matrix.to_numpy().any(axis=0)]
+
+    # 2. sum the columns of the ranges and remove the original columns
+    grouped = aggregate_industry_sectors(df.loc[:, in_range], ranges)[ranges_found]
+    result_df = pd.concat([df.loc[:, ~in_range], grouped], axis=1)
 
 
     return result_df
@@ -87,6 +163,47 @@ def literal_converter(val):
         return val
 
 
+def list_column_to_array(values: pd.Series, length: int = None) -> np.ndarray:
+    """
+    Converts a column with list values (e.g. the hourly temperatures of the API) to a 2D float array (rows x list length).
+    The values can be lists, arrays (parquet cache) or their string representation "[1.0, 2.0]"; strings are parsed
+    with one numpy conversion of all rows instead of literal_eval per row.
+
+    Args:
+        values: pd.Series
+            one list per row
+        length: int, optional
+            expected length of every list
+
+    Returns:
+        np.ndarray: shape (len(values), length)
+
+    Raises:
+        ValueError: if the lists have different lengths or not the expected length
+    """
+    values = pd.Series(values)
+    labels = values.index
+    values = values.tolist()
+
+    # 1. string representation: join all rows and convert them at once
+    if values and all(isinstance(v, str) for v in values):
+        inner = [v.strip()[1:-1] for v in values]
+        lengths = np.array([v.count(",") + 1 if v.strip() else 0 for v in inner])
+        flat = np.array(",".join(v for v in inner if v.strip()).split(","), dtype=float) if lengths.sum() else np.empty(0)
+    # 2. lists or arrays
+    else:
+        lengths = np.array([len(v) for v in values])
+        flat = np.concatenate([np.asarray(v, dtype=float) for v in values]) if values else np.empty(0)
+
+    # 3. validate the lengths and reshape
+    expected = length if length is not None else (lengths[0] if len(lengths) else 0)
+    wrong = np.flatnonzero(lengths != expected)
+    if len(wrong):
+        raise ValueError(f"Data length mismatch for {labels[wrong[0]]}. Expected {expected}, found {lengths[wrong[0]]}.")
+
+    return flat.reshape(len(values), expected)
+
+
 def translate_application_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
     Rename all columns of `df` according to `mapping`.
@@ -120,38 +237,19 @@ def group_activity_drivers(df_driver_total, columns):
     pd.DataFrame
 
     """
-    # create new DF with aggregated drivers
-    new_df = pd.DataFrame(index=df_driver_total.index, columns=columns, data=0)
-    for i in [1, 2, 3, 5, 6, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27,
-              28, 29, 30, 33, 36, 43, 45, 46, 47, 49, 50, 51, 52, 53, 68,
-              84, 85]:
-        new_df[str(i)] = df_driver_total[i]
-    for i in [7, 8, 9]:
-        new_df['7-9'] = new_df['7-9'] + df_driver_total[i]
-    for i in [10, 11, 12]:
-        new_df['10-12'] = new_df['10-12'] + df_driver_total[i]
-    for i in [13, 14, 15]:
-        new_df['13-15'] = new_df['13-15'] + df_driver_total[i]
-    new_df['31-32'] = (df_driver_total[31] + df_driver_total[32])
-    new_df['37-39'] = (df_driver_total[37] + df_driver_total[38] + df_driver_total[39])
-    new_df['41-42'] = (df_driver_total[41] + df_driver_total[42])
-    new_df['55-56'] = (df_driver_total[55] + df_driver_total[56])
-    for i in [58, 59, 60, 61, 62, 63]:
-        new_df['58-63'] = new_df['58-63'] + df_driver_total[i]
-    for i in [64, 65, 66]:
-        new_df['64-66'] = new_df['64-66'] + df_driver_total[i]
-    for i in [69, 70, 71, 72, 73, 74, 75]:
-        new_df['69-75'] = new_df['69-75'] + df_driver_total[i]
-    for i in [77, 78, 79, 80, 81, 82]:
-        new_df['77-82'] = new_df['77-82'] + df_driver_total[i]
-    for i in [86, 87, 88]:
-        new_df['86-88'] = new_df['86-88'] + df_driver_total[i]
-    for i in [90, 91, 92, 93, 94, 95, 96, 97, 98, 99]:
-        new_df['90-99'] = new_df['90-99'] + df_driver_total[i]
+    # aggregate the drivers of the WZ codes to the branches of the publication in one matrix product
+    new_df = aggregate_industry_sectors(df_driver_total, groups=columns)
 
     return new_df.drop('35', axis=1)
 
 
+def get_state_by_regional_id(regional_id) -> str:
+    """
+    Returns the two-letter abbreviation of the state of a regional_id (e.g. 1001 -> 'SH').
+    """
+    return federal_state_dict().get(int(regional_id) // 1000)
+
+
 def get_regional_ids_by_state(state: str) -> list[int]:
     """
     Args:
@@ -225,10 +323,10 @@ def create_weekday_workday_holiday_mask(state: str, year: int) -> pd.DataFrame:
     df = pd.DataFrame(index=dates_in_year)
     df.index.name = 'date'
 
-    # 3. Get public holidays for the specified German state and year
+    # 3. Get the day type codes (weekday and public holidays) for the specified German state and year
     upper_state = state.upper()
     try:
-        german_holidays_obj = holidays.DE(state=upper_state, years=year)
+        day_type_codes = get_day_type_codes(state=upper_state, year=year)
     except KeyError:
         valid_states = holidays.Germany.subdivisions
         raise ValueError(
@@ -238,12 +336,11 @@ def create_weekday_workday_holiday_mask(state: str, year: int) -> pd.DataFrame:
 
     # 4. Populate the "holiday" column (NEW)
     # True if the day is a public holiday.
-    # df.index contains pd.Timestamp; german_holidays_obj contains datetime.date.
-    df['holiday'] = [ts.date() in german_holidays_obj for ts in df.index]
+    df['holiday'] = (day_type_codes & HOLIDAY_FLAG) > 0
 
     # 5. Determine day of the week and populate "weekend" column (NEW)
     # day_of_week_num: Monday=0, Tuesday=1, ..., Sunday=6
-    df['day_of_week_num'] = df.index.dayofweek
+    df['day_of_week_num'] = day_type_codes & WEEKDAY_MASK
     is_saturday = (df['day_of_week_num'] == 5)
     is_sunday = (df['day_of_week_num'] == 6)
     df['weekend'] = is_saturday | is_sunday